@@ -1,25 +1,28 @@
 import streamlit as st
+import importlib
 import os
 import database as db
-import import_excel
+import profiling
 import theme
 
 # --- Page Config ---
 st.set_page_config(**theme.get_page_config())
 
-# --- Initialize Database ---
-db.init_db()
-
-# --- Auto-import Excel data on first run ---
-if db.is_db_empty():
+# --- Initialize Database, and auto-import Excel data on first run ---
+# Once per server process, not on every rerun; see db.bootstrap().
+def _import_workbook():
+    import import_excel  # only a first launch needs the workbook importer
     with st.spinner("Importing data from Excel..."):
-        try:
-            result = import_excel.import_all()
-            if result:
-                st.success("Excel data imported successfully!")
-                st.rerun()
-        except Exception as e:
-            st.error(f"Import failed: {e}")
+        if import_excel.import_all():
+            st.success("Excel data imported successfully!")
+            st.rerun()
+
+
+try:
+    db.bootstrap(first_run=_import_workbook)
+except Exception as e:
+    # Not marked as done, so the next rerun tries the import again.
+    st.error(f"Import failed: {e}")
 
 # --- Inject Enterprise Theme CSS ---
 st.markdown(theme.inject_css(), unsafe_allow_html=True)
@@ -70,53 +73,42 @@ st.markdown("---")
 
 
 # ============================================================
-# 🔥 TABS NAVIGATION
-# ============================================================
-
-tab_dashboard, tab_products, tab_purchases, tab_sales, tab_stock, tab_expenses, tab_cashflow, tab_reports = st.tabs([
-    "📊 Dashboard",
-    "📦 Products",
-    "🛒 Purchases",
-    "💰 Sales",
-    "📋 Stock",
-    "💸 Expenses",
-    "🏦 Cash Flow",
-    "📈 Reports",
-])
-
-
-# ============================================================
-# 🔥 TAB ROUTING
+# 🔥 PAGE NAVIGATION
 # ============================================================
-
-with tab_dashboard:
-    from views import dashboard
-    dashboard.render()
-
-with tab_products:
-    from views import products
-    products.render()
-
-with tab_purchases:
-    from views import purchases
-    purchases.render()
-
-with tab_sales:
-    from views import sales
-    sales.render()
-
-with tab_stock:
-    from views import stock
-    stock.render()
-
-with tab_expenses:
-    from views import expenses
-    expenses.render()
-
-with tab_cashflow:
-    from views import cash_flow
-    cash_flow.render()
-
-with tab_reports:
-    from views import reports
-    reports.render()
\ No newline at end of file
+# Only the selected page runs on each rerun. Every page has its own URL
+# (e.g. /sales) and st.navigation keeps the selection across reruns.
+
+PAGES = [
+    # (views module, url path, title, icon)
+    ("dashboard", "dashboard", "Dashboard", "📊"),
+    ("products", "products", "Products", "📦"),
+    ("purchases", "purchases", "Purchases", "🛒"),
+    ("sales", "sales", "Sales", "💰"),
+    ("stock", "stock", "Stock", "📋"),
+    ("expenses", "expenses", "Expenses", "💸"),
+    ("cash_flow", "cash-flow", "Cash Flow", "🏦"),
+    ("reports", "reports", "Reports", "📈"),
+]
+
+
+def _view(module_name):
+    # Views are imported on first visit, as the old tab routing did.
+    def render():
+        importlib.import_module(f"views.{module_name}").render()
+    return render
+
+
+# Query instrumentation for operators: with LOOKIVA_ADMIN=1 it is
+# reachable at /admin, never listed. It changes process-wide settings, so
+# without the switch the page does not exist.
+ADMIN_PAGE = os.environ.get("LOOKIVA_ADMIN", "0") == "1"
+
+page = st.navigation([
+    st.Page(_view(module), title=title, icon=icon, url_path=url_path, default=(module == "dashboard"))
+    for module, url_path, title, icon in PAGES
+] + ([
+    st.Page(_view("admin"), title="Admin", icon="🛠️", url_path="admin", visibility="hidden"),
+] if ADMIN_PAGE else []))
+st.session_state["active_page"] = page.url_path
+with profiling.page(page.title):
+    page.run()
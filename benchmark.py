@@ -0,0 +1,1138 @@
+"""
+Micro-benchmarks for database.py.
+
+Runs against a throwaway copy of the schema filled with synthetic rows, so the
+real lookiva.db is never touched.
+
+Usage:
+    python benchmark.py connections [--products N] [--rows N] [--repeat N]
+    python benchmark.py plans [--products N] [--rows N]
+    python benchmark.py roundtrip [--products N] [--rows N]
+    python benchmark.py app [--products N] [--rows N] [--repeat N]
+    python benchmark.py startup [--products N] [--rows N] [--repeat N] [--reruns N]
+    python benchmark.py frames [--products N] [--rows N] [--repeat N]
+    python benchmark.py writes [--products N] [--rows N] [--writers N] [--writes N] [--readers N]
+    python benchmark.py dashboard [--products N] [--rows N] [--repeat N]
+    python benchmark.py search [--products N] [--repeat N]
+    python benchmark.py analysis [--products N] [--rows N] [--repeat N]
+    python benchmark.py stats [--products N] [--rows N] [--repeat N] [--json PATH]
+    python benchmark.py suite [--scales N,N,...] [--repeat N] [--json PATH] [--baseline PATH]
+    python benchmark.py generate PATH [--products N] [--rows N] [--years N] [--seed N]
+
+`plans` is a regression check: it exits non-zero if any query issued by a
+public database.py function walks a ledger table rather than searching an
+index (tests/test_query_plans.py runs the same check under pytest).
+`roundtrip` exits non-zero unless a workbook written by export_excel.py
+imports into an empty database with every table's counts and totals intact.
+`suite` times every public database.py function and every page at each
+scale and writes a JSON report; given --baseline, it exits non-zero if any
+median got slower. `generate` writes a synthetic database for the app.
+"""
+import argparse
+import gc
+import inspect
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import re
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+import database as db
+
+
+# --------------- Synthetic data ---------------
+
+SEED_START = date(2023, 1, 1)
+CATEGORIES = ["Saree", "USkirt", "Blouse"]
+FABRICS = ["Silk", "Cotton", "Linen", "Georgette", "Chiffon", "Crepe"]
+COLORS = ["Red", "Blue", "Green", "Maroon", "Black", "Ivory", "Mustard", "Teal"]
+SUPPLIERS = ["Supplier A", "Supplier B", "Supplier C", "Supplier D"]
+PAYMENT_METHODS = ["Cash", "Bank Transfer", "Credit"]
+EXPENSE_TYPES = ["Transport", "Packaging", "Marketing", "Rent", "Phone", "Other"]
+
+
+def seed(path, products=2000, rows=20000, seed_value=42, years=3, return_rate=0.05,
+         ledger_rows=None):
+    """Create the schema at `path` and fill it with deterministic rows.
+
+    `rows` purchases and `rows` sales plus `ledger_rows` (default rows // 10)
+    each of expenses, cash flow and capital, dated over `years` years from
+    SEED_START. About `return_rate` of purchases and of sales are returns
+    (negative quantities); sales are split between Direct and Indirect.
+    The same arguments always produce the same data. Rows are generated
+    while they are inserted, so memory stays flat at any size.
+    """
+    rng = random.Random(seed_value)
+    db.close_connections()
+    db.DB_PATH = path
+    db.init_db()
+
+    days = max(int(365 * years), 1)
+    batch_ids = [f"SR{i:05d}JAN23" for i in range(1, products + 1)]
+    costs = [float(rng.randrange(500, 5000, 50)) for _ in batch_ids]
+    ledger_rows = max(rows // 10, 1) if ledger_rows is None else ledger_rows
+
+    def day():
+        return str(SEED_START + timedelta(days=rng.randrange(days)))
+
+    def quantity(most):
+        return -rng.randint(1, 2) if rng.random() < return_rate else rng.randint(1, most)
+
+    def sale():
+        i = rng.randrange(products)
+        retailer = float(round(costs[i] * rng.uniform(1.2, 1.8), -1))
+        direct = rng.random() < 0.4
+        customer = retailer if direct else float(round(retailer * rng.uniform(1.1, 1.3), -1))
+        return (day(), batch_ids[i], quantity(3), customer, retailer,
+                "Direct" if direct else "Indirect")
+
+    with db.bulk_load("products", "purchases", "sales", "expenses", "cash_flow", "capital") as conn:
+        conn.executemany(
+            """INSERT INTO products (batch_id, base_product_id, category, product_name, fabric,
+               color, cost_per_unit, first_purchase_date) VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+            ((b, b[:7], rng.choice(CATEGORIES), f"Product {i}", rng.choice(FABRICS),
+              rng.choice(COLORS), cost, day())
+             for i, (b, cost) in enumerate(zip(batch_ids, costs)))
+        )
+        conn.executemany(
+            """INSERT INTO purchases (date, batch_id, supplier_name, quantity, cost_per_unit,
+               payment_method) VALUES (?, ?, ?, ?, ?, ?)""",
+            ((day(), batch_ids[i], rng.choice(SUPPLIERS), quantity(10), costs[i],
+              rng.choice(PAYMENT_METHODS))
+             for i in (rng.randrange(products) for _ in range(rows)))
+        )
+        conn.executemany(
+            """INSERT INTO sales (date, batch_id, quantity, selling_price_customer,
+               selling_price_retailer, sale_type) VALUES (?, ?, ?, ?, ?, ?)""",
+            (sale() for _ in range(rows))
+        )
+        conn.executemany(
+            "INSERT INTO expenses (date, expense_type, description, amount) VALUES (?, ?, ?, ?)",
+            ((day(), rng.choice(EXPENSE_TYPES), "Expense", float(rng.randrange(100, 5000, 50)))
+             for _ in range(ledger_rows))
+        )
+        conn.executemany(
+            """INSERT INTO cash_flow (date, description, inflow, outflow, pending_type, status)
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            ((day(), "Entry",
+              *((float(rng.randrange(100, 5000)), 0) if rng.random() < 0.5
+                else (0, float(rng.randrange(100, 5000)))),
+              rng.choice(["Receipt", "Payment"]), rng.choice(["Completed", "Pending"]))
+             for _ in range(ledger_rows))
+        )
+        conn.executemany(
+            "INSERT INTO capital (date, description, type, amount) VALUES (?, ?, ?, ?)",
+            ((day(), "Capital", rng.choice(["Capital In", "Withdrawal"]),
+              float(rng.randrange(1000, 50000)))
+             for _ in range(ledger_rows))
+        )
+    db.close_connections()
+    return batch_ids
+
+
+# --------------- Legacy connection pattern ---------------
+
+@contextmanager
+def _legacy_connection(*tables):
+    # The pre-pool behaviour: a fresh default connection per call.
+    conn = sqlite3.connect(db.DB_PATH)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA foreign_keys = ON")
+    try:
+        yield conn
+        conn.commit()
+    finally:
+        conn.close()
+
+
+@contextmanager
+def legacy_mode():
+    """Temporarily route database.py through the old open-per-call pattern.
+
+    Only the connection handling goes back: the queries, migrations and
+    triggers are today's, so `connections` compares connection cost on the
+    current schema, not the app before the series.
+    """
+    saved = db.connection, db.transaction, db.WRITE_QUEUE_ENABLED
+    db.connection = db.transaction = _legacy_connection
+    db.WRITE_QUEUE_ENABLED = False
+    try:
+        yield
+    finally:
+        db.connection, db.transaction, db.WRITE_QUEUE_ENABLED = saved
+
+
+# --------------- Timing ---------------
+
+def percentile(samples, q):
+    """Nearest-rank percentile: the smallest sample with at least q of the
+    samples at or below it."""
+    if not samples:
+        return 0.0
+    return sorted(samples)[max(math.ceil(len(samples) * q) - 1, 0)]
+
+
+def time_call(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return {
+        "median_ms": statistics.median(samples),
+        "p95_ms": percentile(samples, 0.95),
+    }
+
+
+def bench_connection_manager(products, rows, repeat):
+    workdir = tempfile.mkdtemp(prefix="lookiva_bench_")
+    try:
+        tuned_path = os.path.join(workdir, "tuned.db")
+        batch_ids = seed(tuned_path, products, rows)
+        db.close_connections()
+
+        legacy_path = os.path.join(workdir, "legacy.db")
+        shutil.copy(tuned_path, legacy_path)
+        conn = sqlite3.connect(legacy_path)
+        conn.execute("PRAGMA journal_mode = DELETE")
+        conn.close()
+
+        cases = {
+            "get_stock": lambda: db.get_stock(),
+            "add_sale": lambda: db.add_sale(
+                "2025-01-01", random.choice(batch_ids), 1, 2500.0, 2300.0, "Direct"),
+        }
+
+        results = {}
+        for name, fn in cases.items():
+            db.DB_PATH = legacy_path
+            with legacy_mode():
+                before = time_call(fn, repeat)
+            db.DB_PATH = tuned_path
+            fn()  # warm the pool
+            after = time_call(fn, repeat)
+            db.close_connections()
+            results[name] = (before, after)
+        return results
+    finally:
+        db.close_connections()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run_connections(args):
+    results = bench_connection_manager(args.products, args.rows, args.repeat)
+    print("before: a new connection per call; after: the tuned pool. Both run today's queries,")
+    print("migrations and triggers, so this is connection cost only, not a pre-series baseline.")
+    print(f"{'function':<12} {'before (median/p95 ms)':>24} {'after (median/p95 ms)':>24}")
+    for name, (before, after) in results.items():
+        print(f"{name:<12} {before['median_ms']:>11.3f} / {before['p95_ms']:<10.3f} "
+              f"{after['median_ms']:>11.3f} / {after['p95_ms']:<10.3f}")
+    return 0
+
+
+# --------------- Query plan check ---------------
+
+# Append-only history tables: a query that walks one of these, even through
+# a covering index, costs more as the ledger grows.
+LEDGER_TABLES = {"purchases", "sales", "expenses", "cash_flow", "capital"}
+
+# Words that can follow a table name in FROM or JOIN without being its alias.
+_SQL_KEYWORDS = {"WHERE", "LEFT", "INNER", "CROSS", "JOIN", "ON", "USING", "GROUP",
+                 "ORDER", "LIMIT", "UNION", "HAVING", "WINDOW", "INDEXED", "NOT", "AS"}
+
+# Readers whose result is the whole ledger, so a walk of it is the job.
+FULL_HISTORY_READS = {"get_all_cash_flow", "get_all_capital"}
+
+
+def plan_cases(batch_id):
+    """Every public read, called the way the views call it."""
+    return {
+        "get_all_products": lambda: db.get_all_products(),
+        "get_product": lambda: db.get_product(batch_id),
+        "get_product_categories": lambda: db.get_product_categories(),
+        "search_products": lambda: db.search_products("product 12", "Saree"),
+        "count_products(search)": lambda: db.count_products(None, "product 12"),
+        "next_batch_id": lambda: db.next_batch_id("Saree"),
+        "generate_batch_id": lambda: db.generate_batch_id("SR"),
+        "get_all_purchases(range)": lambda: db.get_all_purchases("2024-01-01", "2024-03-31"),
+        "get_total_purchased": lambda: db.get_total_purchased(batch_id),
+        "get_all_sales(range)": lambda: db.get_all_sales("2024-01-01", "2024-03-31"),
+        "get_all_sales(range, type)": lambda: db.get_all_sales("2024-01-01", "2024-03-31", "Direct"),
+        "get_sales_frame(range)": lambda: db.get_sales_frame("2024-01-01", "2024-03-31"),
+        "get_sales_by_channel": lambda: db.get_sales_by_channel(),
+        "get_sales_by_channel(range)": lambda: db.get_sales_by_channel("2024-01-15", "2024-03-10"),
+        "get_sales_by_product(top, category)": lambda: db.get_sales_by_product(None, None, "Saree", 10),
+        "get_sales_by_product(range)": lambda: db.get_sales_by_product("2024-01-15", "2024-03-10"),
+        "get_monthly_sales_by_channel": lambda: db.get_monthly_sales_by_channel(),
+        "get_total_sold": lambda: db.get_total_sold(batch_id),
+        "get_stock": lambda: db.get_stock(),
+        "get_available_stock": lambda: db.get_available_stock(batch_id),
+        "get_in_stock_products": lambda: db.get_in_stock_products(),
+        "get_all_expenses(range)": lambda: db.get_all_expenses("2024-01-01", "2024-03-31"),
+        "get_all_cash_flow": lambda: db.get_all_cash_flow(),
+        "get_cash_summary": lambda: db.get_cash_summary(),
+        "get_all_capital": lambda: db.get_all_capital(),
+        "get_capital_balance": lambda: db.get_capital_balance(),
+        "get_monthly_pnl": lambda: db.get_monthly_pnl(),
+        "get_monthly_revenue": lambda: db.get_monthly_revenue(),
+        "get_top_selling_products": lambda: db.get_top_selling_products(5),
+        "get_dashboard_kpis": lambda: db.get_dashboard_kpis(),
+        "get_recent_sales": lambda: db.get_recent_sales(5),
+        "get_recent_purchases": lambda: db.get_recent_purchases(5),
+        "get_low_stock_alerts": lambda: db.get_low_stock_alerts(),
+        "get_sales_page(range, type)": lambda: db.get_sales_page(
+            "2024-01-01", "2024-03-31", "Direct", cursor=("2024-02-01", 1)),
+        "get_sales_totals(range)": lambda: db.get_sales_totals("2024-01-01", "2024-03-31"),
+        "get_sales_totals(range, type)": lambda: db.get_sales_totals("2024-01-01", "2024-03-31", "Direct"),
+        "get_purchases_page(range)": lambda: db.get_purchases_page(
+            "2024-01-01", "2024-03-31", cursor=("2024-02-01", 1), direction="prev"),
+        "get_purchase_totals(range)": lambda: db.get_purchase_totals("2024-01-01", "2024-03-31"),
+        "get_monthly_purchase_totals(range)": lambda: db.get_monthly_purchase_totals("2024-01-01", "2024-03-31"),
+        "get_expenses_page(range)": lambda: db.get_expenses_page("2024-01-01", "2024-03-31"),
+        "get_expense_totals_by_type(range)": lambda: db.get_expense_totals_by_type("2024-01-01", "2024-03-31"),
+        "get_monthly_expense_totals(range)": lambda: db.get_monthly_expense_totals("2024-01-01", "2024-03-31"),
+        "get_cash_flow_page(last)": lambda: db.get_cash_flow_page(direction="prev"),
+        "get_pending_cash_flow_page": lambda: db.get_pending_cash_flow_page(cursor=("2024-02-01", 1)),
+        "get_capital_page(last)": lambda: db.get_capital_page(direction="prev"),
+    }
+
+
+def capture_statements(fn):
+    """Run fn and return the SELECT statements it sent to SQLite."""
+    statements = []
+
+    def trace(sql):
+        if sql.lstrip().upper().startswith(("SELECT", "WITH")):
+            statements.append(sql)
+
+    with db.connection() as conn:
+        conn.set_trace_callback(trace)
+        try:
+            fn()
+        finally:
+            conn.set_trace_callback(None)
+    return statements
+
+
+def full_scans(conn, sql):
+    """Plan lines that walk a ledger table instead of searching an index.
+
+    A SCAN counts whether or not it goes through an index; a covering index
+    only makes each row of the walk cheaper. The one exception is a walk in
+    index order that a LIMIT stops early, such as the newest five sales: it
+    is a SCAN with no temp B-tree for the ORDER BY in a statement with a
+    LIMIT, and reads no more rows than the LIMIT asks for.
+    """
+    aliases = {t: t for t in LEDGER_TABLES}
+    for table, alias in re.findall(r"\b(?:FROM|JOIN)\s+(\w+)\s+(?:AS\s+)?(\w+)", sql, re.I):
+        if table in LEDGER_TABLES and alias.upper() not in _SQL_KEYWORDS:
+            aliases[alias] = table
+    plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+    bounded = re.search(r"\bLIMIT\b", sql, re.I) and not any(d.startswith("USE TEMP B-TREE") for d in plan)
+    return [
+        detail for detail in plan
+        if detail.startswith("SCAN ") and detail.split()[1] in aliases
+        and not (bounded and " USING " in detail)
+    ]
+
+
+def check_query_plans(products, rows):
+    workdir = tempfile.mkdtemp(prefix="lookiva_plans_")
+    try:
+        batch_ids = seed(os.path.join(workdir, "plans.db"), products, rows)
+        failures = {}
+        with db.connection() as conn:
+            conn.execute("ANALYZE")
+            for name, fn in plan_cases(batch_ids[0]).items():
+                if name in FULL_HISTORY_READS:
+                    continue
+                db.clear_cache()
+                for sql in capture_statements(fn):
+                    bad = full_scans(conn, sql)
+                    if bad:
+                        failures.setdefault(name, []).append((" ".join(sql.split()), bad))
+        return failures
+    finally:
+        db.close_connections()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run_plans(args):
+    failures = check_query_plans(args.products, args.rows)
+    if not failures:
+        print(f"OK: no ledger table scans at {args.rows:,} rows")
+        return 0
+    for name, problems in failures.items():
+        for sql, bad in problems:
+            print(f"FAIL {name}: {'; '.join(bad)}\n    {sql[:200]}")
+    return 1
+
+
+# --------------- Workbook round trip ---------------
+
+ROUND_TRIP_TOTALS = {
+    "products": "COUNT(*)",
+    "purchases": "COUNT(*), SUM(quantity)",
+    "sales": "COUNT(*), SUM(quantity)",
+    "expenses": "COUNT(*), SUM(amount)",
+    "cash_flow": "COUNT(*), SUM(inflow), SUM(outflow)",
+    "capital": "COUNT(*), SUM(amount)",
+}
+
+
+def table_totals():
+    with db.connection() as conn:
+        return {table: tuple(conn.execute(f"SELECT {totals} FROM {table}").fetchone())
+                for table, totals in ROUND_TRIP_TOTALS.items()}
+
+
+def check_round_trip(products, rows):
+    """Per-table row counts and quantity/amount totals of a seeded database
+    vs an empty one filled by import_excel from its export_excel workbook;
+    returns {table: (source, reimported)} for the tables that differ."""
+    import export_excel
+    import import_excel
+
+    workdir = tempfile.mkdtemp(prefix="lookiva_roundtrip_")
+    try:
+        workbook = os.path.join(workdir, "export.xlsx")
+        seed(os.path.join(workdir, "source.db"), products, rows)
+        source = table_totals()
+        export_excel.export_workbook(workbook)
+
+        db.close_connections()
+        db.DB_PATH = os.path.join(workdir, "copy.db")
+        db.init_db()
+        import_excel.import_all(workbook)
+        copy = table_totals()
+        return {table: (source[table], copy[table]) for table in source if source[table] != copy[table]}
+    finally:
+        db.close_connections()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run_round_trip(args):
+    mismatches = check_round_trip(args.products, args.rows)
+    if not mismatches:
+        print(f"OK: every table survives export_excel -> import_excel at {args.rows:,} rows")
+        return 0
+    for table, (source, copy) in mismatches.items():
+        print(f"FAIL {table}: {source} exported, {copy} imported")
+    return 1
+
+
+# --------------- Columnar reads ---------------
+
+def peak_memory(fn):
+    """Peak Python-heap bytes allocated while fn runs (NumPy included)."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_frames(products, rows, repeat):
+    """The Sales Analysis frame built from sqlite3.Row lists vs off the cursor."""
+    import tables
+
+    workdir = tempfile.mkdtemp(prefix="lookiva_frames_")
+    try:
+        seed(os.path.join(workdir, "frames.db"), products, rows)
+        # The same statement through the row path, to separate the read
+        # itself from get_all_sales()'s wider SELECT s.*.
+        sql = capture_statements(db.get_sales_frame.uncached)[0]
+
+        def narrow_rows():
+            with db.connection() as conn:
+                return tables.frame(conn.execute(sql).fetchall())
+
+        cases = {
+            "frame(get_all_sales())": lambda: tables.frame(db.get_all_sales.uncached()),
+            "frame(rows), same query": narrow_rows,
+            "get_sales_frame()": db.get_sales_frame.uncached,
+        }
+        results = {}
+        for name, fn in cases.items():
+            df = fn()
+            results[name] = {
+                **time_call(fn, repeat),
+                "peak_mb": peak_memory(fn) / 1e6,
+                "frame_mb": df.memory_usage(deep=True).sum() / 1e6,
+            }
+            del df
+        return results
+    finally:
+        db.close_connections()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run_frames(args):
+    results = bench_frames(args.products, args.rows, args.repeat)
+    print(f"{args.rows:,} sales")
+    print(f"{'path':<26} {'median ms':>10} {'p95 ms':>10} {'peak MB':>9} {'frame MB':>9}")
+    for name, r in results.items():
+        print(f"{name:<26} {r['median_ms']:>10.0f} {r['p95_ms']:>10.0f} "
+              f"{r['peak_mb']:>9.1f} {r['frame_mb']:>9.1f}")
+    return 0
+
+
+# --------------- Concurrent writers ---------------
+
+def load_test(batch_ids, writers, writes, readers):
+    """`writers` threads each recording `writes` sales while `readers`
+    threads keep paging the sales history; returns throughput, latency and
+    error counts."""
+    latencies, read_latencies, errors = [], [], {}
+    lock = threading.Lock()
+    done = threading.Event()
+    start_line = threading.Barrier(writers + readers + 1)
+
+    def write(seed_value):
+        rng = random.Random(seed_value)
+        start_line.wait()
+        for _ in range(writes):
+            t0 = time.perf_counter()
+            try:
+                db.add_sale("2025-06-01", rng.choice(batch_ids), 1, 2500.0, 2300.0, "Direct")
+            except Exception as e:
+                with lock:
+                    errors[f"{type(e).__name__}: {e}"] = errors.get(f"{type(e).__name__}: {e}", 0) + 1
+                continue
+            with lock:
+                latencies.append((time.perf_counter() - t0) * 1000)
+
+    def read():
+        start_line.wait()
+        while not done.is_set():
+            t0 = time.perf_counter()
+            db.get_sales_page.uncached("2025-01-01", "2025-12-31")
+            with lock:
+                read_latencies.append((time.perf_counter() - t0) * 1000)
+
+    threads = [threading.Thread(target=write, args=(i,)) for i in range(writers)]
+    threads += [threading.Thread(target=read) for _ in range(readers)]
+    for t in threads:
+        t.start()
+    start_line.wait()
+    t0 = time.perf_counter()
+    for t in threads[:writers]:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    done.set()
+    for t in threads[writers:]:
+        t.join()
+    return {
+        "writes_per_s": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.5),
+        "p95_ms": percentile(latencies, 0.95),
+        "reads": len(read_latencies),
+        "read_p95_ms": percentile(read_latencies, 0.95),
+        "errors": errors,
+    }
+
+
+def bench_writes(products, rows, writers, writes, readers):
+    workdir = tempfile.mkdtemp(prefix="lookiva_writes_")
+    try:
+        path = os.path.join(workdir, "writes.db")
+        batch_ids = seed(path, products, rows)
+        results = {}
+        for name, enabled in (("transaction per write", False), ("write queue", True)):
+            db.close_connections()
+            shutil.copy(path, path + ".run")  # both runs start from the same data
+            db.DB_PATH = path + ".run"
+            db.WRITE_QUEUE_ENABLED = enabled
+            before = db.write_queue_stats()
+            results[name] = load_test(batch_ids, writers, writes, readers)
+            after = db.write_queue_stats()
+            commits = after["batches"] - before["batches"]
+            results[name]["mean_batch"] = (after["writes"] - before["writes"]) / commits if commits else 1.0
+            os.remove(path + ".run")
+        return results
+    finally:
+        db.WRITE_QUEUE_ENABLED = True
+        db.close_connections()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run_writes(args):
+    results = bench_writes(args.products, args.rows, args.writers, args.writes, args.readers)
+    print(f"{args.writers} writers x {args.writes} sales, {args.readers} readers")
+    print(f"{'mode':<22} {'writes/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'per commit':>10} "
+          f"{'reads':>6} {'read p95':>9} {'errors':>7}")
+    for name, r in results.items():
+        print(f"{name:<22} {r['writes_per_s']:>9.0f} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} "
+              f"{r['mean_batch']:>10.1f} {r['reads']:>6} {r['read_p95_ms']:>9.2f} "
+              f"{sum(r['errors'].values()):>7}")
+        for error, count in r["errors"].items():
+            print(f"    {count} x {error}")
+    return 0
+
+
+# --------------- Dashboard loading ---------------
+
+def bench_dashboard(products, rows, repeat):
+    """Per-widget and total dashboard load time, one widget after another
+    vs load_dashboard()'s thread pool; medians in ms."""
+    workdir = tempfile.mkdtemp(prefix="lookiva_dashboard_")
+    try:
+        seed(os.path.join(workdir, "dashboard.db"), products, rows)
+        db.load_dashboard()  # warm both pools and the thread pool
+        sequential, parallel = [], []
+        for _ in range(repeat):
+            timings = {}
+            start = time.perf_counter()
+            for name, reader in db.DASHBOARD_WIDGETS.items():
+                t0 = time.perf_counter()
+                reader()
+                timings[name] = (time.perf_counter() - t0) * 1000
+            timings["total"] = (time.perf_counter() - start) * 1000
+            sequential.append(timings)
+            parallel.append(db.load_dashboard().timings)
+        return {
+            name: (statistics.median(t[name] for t in sequential),
+                   statistics.median(t[name] for t in parallel))
+            for name in sequential[0]
+        }
+    finally:
+        db.close_connections()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run_dashboard(args):
+    results = bench_dashboard(args.products, args.rows, args.repeat)
+    print(f"{'widget':<18} {'sequential ms':>14} {'parallel ms':>12}")
+    for name, (seq, par) in results.items():
+        print(f"{name:<18} {seq:>14.1f} {par:>12.1f}")
+    return 0
+
+
+# --------------- Product search ---------------
+
+# What the Products search box ran before the FTS index: a LIKE scan of
+# name and batch ID for the count, and again for the first page.
+LIKE_SEARCH = """
+    SELECT pr.batch_id, pr.product_name, COALESCE(sl.closing_stock, 0) as stock
+    FROM products pr LEFT JOIN stock_levels sl ON pr.batch_id = sl.batch_id
+    WHERE pr.product_name LIKE ? OR pr.batch_id LIKE ?
+    ORDER BY pr.first_purchase_date DESC, pr.batch_id LIMIT 100
+"""
+LIKE_COUNT = "SELECT COUNT(*) FROM products pr WHERE pr.product_name LIKE ? OR pr.batch_id LIKE ?"
+
+SEARCHES = ["product 4242", "SR0004", "blouse", "prod"]
+
+
+def bench_search(products, repeat):
+    workdir = tempfile.mkdtemp(prefix="lookiva_search_")
+    try:
+        seed(os.path.join(workdir, "search.db"), products, 1000)
+
+        def like(text):
+            pattern = f"%{text}%"
+            with db.connection() as conn:
+                conn.execute(LIKE_COUNT, (pattern, pattern)).fetchone()
+                conn.execute(LIKE_SEARCH, (pattern, pattern)).fetchall()
+
+        def fts(text):
+            db.count_products(None, text)
+            db.search_products(text)
+
+        return {text: (time_call(lambda: like(text), repeat), time_call(lambda: fts(text), repeat))
+                for text in SEARCHES}
+    finally:
+        db.close_connections()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run_search(args):
+    results = bench_search(args.products, args.repeat)
+    print(f"{args.products:,} products; count + first 100 results")
+    print(f"{'query':<14} {'LIKE (median/p95 ms)':>22} {'FTS5 (median/p95 ms)':>22}")
+    for text, (like, fts) in results.items():
+        print(f"{text:<14} {like['median_ms']:>10.2f} / {like['p95_ms']:<9.2f} "
+              f"{fts['median_ms']:>10.2f} / {fts['p95_ms']:<9.2f}")
+    return 0
+
+
+# --------------- Sales analysis ---------------
+
+def _pandas_analysis(start_date=None, end_date=None):
+    # What the Reports sales analysis did before sales_summary: every sale
+    # in the range as a DataFrame, grouped three ways in pandas.
+    df = db.get_sales_frame(start_date, end_date)
+    df["revenue"] = df["selling_price_retailer"] * df["quantity"]
+    df["margin"] = (df["selling_price_retailer"] - df["product_cost"].fillna(0)) * df["quantity"]
+    aggs = dict(revenue=("revenue", "sum"), units=("quantity", "sum"), margin=("margin", "sum"))
+    df.groupby("sale_type", observed=True).agg(**aggs)
+    df.groupby("product_name", observed=True).agg(**aggs).sort_values("revenue", ascending=False)
+    df["month"] = df["date"].dt.to_period("M").dt.start_time
+    df.groupby(["month", "sale_type"], observed=True)["revenue"].sum()
+
+
+def _sql_analysis(start_date=None, end_date=None):
+    db.get_sales_by_channel(start_date, end_date)
+    db.get_sales_by_product(start_date, end_date)
+    db.get_monthly_sales_by_channel(start_date, end_date)
+
+
+def bench_analysis(products, rows, repeat):
+    workdir = tempfile.mkdtemp(prefix="lookiva_analysis_")
+    try:
+        seed(os.path.join(workdir, "analysis.db"), products, rows)
+        ranges = {"all sales": (None, None), "2024-01-15..2024-03-10": ("2024-01-15", "2024-03-10")}
+        return {name: (time_call(lambda: _pandas_analysis(*r), repeat), time_call(lambda: _sql_analysis(*r), repeat))
+                for name, r in ranges.items()}
+    finally:
+        db.close_connections()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run_analysis(args):
+    results = bench_analysis(args.products, args.rows, args.repeat)
+    print(f"{args.rows:,} sales, {args.products:,} products; channel + product + month x channel")
+    print(f"{'range':<24} {'pandas (median/p95 ms)':>24} {'SQL (median/p95 ms)':>24}")
+    for name, (before, after) in results.items():
+        print(f"{name:<24} {before['median_ms']:>11.1f} / {before['p95_ms']:<10.1f} "
+              f"{after['median_ms']:>11.1f} / {after['p95_ms']:<10.1f}")
+    return 0
+
+
+# --------------- Query stats overhead ---------------
+
+def bench_query_stats(products, rows, repeat, json_path=None):
+    """Median call time of a few readers without the stats wrapper, with it
+    disabled, and with it enabled; optionally dumps the collected stats."""
+    workdir = tempfile.mkdtemp(prefix="lookiva_stats_")
+    try:
+        batch_ids = seed(os.path.join(workdir, "stats.db"), products, rows)
+        readers = {
+            "get_product": (db.get_product, (batch_ids[0],)),
+            "get_sales_page": (db.get_sales_page, ("2024-01-01", "2024-03-31")),
+            "get_stock": (db.get_stock, ()),
+        }
+        results = {}
+        for name, (reader, args) in readers.items():
+            modes = {}
+            for mode, fn, enabled in (("baseline", reader.__wrapped__, False),
+                                      ("disabled", reader, False),
+                                      ("enabled", reader, True)):
+                db.enable_query_stats(enabled)
+                fn(*args)  # open the connection outside the timing
+                modes[mode] = time_call(lambda: fn(*args), repeat)["median_ms"]
+            results[name] = modes
+        if json_path:
+            db.dump_query_stats(json_path)
+        return results
+    finally:
+        db.enable_query_stats(False)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run_stats(args):
+    results = bench_query_stats(args.products, args.rows, args.repeat, args.json)
+    print(f"{'reader':<16} {'baseline ms':>12} {'disabled ms':>12} {'enabled ms':>11}")
+    for name, modes in results.items():
+        print(f"{name:<16} {modes['baseline']:>12.4f} {modes['disabled']:>12.4f} {modes['enabled']:>11.4f}")
+    if args.json:
+        print(f"Stats written to {args.json}")
+    return 0
+
+
+# --------------- Streamlit script runs ---------------
+
+VIEWS = ["dashboard", "products", "purchases", "sales", "stock", "expenses", "cash_flow", "reports",
+         "admin"]
+
+
+def time_views(repeat):
+    """Median script-run time of the whole app and of each page on its own,
+    against the current db.DB_PATH."""
+    from streamlit.testing.v1 import AppTest
+
+    scripts = {"app.py (default page)": AppTest.from_file(
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py"), default_timeout=600)}
+    for view in VIEWS:
+        scripts[f"views/{view}.py"] = AppTest.from_string(
+            f"from views import {view}\n{view}.render()\n", default_timeout=600)
+
+    results = {}
+    for name, at in scripts.items():
+        at.run()  # first run imports modules and warms caches
+        if at.exception:
+            raise RuntimeError(f"{name}: {at.exception[0].value}")
+        results[name] = time_call(at.run, repeat)
+    return results
+
+
+def bench_views(products, rows, repeat):
+    workdir = tempfile.mkdtemp(prefix="lookiva_app_")
+    try:
+        seed(os.path.join(workdir, "app.db"), products, rows)
+        return time_views(repeat)
+    finally:
+        db.close_connections()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run_app(args):
+    results = bench_views(args.products, args.rows, args.repeat)
+    print(f"{'script':<24} {'median ms':>10} {'p95 ms':>10}")
+    for name, r in results.items():
+        print(f"{name:<24} {r['median_ms']:>10.1f} {r['p95_ms']:>10.1f}")
+    return 0
+
+
+# --------------- App startup ---------------
+
+# Run in a fresh interpreter, so the first script run pays for the module
+# imports and db.bootstrap() as a newly started server would.
+STARTUP_SCRIPT = """
+import json, sys, time
+t0 = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file(sys.argv[1], default_timeout=600)
+t1 = time.perf_counter()
+at.run()
+t2 = time.perf_counter()
+if at.exception:
+    sys.exit(at.exception[0].value)
+reruns = []
+for _ in range(int(sys.argv[2])):
+    t = time.perf_counter()
+    at.run()
+    reruns.append((time.perf_counter() - t) * 1000)
+print(json.dumps({"streamlit_ms": (t1 - t0) * 1000, "first_run_ms": (t2 - t1) * 1000,
+                  "reruns_ms": reruns, "import_excel": "import_excel" in sys.modules}))
+"""
+
+
+def bench_startup(products, rows, repeat, reruns):
+    """Cold start (a new process's first script run) vs warm reruns of
+    app.py, plus the per-rerun cost bootstrap() saves; medians in ms."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    workdir = tempfile.mkdtemp(prefix="lookiva_startup_")
+    try:
+        path = os.path.join(workdir, "startup.db")
+        seed(path, products, rows)
+        env = {**os.environ, "LOOKIVA_DB_PATH": path}
+        runs = []
+        for _ in range(repeat):
+            out = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT, os.path.join(here, "app.py"), str(reruns)],
+                                 cwd=here, env=env, capture_output=True, text=True, check=True)
+            runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+        db.bootstrap()
+        return {
+            "streamlit import": statistics.median(r["streamlit_ms"] for r in runs),
+            "cold first run": statistics.median(r["first_run_ms"] for r in runs),
+            "warm rerun": statistics.median(ms for r in runs for ms in r["reruns_ms"]),
+            "init_db + is_db_empty": time_call(lambda: (db.init_db(), db.is_db_empty()), 50)["median_ms"],
+            "bootstrap (done)": time_call(db.bootstrap, 50)["median_ms"],
+        }, any(r["import_excel"] for r in runs)
+    finally:
+        db.close_connections()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run_startup(args):
+    results, imported = bench_startup(args.products, args.rows, args.repeat, args.reruns)
+    print(f"{'step':<24} {'median ms':>10}")
+    for name, ms in results.items():
+        print(f"{name:<24} {ms:>10.2f}")
+    print(f"import_excel loaded: {'yes' if imported else 'no'}")
+    return 0
+
+
+# --------------- Scale suite ---------------
+
+SUITE_SCALES = [1000, 100000, 1000000]
+
+# Public database.py names that are plumbing for the readers and writers,
+# not app queries; every other public function must have a suite case.
+SUITE_SKIP = {
+    "get_connection", "close_connections", "connection", "transaction", "bulk_load",
+    "cached", "cache_stats", "clear_cache", "queued", "write_queue_stats",
+    "enable_query_stats", "query_stats", "reset_query_stats", "dump_query_stats",
+    "fetch_columns", "fetch_frame", "init_db", "bootstrap",
+}
+
+
+def suite_cases(batch_ids):
+    """plan_cases() plus the writes and the maintenance commands."""
+    new_ids = (f"BN{i:05d}BENCH" for i in itertools.count(1))
+    added = []  # products add_product created, for delete_product to remove
+    return {
+        **plan_cases(batch_ids[0]),
+        "list_products": lambda: db.list_products(limit=50),
+        "count_products": lambda: db.count_products("Saree"),
+        "batch_prefix": lambda: db.batch_prefix("Saree"),
+        "get_daily_totals": lambda: db.get_daily_totals("2024-01-01", "2024-03-31"),
+        "is_db_empty": lambda: db.is_db_empty(),
+        "load_dashboard": lambda: db.load_dashboard(),
+        "iter_export(range)": lambda: sum(1 for _ in db.iter_export("sales", "2024-01-01", "2024-03-31")),
+        "add_product": lambda: added.append(db.add_product(
+            next(new_ids), None, "Saree", "Bench product", cost_per_unit=1000.0)),
+        "update_product": lambda: db.update_product(batch_ids[1], remarks="bench"),
+        "delete_product": lambda: db.delete_product(added.pop()),
+        "add_purchase": lambda: db.add_purchase("2025-06-01", batch_ids[2], "Supplier A", 2, 1000.0),
+        "add_sale": lambda: db.add_sale("2025-06-01", batch_ids[2], 1, 2500.0, 2300.0, "Indirect"),
+        "add_expense": lambda: db.add_expense("2025-06-01", "Transport", "Bench", 250.0),
+        "add_cash_flow": lambda: db.add_cash_flow("2025-06-01", "Bench", inflow=500.0),
+        "update_cash_flow_status": lambda: db.update_cash_flow_status(1, "Completed"),
+        "add_capital": lambda: db.add_capital("2025-06-01", "Bench", "Capital In", 5000.0),
+        "verify_stock_levels": lambda: db.verify_stock_levels(),
+        "rebuild_stock_levels": lambda: db.rebuild_stock_levels(),
+        "verify_rollups": lambda: db.verify_rollups(),
+        "rebuild_rollups": lambda: db.rebuild_rollups(),
+        "verify_sales_summary": lambda: db.verify_sales_summary(),
+        "rebuild_sales_summary": lambda: db.rebuild_sales_summary(),
+        "verify_ledger_totals": lambda: db.verify_ledger_totals(),
+        "rebuild_ledger_totals": lambda: db.rebuild_ledger_totals(),
+        "verify_search_index": lambda: db.verify_search_index(),
+        "rebuild_search_index": lambda: db.rebuild_search_index(),
+    }
+
+
+def untimed_functions(cases):
+    """Public database.py functions that no suite case calls."""
+    covered = {name.split("(")[0] for name in cases}
+    return sorted(
+        name for name, fn in vars(db).items()
+        if inspect.isfunction(fn) and fn.__module__ == db.__name__
+        and not name.startswith("_") and name not in SUITE_SKIP | covered
+    )
+
+
+def bench_scale(rows, repeat, views=True):
+    """Seed `rows` purchases and sales (one product per 20 rows) and time
+    every suite case and, optionally, every page."""
+    workdir = tempfile.mkdtemp(prefix="lookiva_suite_")
+    try:
+        path = os.path.join(workdir, "suite.db")
+        products = max(rows // 20, 50)
+        t0 = time.perf_counter()
+        batch_ids = seed(path, products, rows)
+        result = {
+            "products": products,
+            "rows": rows,
+            "seed_s": round(time.perf_counter() - t0, 2),
+            "db_mb": round(os.path.getsize(path) / 1e6, 1),
+            "functions": {},
+            "errors": {},
+        }
+        with db.connection() as conn:
+            conn.execute("ANALYZE")
+        for name, fn in suite_cases(batch_ids).items():
+            try:
+                fn()  # warm the connection and the statement cache
+                result["functions"][name] = time_call(fn, repeat)
+            except Exception as e:
+                result["errors"][name] = f"{type(e).__name__}: {e}"
+            gc.collect()
+        if views:
+            result["views"] = time_views(repeat)
+        return result
+    finally:
+        db.close_connections()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def regressions(report, baseline, tolerance, min_ms):
+    """(scale, section, name, before, after) for every median that grew by
+    more than `tolerance` times and by more than `min_ms`."""
+    slower = []
+    for scale, result in report["scales"].items():
+        old = baseline.get("scales", {}).get(scale)
+        if not old:
+            continue
+        for section in ("functions", "views"):
+            for name, timing in result.get(section, {}).items():
+                before = old.get(section, {}).get(name)
+                if before is None:
+                    continue
+                b, a = before["median_ms"], timing["median_ms"]
+                if a > b * tolerance and a - b > min_ms:
+                    slower.append((scale, section, name, b, a))
+    return slower
+
+
+def run_suite(args):
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "repeat": args.repeat,
+        "untimed": untimed_functions(suite_cases(["SR00001JAN23"] * 3)),
+        "scales": {},
+    }
+    for rows in args.scales:
+        print(f"--- {rows:,} rows", flush=True)
+        result = report["scales"][str(rows)] = bench_scale(rows, args.repeat, not args.no_views)
+        print(f"seeded {result['products']:,} products in {result['seed_s']:.1f}s "
+              f"({result['db_mb']:.1f} MB)")
+        for section in ("functions", "views"):
+            for name, timing in result.get(section, {}).items():
+                print(f"{name:<40} {timing['median_ms']:>10.2f} ms  p95 {timing['p95_ms']:>10.2f}")
+        for name, error in result["errors"].items():
+            print(f"ERROR {name}: {error}")
+        with open(args.json, "w") as f:  # rewritten after each scale, so a long run keeps its results
+            json.dump(report, f, indent=2)
+    print(f"Report written to {args.json}")
+
+    status = 0
+    if report["untimed"]:
+        print(f"No suite case for: {', '.join(report['untimed'])}")
+        status = 1
+    if any(result["errors"] for result in report["scales"].values()):
+        status = 1
+    if args.baseline:
+        with open(args.baseline) as f:
+            slower = regressions(report, json.load(f), args.tolerance, args.min_ms)
+        for scale, section, name, before, after in slower:
+            print(f"SLOWER at {int(scale):,} rows: {name} {before:.2f} -> {after:.2f} ms")
+        if slower:
+            status = 1
+        else:
+            print(f"No regressions against {args.baseline}")
+    return status
+
+
+# --------------- Data generator ---------------
+
+def run_generate(args):
+    if os.path.exists(args.path):
+        print(f"{args.path} already exists; choose a new file")
+        return 1
+    t0 = time.perf_counter()
+    seed(args.path, args.products, args.rows, args.seed, args.years, args.return_rate, args.ledger_rows)
+    print(f"Wrote {args.path} in {time.perf_counter() - t0:.1f}s; "
+          f"open it with LOOKIVA_DB_PATH={args.path}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command")
+
+    p_conn = sub.add_parser("connections", help="pooled vs open-per-call latency")
+    p_conn.add_argument("--products", type=int, default=2000)
+    p_conn.add_argument("--rows", type=int, default=20000)
+    p_conn.add_argument("--repeat", type=int, default=200)
+    p_conn.set_defaults(func=run_connections)
+
+    p_plans = sub.add_parser("plans", help="fail on full ledger scans")
+    p_plans.add_argument("--products", type=int, default=50000)
+    p_plans.add_argument("--rows", type=int, default=1000000)
+    p_plans.set_defaults(func=run_plans)
+
+    p_trip = sub.add_parser("roundtrip", help="fail unless an exported workbook imports back unchanged")
+    p_trip.add_argument("--products", type=int, default=500)
+    p_trip.add_argument("--rows", type=int, default=5000)
+    p_trip.set_defaults(func=run_round_trip)
+
+    p_app = sub.add_parser("app", help="Streamlit script-run time per page")
+    p_app.add_argument("--products", type=int, default=5000)
+    p_app.add_argument("--rows", type=int, default=200000)
+    p_app.add_argument("--repeat", type=int, default=3)
+    p_app.set_defaults(func=run_app)
+
+    p_startup = sub.add_parser("startup", help="app.py cold start vs warm rerun")
+    p_startup.add_argument("--products", type=int, default=5000)
+    p_startup.add_argument("--rows", type=int, default=200000)
+    p_startup.add_argument("--repeat", type=int, default=3, help="fresh processes to start")
+    p_startup.add_argument("--reruns", type=int, default=10, help="warm reruns per process")
+    p_startup.set_defaults(func=run_startup)
+
+    p_frames = sub.add_parser("frames", help="row-list vs columnar DataFrame reads: time and memory")
+    p_frames.add_argument("--products", type=int, default=5000)
+    p_frames.add_argument("--rows", type=int, default=1000000)
+    p_frames.add_argument("--repeat", type=int, default=3)
+    p_frames.set_defaults(func=run_frames)
+
+    p_writes = sub.add_parser("writes", help="concurrent writers: transaction per write vs the write queue")
+    p_writes.add_argument("--products", type=int, default=2000)
+    p_writes.add_argument("--rows", type=int, default=200000)
+    p_writes.add_argument("--writers", type=int, default=20)
+    p_writes.add_argument("--writes", type=int, default=200)
+    p_writes.add_argument("--readers", type=int, default=2)
+    p_writes.set_defaults(func=run_writes)
+
+    p_dash = sub.add_parser("dashboard", help="dashboard widgets loaded in sequence vs in parallel")
+    p_dash.add_argument("--products", type=int, default=5000)
+    p_dash.add_argument("--rows", type=int, default=200000)
+    p_dash.add_argument("--repeat", type=int, default=10)
+    p_dash.set_defaults(func=run_dashboard)
+
+    p_search = sub.add_parser("search", help="product search: LIKE scan vs the FTS5 index")
+    p_search.add_argument("--products", type=int, default=100000)
+    p_search.add_argument("--repeat", type=int, default=20)
+    p_search.set_defaults(func=run_search)
+
+    p_analysis = sub.add_parser("analysis", help="Reports sales analysis: pandas groupby vs sales_summary")
+    p_analysis.add_argument("--products", type=int, default=5000)
+    p_analysis.add_argument("--rows", type=int, default=1000000)
+    p_analysis.add_argument("--repeat", type=int, default=3)
+    p_analysis.set_defaults(func=run_analysis)
+
+    p_stats = sub.add_parser("stats", help="cost of the query instrumentation, off and on")
+    p_stats.add_argument("--products", type=int, default=2000)
+    p_stats.add_argument("--rows", type=int, default=20000)
+    p_stats.add_argument("--repeat", type=int, default=2000)
+    p_stats.add_argument("--json", help="also write the collected stats to this JSON file")
+    p_stats.set_defaults(func=run_stats)
+
+    p_suite = sub.add_parser("suite", help="every public function and page at 1k/100k/1M rows, as JSON")
+    p_suite.add_argument("--scales", type=lambda v: [int(n) for n in v.split(",")], default=SUITE_SCALES,
+                         help="comma-separated purchase/sale row counts")
+    p_suite.add_argument("--repeat", type=int, default=5)
+    p_suite.add_argument("--no-views", action="store_true", help="skip the Streamlit page runs")
+    p_suite.add_argument("--json", default="benchmark_report.json", help="report to write")
+    p_suite.add_argument("--baseline", help="earlier report; exit non-zero on slower medians")
+    p_suite.add_argument("--tolerance", type=float, default=1.5, help="allowed slowdown factor")
+    p_suite.add_argument("--min-ms", type=float, default=1.0, help="ignore slowdowns smaller than this")
+    p_suite.set_defaults(func=run_suite)
+
+    p_gen = sub.add_parser("generate", help="write a synthetic database to open in the app")
+    p_gen.add_argument("path", help="new database file")
+    p_gen.add_argument("--products", type=int, default=5000)
+    p_gen.add_argument("--rows", type=int, default=100000, help="purchases, and again sales")
+    p_gen.add_argument("--ledger-rows", type=int, help="expenses, cash flow and capital each (default rows/10)")
+    p_gen.add_argument("--years", type=float, default=3)
+    p_gen.add_argument("--return-rate", type=float, default=0.05)
+    p_gen.add_argument("--seed", type=int, default=42)
+    p_gen.set_defaults(func=run_generate)
+
+    args = parser.parse_args()
+    if args.command is None:
+        parser.print_help()
+        return 2
+
+    # Measure the queries themselves, not the result cache.
+    db.QUERY_CACHE_ENABLED = False
+    original_path = db.DB_PATH
+    try:
+        return args.func(args)
+    finally:
+        db.DB_PATH = original_path
+
+
+if __name__ == "__main__":
+    sys.exit(main())
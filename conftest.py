@@ -0,0 +1,2 @@
+# Keeps the repository root on sys.path, so the tests import database,
+# benchmark and the other top-level modules however pytest is started.
@@ -1,536 +1,1872 @@
 import sqlite3
 import os
-from datetime import datetime, date
+import re
+import json
+import time
+import bisect
+import queue
+import atexit
+import threading
+import functools
+from types import MappingProxyType
+from typing import NamedTuple
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, date, timedelta
+from urllib.request import pathname2url
+
+import numpy as np
+import pandas as pd
+
+import migrations
+
+DB_PATH = os.environ.get(
+    "LOOKIVA_DB_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "lookiva.db"),
+)
+
+# Connection tuning applied to every pooled connection.
+BUSY_TIMEOUT_MS = 5000
+CACHE_SIZE_KB = 20000
+MMAP_SIZE = 256 * 1024 * 1024
+POOL_MAX_IDLE = 8
+
+
+def get_connection(read_only=False):
+    """Open a new tuned connection. Prefer connection()/transaction().
+
+    A read-only connection opens the file with mode=ro and skips the
+    write-side settings; the database must already be in WAL mode.
+    """
+    factory = _TracedConnection if QUERY_STATS_ENABLED else sqlite3.Connection
+    if read_only:
+        uri = f"file:{pathname2url(os.path.abspath(DB_PATH))}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, timeout=BUSY_TIMEOUT_MS / 1000,
+                               check_same_thread=False, factory=factory)
+    else:
+        conn = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT_MS / 1000,
+                               check_same_thread=False, factory=factory)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA foreign_keys = ON")
+    conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    return conn
 
-DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "lookiva.db")
 
+class _ConnectionPool:
+    """Keeps idle long-lived connections to one database file for reuse."""
+
+    def __init__(self, path, read_only=False, max_idle=POOL_MAX_IDLE):
+        self.path = path
+        self.read_only = read_only
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return get_connection(self.read_only)
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+_pools = {}  # read_only -> _ConnectionPool
+_pool_lock = threading.Lock()
+_local = threading.local()
+
+
+def _get_pool(read_only=False):
+    with _pool_lock:
+        pool = _pools.get(read_only)
+        if pool is None or pool.path != DB_PATH:
+            if pool is not None:
+                pool.close_all()
+            pool = _pools[read_only] = _ConnectionPool(DB_PATH, read_only)
+        return pool
+
+
+def close_connections():
+    """Close every idle pooled connection (e.g. before swapping DB_PATH)."""
+    with _pool_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close_all()
+    _query_cache.close()
+
+
+@contextmanager
+def connection(read_only=False):
+    """Borrow this thread's pooled connection.
+
+    Nested use on the same thread reuses the connection that is already
+    checked out, so helpers can call each other without opening more.
+    `read_only` borrows from a separate pool of mode=ro connections; asking
+    for one while a writable connection is checked out raises RuntimeError
+    rather than quietly reading on the write connection.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        if read_only and not _local.read_only:
+            raise RuntimeError("read-only connection requested inside a writable one")
+        yield conn
+        return
+
+    pool = _get_pool(read_only)
+    conn = pool.acquire()
+    _local.conn, _local.read_only = conn, read_only
+    try:
+        yield conn
+    finally:
+        _local.conn = None
+        pool.release(conn)
+
+
+@contextmanager
+def transaction(*tables):
+    """Run the block in one transaction, committing on success.
+
+    `tables` names what the block writes; cached reads of those tables are
+    invalidated once the outermost transaction commits. No tables means
+    anything may have changed. An inner transaction() joins the outer one
+    instead of committing early. Raises RuntimeError inside a read-only
+    connection().
+    """
+    with connection() as conn:
+        if _local.read_only:
+            raise RuntimeError("transaction() inside a read-only connection")
+        if getattr(_local, "tx_depth", 0):
+            _local.tx_depth += 1
+            if not tables or _local.tx_tables is None:
+                _local.tx_tables = None
+            else:
+                _local.tx_tables |= set(tables)
+            try:
+                yield conn
+            finally:
+                _local.tx_depth -= 1
+            return
+
+        _local.tx_depth = 1
+        _local.tx_tables = set(tables) if tables else None
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        else:
+            _query_cache.invalidate(_local.tx_tables)
+        finally:
+            _local.tx_depth = 0
+            _local.tx_tables = None
+
+
+@contextmanager
+def bulk_load(*tables):
+    """transaction() for loading many ledger rows at once.
+
+    The per-row stock, rollup and totals triggers are dropped for the
+    duration and stock_levels, the daily, monthly and ledger totals and
+    sales_summary are rebuilt from the ledgers once the block finishes; the
+    whole swap commits or rolls back with the load.
+    """
+    triggers = (migrations.STOCK_TRIGGERS + migrations.ROLLUP_TRIGGERS
+                + migrations.SALES_SUMMARY_TRIGGERS + migrations.LEDGER_TOTALS_TRIGGERS)
+    with transaction(*tables) as conn:
+        # DDL does not open a transaction implicitly; without this the
+        # DROPs would autocommit and survive a rollback.
+        if not conn.in_transaction:
+            conn.execute("BEGIN IMMEDIATE")
+        for sql in triggers:
+            name = re.search(r"TRIGGER IF NOT EXISTS (\w+)", sql).group(1)
+            conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+        yield conn
+        for sql in (migrations.REBUILD_STOCK_LEVELS + migrations.REBUILD_ROLLUPS
+                    + migrations.REBUILD_SALES_SUMMARY + migrations.REBUILD_LEDGER_TOTALS
+                    + triggers):
+            conn.execute(sql)
+
+
+# --------------- Query Cache ---------------
+# Reader results are cached process-wide, so every Streamlit session shares
+# them. Entries are keyed by arguments and by the write version of each
+# table the reader depends on; transaction(*tables) bumps those versions on
+# commit, and commits from other connections or processes are detected
+# through PRAGMA data_version. Cached results must be treated as read-only;
+# DataFrames are the exception, as each caller gets its own shallow copy.
+
+QUERY_CACHE_ENABLED = os.environ.get("LOOKIVA_QUERY_CACHE", "1") != "0"
+QUERY_CACHE_MAX_ENTRIES = 256
+QUERY_CACHE_MAX_ROWS = 100000
+
+TABLES = ("products", "purchases", "sales", "expenses", "cash_flow", "capital")
+
+
+class _QueryCache:
+    """Bounded LRU of reader results with per-table write versions."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (tables, value)
+        self._versions = dict.fromkeys(TABLES, 0)
+        self._lock = threading.Lock()
+        self._watch = None  # connection used only to read PRAGMA data_version
+        self._watch_path = None
+        self._data_version = None
+        self.hits = self.misses = self.evictions = 0
+
+    def _read_data_version(self):
+        if self._watch is None or self._watch_path != DB_PATH:
+            if self._watch is not None:
+                self._watch.close()
+            self._watch = sqlite3.connect(DB_PATH, check_same_thread=False)
+            self._watch_path = DB_PATH
+            self._data_version = None
+        return self._watch.execute("PRAGMA data_version").fetchone()[0]
+
+    def _drop(self, tables):
+        if tables is None:
+            for t in self._versions:
+                self._versions[t] += 1
+            self._entries.clear()
+            return
+        for t in tables:
+            self._versions[t] += 1
+        stale = [k for k, (deps, _) in self._entries.items() if deps & tables]
+        for k in stale:
+            del self._entries[k]
+
+    def _sync_external(self):
+        # data_version changes whenever another connection commits. Our own
+        # commits refresh the baseline in invalidate(), so a change seen
+        # here came from outside transaction(): drop everything.
+        version = self._read_data_version()
+        if self._data_version is not None and version != self._data_version:
+            self._drop(None)
+        self._data_version = version
+
+    def key(self, name, args, kwargs, tables):
+        with self._lock:
+            self._sync_external()
+            versions = tuple(self._versions[t] for t in tables)
+        return (DB_PATH, name, args, frozenset(kwargs.items()), versions)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+
+    def put(self, key, tables, value):
+        if isinstance(value, (list, pd.DataFrame)) and len(value) > QUERY_CACHE_MAX_ROWS:
+            return
+        with self._lock:
+            # A write that committed while the query ran has already bumped
+            # the versions, so this key can no longer be looked up; skip it.
+            if key[-1] != tuple(self._versions[t] for t in sorted(tables)):
+                return
+            self._entries[key] = (tables, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, tables=None):
+        with self._lock:
+            self._drop(None if tables is None else set(tables))
+            self._data_version = self._read_data_version()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def close(self):
+        with self._lock:
+            if self._watch is not None:
+                self._watch.close()
+            self._watch = self._watch_path = self._data_version = None
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "versions": dict(self._versions),
+            }
+
+
+_query_cache = _QueryCache(QUERY_CACHE_MAX_ENTRIES)
+
+
+def cached(*tables):
+    """Cache a reader's result until one of `tables` is written."""
+    deps = tuple(sorted(tables))
+    dep_set = frozenset(tables)
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            # Inside a transaction the caller must see its own uncommitted writes.
+            if not QUERY_CACHE_ENABLED or getattr(_local, "tx_depth", 0):
+                return fn(*args, **kwargs)
+            try:
+                key = _query_cache.key(fn.__name__, args, kwargs, deps)
+                hash(key)
+            except TypeError:
+                return fn(*args, **kwargs)
+            hit, value = _query_cache.get(key)
+            if not hit:
+                value = fn(*args, **kwargs)
+                _query_cache.put(key, dep_set, value)
+            if isinstance(value, pd.DataFrame):
+                # Copy-on-write keeps a shallow copy's edits off the cached frame.
+                return value.copy(deep=False)
+            return value
+
+        wrapper.uncached = fn
+        return _timed(wrapper)
+
+    return decorator
+
+
+def cache_stats():
+    return _query_cache.stats()
+
+
+def clear_cache():
+    _query_cache.clear()
+
+
+# --------------- Query Stats ---------------
+# Opt-in instrumentation. While enabled, every @cached reader and @queued
+# writer records its calls, latency and rows returned, and pooled
+# connections are opened with a cursor class that does the same for each
+# SQL statement, timing its execute and fetches. A statement slower than
+# SLOW_QUERY_MS goes to a bounded slow-query log with its EXPLAIN QUERY
+# PLAN. Disabled (the default), connections are plain sqlite3 ones and
+# the decorators cost one flag check per call.
+#
+# LOOKIVA_QUERY_STATS=1 enables it at start-up, LOOKIVA_SLOW_QUERY_MS sets
+# the threshold and LOOKIVA_QUERY_STATS_FILE names a JSON file the summary
+# is written to at exit. The hidden /admin page shows it live.
+
+QUERY_STATS_ENABLED = os.environ.get("LOOKIVA_QUERY_STATS", "0") == "1"
+SLOW_QUERY_MS = float(os.environ.get("LOOKIVA_SLOW_QUERY_MS", "100"))
+QUERY_STATS_FILE = os.environ.get("LOOKIVA_QUERY_STATS_FILE")
+SLOW_LOG_SIZE = 200
+
+# Upper bounds (ms) of the latency histogram buckets; one more bucket
+# counts everything slower.
+LATENCY_BUCKETS_MS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000)
+
+
+def _new_entry():
+    return {"calls": 0, "total_ms": 0.0, "max_ms": 0.0, "rows": 0,
+            "histogram": [0] * (len(LATENCY_BUCKETS_MS) + 1)}
+
+
+def _add_sample(entry, ms, rows):
+    entry["calls"] += 1
+    entry["total_ms"] += ms
+    entry["max_ms"] = max(entry["max_ms"], ms)
+    entry["rows"] += rows
+    entry["histogram"][bisect.bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+
+
+class _QueryStats:
+    """Per-function and per-statement counters plus the slow-query log."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.functions = {}
+            self.statements = {}
+            self.slow = deque(maxlen=SLOW_LOG_SIZE)
+            self.since = datetime.now().isoformat(timespec="seconds")
+
+    def record_function(self, name, ms, rows):
+        with self._lock:
+            _add_sample(self.functions.setdefault(name, _new_entry()), ms, rows)
+
+    def record_statement(self, conn, sql, params, ms, rows):
+        key = " ".join(sql.split())
+        with self._lock:
+            _add_sample(self.statements.setdefault(key, _new_entry()), ms, rows)
+        if ms >= SLOW_QUERY_MS:
+            entry = {
+                "at": datetime.now().isoformat(timespec="milliseconds"),
+                "function": getattr(_local, "function", None),
+                "sql": key,
+                "ms": round(ms, 3),
+                "rows": rows,
+                "plan": _query_plan(conn, sql, params),
+            }
+            with self._lock:
+                self.slow.append(entry)
+
+    def summary(self):
+        def finish(entries):
+            return {
+                name: {**e, "total_ms": round(e["total_ms"], 3), "max_ms": round(e["max_ms"], 3),
+                       "mean_ms": round(e["total_ms"] / e["calls"], 3), "histogram": list(e["histogram"])}
+                for name, e in sorted(entries.items(), key=lambda item: -item[1]["total_ms"])
+            }
+
+        with self._lock:
+            return {
+                "enabled": QUERY_STATS_ENABLED,
+                "since": self.since,
+                "slow_query_ms": SLOW_QUERY_MS,
+                "buckets_ms": list(LATENCY_BUCKETS_MS),
+                "functions": finish(self.functions),
+                "statements": finish(self.statements),
+                "slow": list(self.slow),
+            }
+
+
+_query_stats = _QueryStats()
+
+
+def _query_plan(conn, sql, params):
+    try:
+        # A plain cursor, so the EXPLAIN itself is not recorded.
+        rows = sqlite3.Cursor(conn).execute("EXPLAIN QUERY PLAN " + sql, params or ()).fetchall()
+    except sqlite3.Error:
+        return None
+    return [row[3] for row in rows]
+
+
+class _TracedCursor(sqlite3.Cursor):
+    """Cursor that reports each statement's time and rows to _query_stats.
+
+    A statement is finished when its rows run out, when the cursor runs
+    another one or is closed, or when the cursor is garbage collected.
+    """
+    _sql = None
+
+    def _start(self, sql, params):
+        self._finish()
+        self._sql, self._params, self._ms, self._rows = sql, params, 0.0, 0
+
+    def _finish(self):
+        if self._sql is not None:
+            sql, self._sql = self._sql, None
+            _query_stats.record_statement(self.connection, sql, self._params, self._ms, self._rows)
+
+    def _timed(self, method, *args):
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            self._ms += (time.perf_counter() - start) * 1000
+
+    def execute(self, sql, params=()):
+        self._start(sql, params)
+        try:
+            self._timed(super().execute, sql, params)
+        finally:
+            if self.description is None:
+                self._finish()
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        self._start(sql, None)
+        try:
+            self._timed(super().executemany, sql, seq_of_params)
+        finally:
+            self._finish()
+        return self
+
+    def fetchone(self):
+        row = self._timed(super().fetchone)
+        if row is None:
+            self._finish()
+        else:
+            self._rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._timed(super().fetchmany, self.arraysize if size is None else size)
+        self._rows += len(rows)
+        if not rows:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(super().fetchall)
+        self._rows += len(rows)
+        self._finish()
+        return rows
+
+    def __next__(self):
+        try:
+            row = self._timed(super().__next__)
+        except StopIteration:
+            self._finish()
+            raise
+        self._rows += 1
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        try:
+            self._finish()
+        except Exception:
+            pass
+
+
+class _TracedConnection(sqlite3.Connection):
+    """Connection whose statements all run on _TracedCursors."""
+
+    def cursor(self, factory=_TracedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self.cursor().executemany(sql, seq_of_params)
+
+
+def _rows_in(result):
+    if isinstance(result, dict) and "rows" in result:
+        result = result["rows"]
+    if isinstance(result, (list, tuple, pd.DataFrame)):
+        return len(result)
+    return 0 if result is None else 1
+
+
+def _timed(fn):
+    """Record calls of fn in the query stats while they are enabled."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not QUERY_STATS_ENABLED:
+            return fn(*args, **kwargs)
+        outer = getattr(_local, "function", None)
+        _local.function = fn.__name__
+        start = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        finally:
+            _local.function = outer
+        _query_stats.record_function(fn.__name__, (time.perf_counter() - start) * 1000, _rows_in(result))
+        return result
+
+    return wrapper
+
+
+def enable_query_stats(enabled=True):
+    """Turn instrumentation on or off for the whole process.
+
+    Pooled connections are closed so they reopen with (or without) the
+    tracing cursor.
+    """
+    global QUERY_STATS_ENABLED
+    QUERY_STATS_ENABLED = enabled
+    close_connections()
+
+
+def query_stats():
+    """JSON-ready summary: per-function and per-statement counts, latency
+    (total, mean, max and a histogram over LATENCY_BUCKETS_MS), rows
+    returned, and the slow-query log; both sorted by total time."""
+    return _query_stats.summary()
+
+
+def reset_query_stats():
+    _query_stats.reset()
+
+
+def dump_query_stats(path):
+    """Write query_stats() to `path` as JSON."""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(query_stats(), f, indent=2)
+
+
+def _dump_at_exit():
+    if QUERY_STATS_ENABLED:
+        dump_query_stats(QUERY_STATS_FILE)
+
+
+if QUERY_STATS_FILE:
+    atexit.register(_dump_at_exit)
 
-def get_connection():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA foreign_keys = ON")
-    return conn
+
+# --------------- Write Queue ---------------
+# Writes from every session are handed to one writer thread. Whatever has
+# queued up while the writer was busy runs as one transaction with a single
+# commit, each write inside its own savepoint so a failing write is rolled
+# back alone and its error raised to its own caller. In-process writers
+# never compete for SQLite's write lock, and readers keep their own pooled
+# connections, reading WAL snapshots while the writer works.
+
+WRITE_QUEUE_ENABLED = os.environ.get("LOOKIVA_WRITE_QUEUE", "1") != "0"
+WRITE_BATCH_MAX = 256
+
+
+class _WriteQueue:
+    """Single writer thread that group-commits queued writes."""
+
+    def __init__(self, max_batch):
+        self.max_batch = max_batch
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.batches = self.writes = self.failed = self.largest = 0
+
+    def submit(self, fn, args, kwargs, tables):
+        future = Future()
+        self._queue.put((future, fn, args, kwargs, tables))
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="lookiva-writer", daemon=True)
+                self._thread.start()
+        return future
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in batch
+            self._commit([item for item in batch if item is not None])
+            if stop:
+                return
+
+    def _commit(self, batch):
+        batch = [item for item in batch if item[0].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        outcomes = []
+        try:
+            with transaction(*set().union(*(item[4] for item in batch))) as conn:
+                # Take the write lock up front, as one unit for the batch.
+                if not conn.in_transaction:
+                    conn.execute("BEGIN IMMEDIATE")
+                for future, fn, args, kwargs, _ in batch:
+                    conn.execute("SAVEPOINT queued_write")
+                    try:
+                        outcomes.append((future, fn(*args, **kwargs), None))
+                    except Exception as e:
+                        conn.execute("ROLLBACK TO queued_write")
+                        outcomes.append((future, None, e))
+                    conn.execute("RELEASE queued_write")
+        except Exception as e:
+            # BEGIN or COMMIT failed: nothing in the batch was written.
+            outcomes = [(future, None, e) for future, *_ in batch]
+        with self._lock:
+            self.batches += 1
+            self.writes += len(batch)
+            self.failed += sum(1 for _, _, error in outcomes if error is not None)
+            self.largest = max(self.largest, len(batch))
+        for future, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    def close(self):
+        """Finish the queued writes and stop the writer thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None and thread.is_alive():
+            self._queue.put(None)
+            thread.join()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "writes": self.writes,
+                "failed": self.failed,
+                "largest_batch": self.largest,
+                "mean_batch": self.writes / self.batches if self.batches else 0.0,
+            }
+
+
+_write_queue = _WriteQueue(WRITE_BATCH_MAX)
+atexit.register(_write_queue.close)
+
+
+def queued(*tables):
+    """Run a writer of `tables` on the write queue and wait for its result.
+
+    Inside an open transaction, including on the writer thread itself, the
+    write runs inline instead, joining that transaction. The wrapper's
+    .submit() queues the write and returns its Future without waiting.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not WRITE_QUEUE_ENABLED or getattr(_local, "tx_depth", 0):
+                return fn(*args, **kwargs)
+            return _write_queue.submit(fn, args, kwargs, tables).result()
+
+        wrapper.submit = lambda *args, **kwargs: _write_queue.submit(fn, args, kwargs, tables)
+        wrapper.unqueued = fn
+        return _timed(wrapper)
+
+    return decorator
+
+
+def write_queue_stats():
+    return _write_queue.stats()
+
+
+# --------------- Columnar Reads ---------------
+# Analytics readers build their DataFrames straight off the cursor: rows
+# come back as plain tuples a chunk at a time, each chunk is transposed and
+# converted column by column into NumPy arrays, and the chunks are joined
+# at the end. No sqlite3.Row or dict is made per row, and every column
+# arrives typed: dates as datetime64, months as the datetime64 of their
+# first day, counts as int64, amounts as float64 and the low-cardinality
+# labels as categoricals.
+
+FRAME_CHUNK_SIZE = 20000
+
+# Column kind by result column name; other columns are float64 if numeric,
+# text otherwise. Readers can override per query.
+COLUMN_TYPES = {
+    "date": "date",
+    "day": "date",
+    "first_purchase_date": "date",
+    "month": "month",
+    "id": "int",
+    "quantity": "int",
+    "units_sold": "int",
+    "total_qty": "int",
+    "count": "int",
+    "cost_per_unit": "float",
+    "product_cost": "float",
+    "selling_price_customer": "float",
+    "selling_price_retailer": "float",
+    "amount": "float",
+    "total": "float",
+    "revenue": "float",
+    "total_revenue": "float",
+    "gross_profit": "float",
+    "expenses": "float",
+    "net_profit": "float",
+    "margin": "float",
+    "batch_id": "category",
+    "product_name": "category",
+    "category": "category",
+    "sale_type": "category",
+    "expense_type": "category",
+    "supplier_name": "category",
+    "payment_method": "category",
+}
+
+
+def _to_dates(values, unit="D"):
+    try:
+        return np.array(values, f"datetime64[{unit}]")
+    except ValueError:
+        return pd.to_datetime(pd.Series(values, dtype=object), format="ISO8601").to_numpy()
+
+
+def _to_ints(values):
+    try:
+        return np.array(values, np.int64)
+    except TypeError:  # NULLs: fall back to float64 with NaN, as pandas would
+        return np.array(values, np.float64)
+
+
+def _to_default(values):
+    first = next((v for v in values if v is not None), None)
+    if isinstance(first, (int, float)):
+        return np.array(values, np.float64)
+    return np.array(values, object)
+
+
+_CONVERTERS = {
+    "date": _to_dates,
+    "month": lambda values: _to_dates(values, "M"),
+    "int": _to_ints,
+    "float": lambda values: np.array(values, np.float64),
+    "category": pd.Categorical,
+    "text": lambda values: np.array(values, object),
+    None: _to_default,
+}
+
+
+def _join_chunks(kind, chunks):
+    if kind == "category":
+        return pd.api.types.union_categoricals(chunks) if len(chunks) > 1 else chunks[0]
+    column = np.concatenate(chunks) if len(chunks) > 1 else chunks[0]
+    if kind in ("date", "month"):
+        column = column.astype("datetime64[us]")  # pandas' default unit
+    return column
+
+
+def fetch_columns(conn, query, params=(), types=None, chunk_size=FRAME_CHUNK_SIZE):
+    """Run `query` and return {column: NumPy array or Categorical}, in order.
+
+    Column kinds come from `types`, then COLUMN_TYPES; see _CONVERTERS.
+    """
+    cur = conn.cursor()
+    cur.row_factory = None
+    cur.execute(query, params)
+    names = [d[0] for d in cur.description]
+    kinds = [(types or {}).get(name, COLUMN_TYPES.get(name)) for name in names]
+    chunks = [[] for _ in names]
+    while rows := cur.fetchmany(chunk_size):
+        for kind, column, values in zip(kinds, chunks, zip(*rows)):
+            column.append(_CONVERTERS[kind](values))
+    return {
+        name: _join_chunks(kind, column or [_CONVERTERS[kind](())])
+        for name, kind, column in zip(names, kinds, chunks)
+    }
+
+
+def fetch_frame(conn, query, params=(), types=None, chunk_size=FRAME_CHUNK_SIZE):
+    """Typed DataFrame of `query`'s result; see fetch_columns()."""
+    return pd.DataFrame(fetch_columns(conn, query, params, types, chunk_size), copy=False)
 
 
 def init_db():
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    cursor.executescript("""
-        CREATE TABLE IF NOT EXISTS products (
-            batch_id TEXT PRIMARY KEY,
-            base_product_id TEXT NOT NULL,
-            category TEXT NOT NULL DEFAULT 'Saree',
-            product_name TEXT NOT NULL,
-            fabric TEXT,
-            color TEXT,
-            pattern TEXT,
-            size TEXT,
-            source TEXT,
-            cost_per_unit REAL NOT NULL DEFAULT 0,
-            first_purchase_date DATE,
-            image_path TEXT,
-            remarks TEXT,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        );
-
-        CREATE TABLE IF NOT EXISTS purchases (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            date DATE NOT NULL,
-            batch_id TEXT NOT NULL,
-            supplier_name TEXT,
-            quantity INTEGER NOT NULL DEFAULT 0,
-            cost_per_unit REAL NOT NULL DEFAULT 0,
-            payment_method TEXT DEFAULT 'Cash',
-            remarks TEXT,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (batch_id) REFERENCES products(batch_id)
-        );
-
-        CREATE TABLE IF NOT EXISTS sales (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            date DATE NOT NULL,
-            batch_id TEXT NOT NULL,
-            quantity INTEGER NOT NULL DEFAULT 0,
-            selling_price_customer REAL NOT NULL DEFAULT 0,
-            selling_price_retailer REAL NOT NULL DEFAULT 0,
-            sale_type TEXT NOT NULL DEFAULT 'Direct',
-            remarks TEXT,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (batch_id) REFERENCES products(batch_id)
-        );
-
-        CREATE TABLE IF NOT EXISTS expenses (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            date DATE NOT NULL,
-            expense_type TEXT NOT NULL,
-            description TEXT,
-            amount REAL NOT NULL DEFAULT 0,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        );
-
-        CREATE TABLE IF NOT EXISTS cash_flow (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            date DATE NOT NULL,
-            description TEXT,
-            inflow REAL DEFAULT 0,
-            outflow REAL DEFAULT 0,
-            pending_type TEXT,
-            status TEXT DEFAULT 'Completed',
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        );
-
-        CREATE TABLE IF NOT EXISTS capital (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            date DATE NOT NULL,
-            description TEXT,
-            type TEXT NOT NULL,
-            amount REAL NOT NULL DEFAULT 0,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        );
-    """)
-
-    conn.commit()
-    conn.close()
+    """Create the base tables and apply pending migrations; returns the
+    (version, description) pairs applied, for CLIs to report."""
+    with connection() as conn:
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS products (
+                batch_id TEXT PRIMARY KEY,
+                base_product_id TEXT NOT NULL,
+                category TEXT NOT NULL DEFAULT 'Saree',
+                product_name TEXT NOT NULL,
+                fabric TEXT,
+                color TEXT,
+                pattern TEXT,
+                size TEXT,
+                source TEXT,
+                cost_per_unit REAL NOT NULL DEFAULT 0,
+                first_purchase_date DATE,
+                image_path TEXT,
+                remarks TEXT,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            );
+
+            CREATE TABLE IF NOT EXISTS purchases (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                date DATE NOT NULL,
+                batch_id TEXT NOT NULL,
+                supplier_name TEXT,
+                quantity INTEGER NOT NULL DEFAULT 0,
+                cost_per_unit REAL NOT NULL DEFAULT 0,
+                payment_method TEXT DEFAULT 'Cash',
+                remarks TEXT,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (batch_id) REFERENCES products(batch_id)
+            );
+
+            CREATE TABLE IF NOT EXISTS sales (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                date DATE NOT NULL,
+                batch_id TEXT NOT NULL,
+                quantity INTEGER NOT NULL DEFAULT 0,
+                selling_price_customer REAL NOT NULL DEFAULT 0,
+                selling_price_retailer REAL NOT NULL DEFAULT 0,
+                sale_type TEXT NOT NULL DEFAULT 'Direct',
+                remarks TEXT,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (batch_id) REFERENCES products(batch_id)
+            );
+
+            CREATE TABLE IF NOT EXISTS expenses (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                date DATE NOT NULL,
+                expense_type TEXT NOT NULL,
+                description TEXT,
+                amount REAL NOT NULL DEFAULT 0,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            );
+
+            CREATE TABLE IF NOT EXISTS cash_flow (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                date DATE NOT NULL,
+                description TEXT,
+                inflow REAL DEFAULT 0,
+                outflow REAL DEFAULT 0,
+                pending_type TEXT,
+                status TEXT DEFAULT 'Completed',
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            );
+
+            CREATE TABLE IF NOT EXISTS capital (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                date DATE NOT NULL,
+                description TEXT,
+                type TEXT NOT NULL,
+                amount REAL NOT NULL DEFAULT 0,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            );
+        """)
+
+        return migrations.migrate(conn)
+
+
+_bootstrapped = set()  # DB paths this process has initialized
+_bootstrap_lock = threading.Lock()
+
+
+def bootstrap(first_run=None):
+    """init_db() and, if there are no products yet, first_run() - once per
+    process for each DB_PATH. Returns True for the call that did the work.
+
+    Concurrent callers wait for the first one to finish. If first_run
+    raises, the path is not marked and the next call tries again.
+    """
+    with _bootstrap_lock:
+        if DB_PATH in _bootstrapped:
+            return False
+        init_db()
+        if first_run is not None and is_db_empty():
+            first_run()
+        _bootstrapped.add(DB_PATH)
+        return True
 
 
 # --------------- Products ---------------
 
+@queued("products")
 def add_product(batch_id, base_product_id, category, product_name, fabric=None,
                 color=None, pattern=None, size=None, source=None,
                 cost_per_unit=0, first_purchase_date=None, image_path=None, remarks=None):
-    conn = get_connection()
-    conn.execute(
-        """INSERT INTO products (batch_id, base_product_id, category, product_name,
-           fabric, color, pattern, size, source, cost_per_unit, first_purchase_date,
-           image_path, remarks)
-           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-        (batch_id, base_product_id, category, product_name, fabric, color,
-         pattern, size, source, cost_per_unit, first_purchase_date, image_path, remarks)
-    )
-    conn.commit()
-    conn.close()
-
-
+    """Insert a product and return its batch ID. With batch_id=None the next
+    ID for the category is allocated in the same transaction; a missing
+    base_product_id defaults to the first six characters of the ID."""
+    with transaction("products") as conn:
+        if batch_id is None:
+            batch_id = _allocate_batch_id(conn, category)
+        if base_product_id is None:
+            base_product_id = batch_id[:6]
+        conn.execute(
+            """INSERT INTO products (batch_id, base_product_id, category, product_name,
+               fabric, color, pattern, size, source, cost_per_unit, first_purchase_date,
+               image_path, remarks)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (batch_id, base_product_id, category, product_name, fabric, color,
+             pattern, size, source, cost_per_unit, first_purchase_date, image_path, remarks)
+        )
+    return batch_id
+
+
+@cached("products")
 def get_all_products():
-    conn = get_connection()
-    rows = conn.execute("SELECT * FROM products ORDER BY first_purchase_date DESC, batch_id").fetchall()
-    conn.close()
+    with connection() as conn:
+        rows = conn.execute("SELECT * FROM products ORDER BY first_purchase_date DESC, batch_id").fetchall()
     return rows
 
 
+@cached("products")
 def get_product(batch_id):
-    conn = get_connection()
-    row = conn.execute("SELECT * FROM products WHERE batch_id = ?", (batch_id,)).fetchone()
-    conn.close()
+    with connection() as conn:
+        row = conn.execute("SELECT * FROM products WHERE batch_id = ?", (batch_id,)).fetchone()
     return row
 
 
+@queued("products")
 def update_product(batch_id, **kwargs):
-    conn = get_connection()
-    set_clause = ", ".join(f"{k} = ?" for k in kwargs)
-    values = list(kwargs.values()) + [batch_id]
-    conn.execute(f"UPDATE products SET {set_clause} WHERE batch_id = ?", values)
-    conn.commit()
-    conn.close()
+    with transaction("products") as conn:
+        set_clause = ", ".join(f"{k} = ?" for k in kwargs)
+        values = list(kwargs.values()) + [batch_id]
+        conn.execute(f"UPDATE products SET {set_clause} WHERE batch_id = ?", values)
 
 
+@queued("products")
 def delete_product(batch_id):
-    conn = get_connection()
-    conn.execute("DELETE FROM products WHERE batch_id = ?", (batch_id,))
-    conn.commit()
-    conn.close()
+    with transaction("products") as conn:
+        conn.execute("DELETE FROM products WHERE batch_id = ?", (batch_id,))
+
+
+# Sort keys accepted by list_products(), mapped to their SQL expressions.
+PRODUCT_SORT_COLUMNS = {
+    "first_purchase_date": "pr.first_purchase_date",
+    "batch_id": "pr.batch_id",
+    "product_name": "pr.product_name",
+    "category": "pr.category",
+    "cost_per_unit": "pr.cost_per_unit",
+    "stock": "stock",
+}
+
+
+# Search box prefixes that limit a word to one column, e.g. "color:red".
+SEARCH_FIELDS = {
+    "id": "batch_id",
+    "batch": "batch_id",
+    "name": "product_name",
+    "category": "category",
+    "fabric": "fabric",
+    "color": "color",
+    "colour": "color",
+    "pattern": "pattern",
+    "source": "source",
+    "remarks": "remarks",
+}
+
+# bm25 weight per migrations.SEARCH_COLUMNS column: an ID or name hit
+# outranks a hit in the descriptive columns.
+SEARCH_WEIGHTS = (10.0, 5.0, 2.0, 1.0, 1.0, 1.0, 1.0, 0.5)
+SEARCH_LIMIT = 100
+# Ranking costs a bm25 score per match. Past this many matches (a short
+# or very common word) the search returns the newest matches instead,
+# which the index reads in rowid order without scoring or sorting.
+SEARCH_RANK_MAX = 5000
+
+_SEARCH_TERM = re.compile(r"(?:(\w+):)?(\w+)")
+
+
+def _search_query(text):
+    """FTS5 MATCH expression for search box text; None if it has no words.
+
+    Every word must match the start of a word in some column; a known
+    `field:` prefix limits it to that column (see SEARCH_FIELDS).
+    """
+    terms = []
+    for field, word in _SEARCH_TERM.findall(text or ""):
+        column = SEARCH_FIELDS.get(field.lower())
+        if field and not column:
+            terms.append(f'"{field}"*')
+        terms.append(f'{column} : "{word}"*' if column else f'"{word}"*')
+    return " AND ".join(terms) or None
+
+
+def _product_filters(category=None, search=None):
+    clauses, params = [], []
+    if category:
+        clauses.append("pr.category = ?")
+        params.append(category)
+    match = _search_query(search)
+    if match:
+        clauses.append("pr.rowid IN (SELECT rowid FROM products_fts WHERE products_fts MATCH ?)")
+        params.append(match)
+    where = " WHERE " + " AND ".join(clauses) if clauses else ""
+    return where, params
+
+
+# The columns list_products() and search_products() return.
+_PRODUCT_LIST_SELECT = """
+        SELECT pr.batch_id, pr.category, pr.product_name, pr.fabric, pr.color,
+               pr.pattern, pr.source,
+               CAST(pr.cost_per_unit AS REAL) as cost_per_unit,
+               pr.first_purchase_date,
+               CAST(COALESCE(sl.closing_stock, 0) AS INTEGER) as stock,
+               CASE WHEN COALESCE(sl.closing_stock, 0) > 0
+                    THEN 'Active' ELSE 'Out of Stock' END as status"""
+
+
+@cached("products", "purchases", "sales")
+def list_products(category=None, search=None, sort_by="first_purchase_date",
+                  descending=True, limit=None, offset=0):
+    """Products joined with their current stock, filtered, sorted and paged in SQL.
+
+    `search` keeps the products search_products() would match.
+    """
+    if sort_by not in PRODUCT_SORT_COLUMNS:
+        raise ValueError(f"Unknown sort column: {sort_by}")
+    direction = "DESC" if descending else "ASC"
+    where, params = _product_filters(category, search)
+    query = _PRODUCT_LIST_SELECT + f"""
+        FROM products pr
+        LEFT JOIN stock_levels sl ON pr.batch_id = sl.batch_id
+        {where}
+        ORDER BY {PRODUCT_SORT_COLUMNS[sort_by]} {direction}, pr.batch_id
+    """
+    if limit is not None:
+        query += " LIMIT ? OFFSET ?"
+        params += [limit, offset]
+    with connection() as conn:
+        rows = conn.execute(query, params).fetchall()
+    return rows
+
+
+@cached("products", "purchases", "sales")
+def search_products(text, category=None, limit=SEARCH_LIMIT):
+    """The `limit` best matches for search box `text`, best first, as
+    list_products() rows. Words match as prefixes in any column, or in
+    one with `field:word`; see _search_query()."""
+    match = _search_query(text)
+    if match is None:
+        return list_products(category, limit=limit)
+    with connection() as conn:
+        if _count_matches(conn, match) > SEARCH_RANK_MAX:
+            order = "products_fts.rowid DESC"
+        else:
+            order = f"bm25(products_fts, {', '.join(map(str, SEARCH_WEIGHTS))}), pr.batch_id"
+        query = _PRODUCT_LIST_SELECT + f"""
+            FROM products_fts
+            JOIN products pr ON pr.rowid = products_fts.rowid
+            LEFT JOIN stock_levels sl ON pr.batch_id = sl.batch_id
+            WHERE products_fts MATCH ?{" AND pr.category = ?" if category else ""}
+            ORDER BY {order}
+            LIMIT ?
+        """
+        params = [match] + ([category] if category else []) + [limit]
+        rows = conn.execute(query, params).fetchall()
+    return rows
+
+
+def _count_matches(conn, match):
+    return conn.execute(
+        "SELECT COUNT(*) FROM products_fts WHERE products_fts MATCH ?", (match,)
+    ).fetchone()[0]
+
+
+def rebuild_search_index():
+    """Re-index every product from the products table."""
+    with transaction("products") as conn:
+        for sql in migrations.REBUILD_SEARCH:
+            conn.execute(sql)
 
 
+def verify_search_index():
+    """Problems FTS5 finds comparing the search index with products."""
+    # The check is issued as an INSERT; undo it to a savepoint so a
+    # transaction the caller has open on this connection keeps its writes.
+    with connection() as conn:
+        conn.execute("SAVEPOINT verify_search_index")
+        try:
+            conn.execute("INSERT INTO products_fts(products_fts, rank) VALUES ('integrity-check', 1)")
+        except sqlite3.DatabaseError as e:
+            return [{"problem": str(e)}]
+        finally:
+            conn.execute("ROLLBACK TO verify_search_index")
+            conn.execute("RELEASE verify_search_index")
+    return []
+
+
+@cached("products")
+def count_products(category=None, search=None):
+    match = _search_query(search)
+    with connection() as conn:
+        if match and not category:
+            # The index counts its own matches without reading products.
+            return _count_matches(conn, match)
+        where, params = _product_filters(category, search)
+        row = conn.execute(f"SELECT COUNT(*) as c FROM products pr{where}", params).fetchone()
+    return row["c"]
+
+
+@cached("products")
 def get_product_categories():
-    conn = get_connection()
-    rows = conn.execute("SELECT DISTINCT category FROM products ORDER BY category").fetchall()
-    conn.close()
+    with connection() as conn:
+        rows = conn.execute("SELECT DISTINCT category FROM products ORDER BY category").fetchall()
     return [r["category"] for r in rows]
 
 
+# Batch IDs read <prefix><number><MON><YY>, e.g. SR0012OCT26. The prefix
+# comes from the category; numbers run on per prefix across months. The
+# last number handed out per prefix and month is kept in batch_counters
+# (see migrations.py), which a trigger keeps ahead of typed-in IDs.
+
+BATCH_PREFIXES = {"Saree": "SR", "USkirt": "US", "Blouse": "BL", "Other": "OT"}
+
+# This month's counter, else the prefix's highest so far, plus one.
+_NEXT_BATCH_NUMBER = """
+    SELECT COALESCE(
+        (SELECT last_number FROM batch_counters WHERE prefix = :prefix AND period = :period),
+        (SELECT MAX(last_number) FROM batch_counters WHERE prefix = :prefix),
+        0) + 1"""
+
+
+def batch_prefix(category):
+    """The batch ID prefix for `category`; unknown ones use their first letters."""
+    if category in BATCH_PREFIXES:
+        return BATCH_PREFIXES[category]
+    letters = re.sub(r"[^A-Za-z]", "", category or "").upper()
+    return letters[:2] or "SR"
+
+
+def _batch_period(day=None):
+    return (day or date.today()).strftime("%b%y").upper()
+
+
+def _batch_id(prefix, number, period):
+    return f"{prefix}{number:04d}{period}"
+
+
+@cached("products")
+def _peek_batch_number(prefix, period):
+    with connection() as conn:
+        return conn.execute(_NEXT_BATCH_NUMBER, {"prefix": prefix, "period": period}).fetchone()[0]
+
+
+def next_batch_id(category="Saree"):
+    """The ID add_product() would allocate for `category` right now, for
+    prefilling forms. Reads the counters only; nothing is reserved."""
+    return _next_batch_id(batch_prefix(category))
+
+
 def generate_batch_id(category_prefix="SR"):
-    conn = get_connection()
-    now = datetime.now()
-    month_str = now.strftime("%b").upper()[:3]
-    year_str = now.strftime("%y")
-    suffix = f"{month_str}{year_str}"
-
-    row = conn.execute(
-        "SELECT batch_id FROM products WHERE batch_id LIKE ? ORDER BY batch_id DESC LIMIT 1",
-        (f"{category_prefix}%{suffix}",)
-    ).fetchone()
-
-    if row:
-        num_part = row["batch_id"].replace(suffix, "").replace(category_prefix, "")
-        try:
-            next_num = int(num_part) + 1
-        except ValueError:
-            next_num = 1
-    else:
-        all_rows = conn.execute(
-            "SELECT batch_id FROM products WHERE batch_id LIKE ? ORDER BY batch_id DESC LIMIT 1",
-            (f"{category_prefix}%",)
-        ).fetchone()
-        if all_rows:
-            num_part = ""
-            for ch in all_rows["batch_id"][len(category_prefix):]:
-                if ch.isdigit():
-                    num_part += ch
-                else:
-                    break
-            try:
-                next_num = int(num_part) + 1
-            except ValueError:
-                next_num = 1
-        else:
-            next_num = 1
+    """next_batch_id() for callers that pass the prefix ("SR", "BL", ...)
+    rather than the category; kept for scripts written against it."""
+    return _next_batch_id(category_prefix)
+
+
+def _next_batch_id(prefix):
+    period = _batch_period()
+    return _batch_id(prefix, _peek_batch_number(prefix, period), period)
+
+
+def _allocate_batch_id(conn, category):
+    """Take the next batch ID for `category`. The upsert is the transaction's
+    first write, so concurrent allocations serialise on the write lock and
+    never hand out the same number."""
+    prefix, period = batch_prefix(category), _batch_period()
+    number = conn.execute(
+        """INSERT INTO batch_counters (prefix, period, last_number)
+           VALUES (:prefix, :period, (""" + _NEXT_BATCH_NUMBER + """))
+           ON CONFLICT(prefix, period) DO UPDATE SET last_number = last_number + 1
+           RETURNING last_number""",
+        {"prefix": prefix, "period": period},
+    ).fetchone()[0]
+    return _batch_id(prefix, number, period)
+
+
+# --------------- History Paging ---------------
+# Keyset ("seek") pagination over the ledgers, ordered by (date, id). A
+# page is addressed by the (date, id) key of the row it continues from, so
+# every page costs one index range scan regardless of how deep it is.
+
+HISTORY_PAGE_SIZE = 50
+
+
+def _keyset_page(conn, select, alias, where, params, cursor=None, direction="next",
+                 page_size=HISTORY_PAGE_SIZE, descending=True, with_total=False):
+    """Fetch one page of `select` ordered by (<alias>.date, <alias>.id).
+
+    `descending` sets the display order. With direction="next" the page
+    holds the rows after `cursor` in that order, with "prev" the rows
+    before it; a missing cursor means the first (or, for "prev", the last)
+    page. Returns a dict with the rows, the first/last keys to continue
+    from, has_prev/has_next, and the matching row count if `with_total`.
+    """
+    if direction not in ("next", "prev"):
+        raise ValueError(f"Unknown direction: {direction}")
+    backwards = direction == "prev"
+    # Walking back through a descending list scans the index ascending.
+    scan_desc = descending != backwards
+    clauses = list(where)
+    args = list(params)
+    if cursor is not None:
+        clauses.append(f"({alias}.date, {alias}.id) {'<' if scan_desc else '>'} (?, ?)")
+        args += list(cursor)
+    order = "DESC" if scan_desc else "ASC"
+    query = select
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+    query += f" ORDER BY {alias}.date {order}, {alias}.id {order} LIMIT ?"
+    rows = conn.execute(query, args + [page_size + 1]).fetchall()
+
+    more = len(rows) > page_size
+    rows = rows[:page_size]
+    if backwards:
+        rows.reverse()
+    page = {
+        "rows": rows,
+        "first": (rows[0]["date"], rows[0]["id"]) if rows else None,
+        "last": (rows[-1]["date"], rows[-1]["id"]) if rows else None,
+        "has_prev": more if backwards else cursor is not None,
+        "has_next": cursor is not None if backwards else more,
+        "total": None,
+    }
+    if with_total:
+        count_query = f"SELECT COUNT(*) FROM ({select}"
+        if where:
+            count_query += " WHERE " + " AND ".join(where)
+        page["total"] = conn.execute(count_query + ")", list(params)).fetchone()[0]
+    return page
 
-    conn.close()
-    return f"{category_prefix}{next_num:04d}{suffix}"
+
+def _date_range(alias, start_date, end_date):
+    if start_date and end_date:
+        return [f"{alias}.date BETWEEN ? AND ?"], [start_date, end_date]
+    return [], []
 
 
 # --------------- Purchases ---------------
 
+@queued("purchases")
 def add_purchase(date_val, batch_id, supplier_name, quantity, cost_per_unit,
                  payment_method="Cash", remarks=None):
-    conn = get_connection()
-    conn.execute(
-        """INSERT INTO purchases (date, batch_id, supplier_name, quantity, cost_per_unit,
-           payment_method, remarks) VALUES (?, ?, ?, ?, ?, ?, ?)""",
-        (date_val, batch_id, supplier_name, quantity, cost_per_unit, payment_method, remarks)
-    )
-    conn.commit()
-    conn.close()
+    with transaction("purchases") as conn:
+        conn.execute(
+            """INSERT INTO purchases (date, batch_id, supplier_name, quantity, cost_per_unit,
+               payment_method, remarks) VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            (date_val, batch_id, supplier_name, quantity, cost_per_unit, payment_method, remarks)
+        )
 
 
+@cached("purchases", "products")
 def get_all_purchases(start_date=None, end_date=None):
-    conn = get_connection()
-    query = """SELECT p.*, pr.product_name, pr.category
-               FROM purchases p
-               LEFT JOIN products pr ON p.batch_id = pr.batch_id"""
-    params = []
-    if start_date and end_date:
-        query += " WHERE p.date BETWEEN ? AND ?"
-        params = [start_date, end_date]
-    query += " ORDER BY p.date DESC, p.id DESC"
-    rows = conn.execute(query, params).fetchall()
-    conn.close()
+    with connection() as conn:
+        query = """SELECT p.*, pr.product_name, pr.category
+                   FROM purchases p
+                   LEFT JOIN products pr ON p.batch_id = pr.batch_id"""
+        params = []
+        if start_date and end_date:
+            query += " WHERE p.date BETWEEN ? AND ?"
+            params = [start_date, end_date]
+        query += " ORDER BY p.date DESC, p.id DESC"
+        rows = conn.execute(query, params).fetchall()
     return rows
 
 
+@cached("purchases", "products")
+def get_purchases_page(start_date=None, end_date=None, cursor=None, direction="next",
+                       page_size=HISTORY_PAGE_SIZE, descending=True, with_total=False):
+    """One keyset page of get_all_purchases(); see _keyset_page()."""
+    where, params = _date_range("p", start_date, end_date)
+    with connection() as conn:
+        return _keyset_page(
+            conn,
+            """SELECT p.*, pr.product_name, pr.category
+               FROM purchases p
+               LEFT JOIN products pr ON p.batch_id = pr.batch_id""",
+            "p", where, params, cursor, direction, page_size, descending, with_total)
+
+
+@cached("purchases")
+def get_purchase_totals(start_date=None, end_date=None):
+    where, params = _date_range("p", start_date, end_date)
+    with connection() as conn:
+        row = conn.execute(
+            """SELECT COUNT(*) as count,
+                      COALESCE(SUM(p.quantity * p.cost_per_unit), 0) as total_cost
+               FROM purchases p""" + (" WHERE " + where[0] if where else ""),
+            params,
+        ).fetchone()
+    return row
+
+
+@cached("purchases")
+def get_monthly_purchase_totals(start_date=None, end_date=None):
+    where, params = _date_range("p", start_date, end_date)
+    with connection() as conn:
+        return fetch_frame(
+            conn,
+            """SELECT strftime('%Y-%m', p.date) as month,
+                      SUM(p.quantity * p.cost_per_unit) as total
+               FROM purchases p""" + (" WHERE " + where[0] if where else "")
+            + " GROUP BY month ORDER BY month",
+            params,
+        )
+
+
+@cached("purchases")
 def get_total_purchased(batch_id):
-    conn = get_connection()
-    row = conn.execute(
-        "SELECT COALESCE(SUM(quantity), 0) as total FROM purchases WHERE batch_id = ?",
-        (batch_id,)
-    ).fetchone()
-    conn.close()
-    return row["total"]
+    with connection() as conn:
+        row = conn.execute(
+            "SELECT total_purchased FROM stock_levels WHERE batch_id = ?", (batch_id,)
+        ).fetchone()
+    return row["total_purchased"] if row else 0
 
 
 # --------------- Sales ---------------
 
+@queued("sales")
 def add_sale(date_val, batch_id, quantity, selling_price_customer,
              selling_price_retailer, sale_type="Direct", remarks=None):
-    conn = get_connection()
-    conn.execute(
-        """INSERT INTO sales (date, batch_id, quantity, selling_price_customer,
-           selling_price_retailer, sale_type, remarks)
-           VALUES (?, ?, ?, ?, ?, ?, ?)""",
-        (date_val, batch_id, quantity, selling_price_customer,
-         selling_price_retailer, sale_type, remarks)
-    )
-    conn.commit()
-    conn.close()
+    with transaction("sales") as conn:
+        conn.execute(
+            """INSERT INTO sales (date, batch_id, quantity, selling_price_customer,
+               selling_price_retailer, sale_type, remarks)
+               VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            (date_val, batch_id, quantity, selling_price_customer,
+             selling_price_retailer, sale_type, remarks)
+        )
 
 
+@cached("sales", "products")
 def get_all_sales(start_date=None, end_date=None, sale_type=None):
-    conn = get_connection()
-    query = """SELECT s.*, pr.product_name, pr.category, pr.cost_per_unit as product_cost
+    with connection() as conn:
+        query = """SELECT s.*, pr.product_name, pr.category, pr.cost_per_unit as product_cost
+                   FROM sales s
+                   LEFT JOIN products pr ON s.batch_id = pr.batch_id WHERE 1=1"""
+        params = []
+        if start_date and end_date:
+            query += " AND s.date BETWEEN ? AND ?"
+            params += [start_date, end_date]
+        if sale_type:
+            query += " AND s.sale_type = ?"
+            params.append(sale_type)
+        query += " ORDER BY s.date DESC, s.id DESC"
+        rows = conn.execute(query, params).fetchall()
+    return rows
+
+
+@cached("sales", "products")
+def get_sales_frame(start_date=None, end_date=None, sale_type=None):
+    """The sales columns the analytics need, as a typed DataFrame.
+
+    Rows come back in no particular order, which lets SQLite read them off a
+    covering index instead of walking the date index back to the table.
+    """
+    where, params = _sales_filters(start_date, end_date, sale_type)
+    with connection() as conn:
+        return fetch_frame(
+            conn,
+            """SELECT s.date, s.batch_id, pr.product_name, pr.category, s.quantity,
+                      s.selling_price_retailer, pr.cost_per_unit as product_cost, s.sale_type
                FROM sales s
-               LEFT JOIN products pr ON s.batch_id = pr.batch_id WHERE 1=1"""
-    params = []
-    if start_date and end_date:
-        query += " AND s.date BETWEEN ? AND ?"
-        params += [start_date, end_date]
+               LEFT JOIN products pr ON s.batch_id = pr.batch_id"""
+            + (" WHERE " + " AND ".join(where) if where else ""),
+            params,
+        )
+
+
+def _sales_filters(start_date, end_date, sale_type):
+    where, params = _date_range("s", start_date, end_date)
     if sale_type:
-        query += " AND s.sale_type = ?"
+        where.append("s.sale_type = ?")
         params.append(sale_type)
-    query += " ORDER BY s.date DESC, s.id DESC"
-    rows = conn.execute(query, params).fetchall()
-    conn.close()
-    return rows
+    return where, params
+
+
+@cached("sales", "products")
+def get_sales_page(start_date=None, end_date=None, sale_type=None, cursor=None,
+                   direction="next", page_size=HISTORY_PAGE_SIZE, descending=True,
+                   with_total=False):
+    """One keyset page of get_all_sales(); see _keyset_page()."""
+    where, params = _sales_filters(start_date, end_date, sale_type)
+    with connection() as conn:
+        return _keyset_page(
+            conn,
+            """SELECT s.*, pr.product_name, pr.category, pr.cost_per_unit as product_cost
+               FROM sales s
+               LEFT JOIN products pr ON s.batch_id = pr.batch_id""",
+            "s", where, params, cursor, direction, page_size, descending, with_total)
+
+
+@cached("sales", "products")
+def get_sales_totals(start_date=None, end_date=None, sale_type=None):
+    """Line count, net revenue and net margin of the matching sales."""
+    where, params = _sales_filters(start_date, end_date, sale_type)
+    with connection() as conn:
+        row = conn.execute(
+            """SELECT COUNT(*) as count,
+                      COALESCE(SUM(s.selling_price_retailer * s.quantity), 0) as revenue,
+                      COALESCE(SUM((s.selling_price_retailer - COALESCE(pr.cost_per_unit, 0))
+                                   * s.quantity), 0) as margin
+               FROM sales s
+               LEFT JOIN products pr ON s.batch_id = pr.batch_id"""
+            + (" WHERE " + " AND ".join(where) if where else ""),
+            params,
+        ).fetchone()
+    return row
 
 
+@cached("sales")
 def get_total_sold(batch_id):
-    conn = get_connection()
-    row = conn.execute(
-        "SELECT COALESCE(SUM(quantity), 0) as total FROM sales WHERE batch_id = ?",
-        (batch_id,)
-    ).fetchone()
-    conn.close()
-    return row["total"]
+    with connection() as conn:
+        row = conn.execute(
+            "SELECT total_sold FROM stock_levels WHERE batch_id = ?", (batch_id,)
+        ).fetchone()
+    return row["total_sold"] if row else 0
 
 
 # --------------- Stock ---------------
+# stock_levels is kept exact by triggers on purchases and sales (see
+# migrations.py); products with no movements have no row yet.
 
+@cached("products", "purchases", "sales")
 def get_stock():
-    conn = get_connection()
-    rows = conn.execute("""
-        SELECT
-            pr.batch_id,
-            pr.product_name,
-            pr.category,
-            pr.cost_per_unit,
-            COALESCE(purch.total_purchased, 0) as total_purchased,
-            COALESCE(sl.total_sold, 0) as total_sold,
-            (COALESCE(purch.total_purchased, 0) - COALESCE(sl.total_sold, 0)) as closing_stock,
-            pr.cost_per_unit * (COALESCE(purch.total_purchased, 0) - COALESCE(sl.total_sold, 0)) as stock_value
-        FROM products pr
-        LEFT JOIN (
-            SELECT batch_id, SUM(quantity) as total_purchased FROM purchases GROUP BY batch_id
-        ) purch ON pr.batch_id = purch.batch_id
-        LEFT JOIN (
-            SELECT batch_id, SUM(quantity) as total_sold FROM sales GROUP BY batch_id
-        ) sl ON pr.batch_id = sl.batch_id
-        ORDER BY pr.batch_id
-    """).fetchall()
-    conn.close()
+    with connection() as conn:
+        rows = conn.execute("""
+            SELECT
+                pr.batch_id,
+                pr.product_name,
+                pr.category,
+                pr.cost_per_unit,
+                COALESCE(sl.total_purchased, 0) as total_purchased,
+                COALESCE(sl.total_sold, 0) as total_sold,
+                COALESCE(sl.closing_stock, 0) as closing_stock,
+                pr.cost_per_unit * COALESCE(sl.closing_stock, 0) as stock_value
+            FROM products pr
+            LEFT JOIN stock_levels sl ON pr.batch_id = sl.batch_id
+            ORDER BY pr.batch_id
+        """).fetchall()
     return rows
 
 
+@cached("purchases", "sales")
 def get_available_stock(batch_id):
-    conn = get_connection()
-    row = conn.execute("""
-        SELECT
-            COALESCE((SELECT SUM(quantity) FROM purchases WHERE batch_id = ?), 0) -
-            COALESCE((SELECT SUM(quantity) FROM sales WHERE batch_id = ?), 0) as available
-    """, (batch_id, batch_id)).fetchone()
-    conn.close()
-    return row["available"]
+    with connection() as conn:
+        row = conn.execute(
+            "SELECT closing_stock FROM stock_levels WHERE batch_id = ?", (batch_id,)
+        ).fetchone()
+    return row["closing_stock"] if row else 0
 
 
+@cached("products", "purchases", "sales")
 def get_in_stock_products():
-    conn = get_connection()
-    rows = conn.execute("""
-        SELECT pr.batch_id, pr.product_name, pr.category, pr.cost_per_unit,
-            (COALESCE(purch.total_purchased, 0) - COALESCE(sl.total_sold, 0)) as available
-        FROM products pr
-        LEFT JOIN (SELECT batch_id, SUM(quantity) as total_purchased FROM purchases GROUP BY batch_id) purch
-            ON pr.batch_id = purch.batch_id
-        LEFT JOIN (SELECT batch_id, SUM(quantity) as total_sold FROM sales GROUP BY batch_id) sl
-            ON pr.batch_id = sl.batch_id
-        WHERE (COALESCE(purch.total_purchased, 0) - COALESCE(sl.total_sold, 0)) > 0
-        ORDER BY pr.product_name
-    """).fetchall()
-    conn.close()
+    with connection() as conn:
+        rows = conn.execute("""
+            SELECT pr.batch_id, pr.product_name, pr.category, pr.cost_per_unit,
+                sl.closing_stock as available
+            FROM stock_levels sl
+            JOIN products pr ON pr.batch_id = sl.batch_id
+            WHERE sl.closing_stock > 0
+            ORDER BY pr.product_name
+        """).fetchall()
+    return rows
+
+
+def rebuild_stock_levels():
+    """Recompute stock_levels from the purchase and sale ledgers."""
+    with transaction() as conn:
+        for sql in migrations.REBUILD_STOCK_LEVELS:
+            conn.execute(sql)
+
+
+def verify_stock_levels():
+    """Return batches whose stock_levels row disagrees with the ledgers."""
+    with connection() as conn:
+        rows = conn.execute("""
+            SELECT batch_id,
+                   SUM(purchased) as expected_purchased, SUM(sold) as expected_sold,
+                   SUM(have_purchased) as total_purchased, SUM(have_sold) as total_sold,
+                   SUM(have_closing) as closing_stock
+            FROM (
+                SELECT batch_id, SUM(quantity) as purchased, 0 as sold,
+                       0 as have_purchased, 0 as have_sold, 0 as have_closing
+                FROM purchases GROUP BY batch_id
+                UNION ALL
+                SELECT batch_id, 0, SUM(quantity), 0, 0, 0 FROM sales GROUP BY batch_id
+                UNION ALL
+                SELECT batch_id, 0, 0, total_purchased, total_sold, closing_stock
+                FROM stock_levels
+            )
+            GROUP BY batch_id
+            HAVING expected_purchased != total_purchased
+                OR expected_sold != total_sold
+                OR expected_purchased - expected_sold != closing_stock
+            ORDER BY batch_id
+        """).fetchall()
     return rows
 
 
 # --------------- Expenses ---------------
 
+@queued("expenses")
 def add_expense(date_val, expense_type, description, amount):
-    conn = get_connection()
-    conn.execute(
-        "INSERT INTO expenses (date, expense_type, description, amount) VALUES (?, ?, ?, ?)",
-        (date_val, expense_type, description, amount)
-    )
-    conn.commit()
-    conn.close()
+    with transaction("expenses") as conn:
+        conn.execute(
+            "INSERT INTO expenses (date, expense_type, description, amount) VALUES (?, ?, ?, ?)",
+            (date_val, expense_type, description, amount)
+        )
 
 
+@cached("expenses")
 def get_all_expenses(start_date=None, end_date=None):
-    conn = get_connection()
-    query = "SELECT * FROM expenses"
-    params = []
-    if start_date and end_date:
-        query += " WHERE date BETWEEN ? AND ?"
-        params = [start_date, end_date]
-    query += " ORDER BY date DESC, id DESC"
-    rows = conn.execute(query, params).fetchall()
-    conn.close()
+    with connection() as conn:
+        query = "SELECT * FROM expenses"
+        params = []
+        if start_date and end_date:
+            query += " WHERE date BETWEEN ? AND ?"
+            params = [start_date, end_date]
+        query += " ORDER BY date DESC, id DESC"
+        rows = conn.execute(query, params).fetchall()
     return rows
 
 
+@cached("expenses")
+def get_expenses_page(start_date=None, end_date=None, cursor=None, direction="next",
+                      page_size=HISTORY_PAGE_SIZE, descending=True, with_total=False):
+    """One keyset page of get_all_expenses(); see _keyset_page()."""
+    where, params = _date_range("e", start_date, end_date)
+    with connection() as conn:
+        return _keyset_page(conn, "SELECT e.* FROM expenses e", "e", where, params,
+                            cursor, direction, page_size, descending, with_total)
+
+
+@cached("expenses")
+def get_expense_totals_by_type(start_date=None, end_date=None):
+    where, params = _date_range("e", start_date, end_date)
+    with connection() as conn:
+        return fetch_frame(
+            conn,
+            "SELECT e.expense_type, SUM(e.amount) as amount, COUNT(*) as count FROM expenses e"
+            + (" WHERE " + where[0] if where else "")
+            + " GROUP BY e.expense_type ORDER BY amount DESC",
+            params,
+        )
+
+
+@cached("expenses")
+def get_monthly_expense_totals(start_date=None, end_date=None):
+    where, params = _date_range("e", start_date, end_date)
+    with connection() as conn:
+        return fetch_frame(
+            conn,
+            "SELECT strftime('%Y-%m', e.date) as month, SUM(e.amount) as amount FROM expenses e"
+            + (" WHERE " + where[0] if where else "")
+            + " GROUP BY month ORDER BY month",
+            params,
+        )
+
+
 # --------------- Cash Flow ---------------
 
+@queued("cash_flow")
 def add_cash_flow(date_val, description, inflow=0, outflow=0,
                   pending_type="Receipt", status="Completed"):
-    conn = get_connection()
-    conn.execute(
-        """INSERT INTO cash_flow (date, description, inflow, outflow, pending_type, status)
-           VALUES (?, ?, ?, ?, ?, ?)""",
-        (date_val, description, inflow, outflow, pending_type, status)
-    )
-    conn.commit()
-    conn.close()
+    with transaction("cash_flow") as conn:
+        conn.execute(
+            """INSERT INTO cash_flow (date, description, inflow, outflow, pending_type, status)
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            (date_val, description, inflow, outflow, pending_type, status)
+        )
 
 
+@cached("cash_flow")
 def get_all_cash_flow():
-    conn = get_connection()
-    rows = conn.execute("SELECT * FROM cash_flow ORDER BY date ASC, id ASC").fetchall()
-    conn.close()
+    with connection() as conn:
+        rows = conn.execute("SELECT * FROM cash_flow ORDER BY date ASC, id ASC").fetchall()
     return rows
 
 
+@cached("cash_flow")
+def get_cash_flow_page(cursor=None, direction="next", page_size=HISTORY_PAGE_SIZE,
+                       descending=False, with_total=False):
+    """One keyset page of get_all_cash_flow(), plus the running balance
+    brought forward from every earlier entry as "opening_balance"."""
+    with connection() as conn:
+        page = _keyset_page(conn, "SELECT c.* FROM cash_flow c", "c", [], [],
+                            cursor, direction, page_size, descending, with_total)
+        page["opening_balance"] = _balance_before(
+            conn, "SELECT COALESCE(SUM(COALESCE(inflow, 0) - COALESCE(outflow, 0)), 0) FROM cash_flow",
+            page, descending)
+    return page
+
+
+def _balance_before(conn, total_query, page, descending):
+    """Sum of total_query over the rows that precede the page in date order."""
+    key = page["last"] if descending else page["first"]
+    if key is None:
+        return 0
+    return conn.execute(total_query + " WHERE (date, id) < (?, ?)", key).fetchone()[0]
+
+
+@cached("cash_flow")
+def get_pending_cash_flow_page(cursor=None, direction="next", page_size=HISTORY_PAGE_SIZE,
+                               descending=False, with_total=False):
+    """One keyset page of the entries still marked Pending."""
+    with connection() as conn:
+        return _keyset_page(conn, "SELECT c.* FROM cash_flow c", "c",
+                            ["c.status = 'Pending'"], [],
+                            cursor, direction, page_size, descending, with_total)
+
+
+@queued("cash_flow")
 def update_cash_flow_status(cf_id, status):
-    conn = get_connection()
-    conn.execute("UPDATE cash_flow SET status = ? WHERE id = ?", (status, cf_id))
-    conn.commit()
-    conn.close()
+    with transaction("cash_flow") as conn:
+        conn.execute("UPDATE cash_flow SET status = ? WHERE id = ?", (status, cf_id))
 
 
+@cached("cash_flow")
 def get_cash_summary():
-    conn = get_connection()
-    row = conn.execute("""
-        SELECT
-            COALESCE(SUM(CASE WHEN status='Completed' THEN inflow ELSE 0 END), 0) -
-            COALESCE(SUM(CASE WHEN status='Completed' THEN outflow ELSE 0 END), 0) as cash_in_hand,
-            COALESCE(SUM(CASE WHEN status='Pending' AND inflow > 0 THEN inflow ELSE 0 END), 0) as pending_receipts,
-            COALESCE(SUM(CASE WHEN status='Pending' AND outflow > 0 THEN outflow ELSE 0 END), 0) as pending_payments
-        FROM cash_flow
-    """).fetchone()
-    conn.close()
+    # Per-status totals kept by triggers (see migrations.LEDGER_TOTALS).
+    with connection() as conn:
+        row = conn.execute("""
+            SELECT
+                COALESCE(SUM(CASE WHEN status='Completed' THEN inflow - outflow ELSE 0 END), 0) as cash_in_hand,
+                COALESCE(SUM(CASE WHEN status='Pending' THEN receipts ELSE 0 END), 0) as pending_receipts,
+                COALESCE(SUM(CASE WHEN status='Pending' THEN payments ELSE 0 END), 0) as pending_payments
+            FROM cash_flow_totals
+        """).fetchone()
     return row
 
 
 # --------------- Capital ---------------
 
+@queued("capital")
 def add_capital(date_val, description, cap_type, amount):
-    conn = get_connection()
-    conn.execute(
-        "INSERT INTO capital (date, description, type, amount) VALUES (?, ?, ?, ?)",
-        (date_val, description, cap_type, amount)
-    )
-    conn.commit()
-    conn.close()
+    with transaction("capital") as conn:
+        conn.execute(
+            "INSERT INTO capital (date, description, type, amount) VALUES (?, ?, ?, ?)",
+            (date_val, description, cap_type, amount)
+        )
 
 
+@cached("capital")
 def get_all_capital():
-    conn = get_connection()
-    rows = conn.execute("SELECT * FROM capital ORDER BY date ASC, id ASC").fetchall()
-    conn.close()
+    with connection() as conn:
+        rows = conn.execute("SELECT * FROM capital ORDER BY date ASC, id ASC").fetchall()
     return rows
 
 
+@cached("capital")
+def get_capital_page(cursor=None, direction="next", page_size=HISTORY_PAGE_SIZE,
+                     descending=False, with_total=False):
+    """One keyset page of get_all_capital(), with "opening_balance" as for
+    get_cash_flow_page()."""
+    with connection() as conn:
+        page = _keyset_page(conn, "SELECT c.* FROM capital c", "c", [], [],
+                            cursor, direction, page_size, descending, with_total)
+        page["opening_balance"] = _balance_before(
+            conn,
+            "SELECT COALESCE(SUM(CASE WHEN type='Capital In' THEN amount ELSE -amount END), 0) FROM capital",
+            page, descending)
+    return page
+
+
+@cached("capital")
 def get_capital_balance():
-    conn = get_connection()
-    row = conn.execute("""
-        SELECT COALESCE(SUM(CASE WHEN type='Capital In' THEN amount ELSE -amount END), 0) as balance
-        FROM capital
-    """).fetchone()
-    conn.close()
+    with connection() as conn:
+        row = conn.execute("""
+            SELECT COALESCE(SUM(CASE WHEN type='Capital In' THEN amount ELSE -amount END), 0) as balance
+            FROM capital_totals
+        """).fetchone()
     return row["balance"]
 
 
 # --------------- Reports / Aggregations ---------------
 
+@cached("sales", "expenses", "products")
 def get_monthly_pnl():
-    conn = get_connection()
-    rows = conn.execute("""
-        SELECT
-            strftime('%Y-%m', s.date) as month,
-            COALESCE(SUM((s.selling_price_retailer - pr.cost_per_unit) * s.quantity), 0) as gross_profit,
-            0 as expenses,
-            0 as net_profit
-        FROM sales s
-        LEFT JOIN products pr ON s.batch_id = pr.batch_id
-        GROUP BY strftime('%Y-%m', s.date)
-        ORDER BY month
-    """).fetchall()
-
-    result = []
-    for r in rows:
-        month = r["month"]
-        gross = r["gross_profit"]
-        exp_row = conn.execute(
-            "SELECT COALESCE(SUM(amount), 0) as total FROM expenses WHERE strftime('%Y-%m', date) = ?",
-            (month,)
-        ).fetchone()
-        expenses = exp_row["total"]
-        result.append({
-            "month": month,
-            "gross_profit": gross,
-            "expenses": expenses,
-            "net_profit": gross - expenses
-        })
-
-    conn.close()
-    return result
-
-
+    with connection() as conn:
+        return fetch_frame(conn, """
+            SELECT month,
+                   revenue - cogs as gross_profit,
+                   expenses,
+                   revenue - cogs - expenses as net_profit
+            FROM monthly_totals
+            WHERE sale_lines > 0
+            ORDER BY month
+        """)
+
+
+@cached("sales")
 def get_monthly_revenue():
-    conn = get_connection()
-    rows = conn.execute("""
-        SELECT
-            strftime('%Y-%m', date) as month,
-            SUM(selling_price_retailer * quantity) as revenue,
-            SUM(quantity) as units_sold
-        FROM sales
-        GROUP BY strftime('%Y-%m', date)
-        ORDER BY month
-    """).fetchall()
-    conn.close()
+    with connection() as conn:
+        return fetch_frame(conn, """
+            SELECT month, revenue, units_sold
+            FROM monthly_totals
+            WHERE sale_lines > 0
+            ORDER BY month
+        """)
+
+
+@cached("sales", "expenses", "purchases", "products")
+def get_daily_totals(start_date, end_date):
+    with connection() as conn:
+        rows = conn.execute(
+            "SELECT * FROM daily_totals WHERE day BETWEEN ? AND ? ORDER BY day",
+            (start_date, end_date)
+        ).fetchall()
     return rows
 
 
-def get_top_selling_products(limit=5):
-    conn = get_connection()
-    rows = conn.execute("""
-        SELECT s.batch_id, pr.product_name, SUM(s.quantity) as total_qty,
-               SUM(s.selling_price_retailer * s.quantity) as total_revenue
-        FROM sales s
-        LEFT JOIN products pr ON s.batch_id = pr.batch_id
-        GROUP BY s.batch_id
-        ORDER BY total_qty DESC
-        LIMIT ?
-    """, (limit,)).fetchall()
-    conn.close()
+def rebuild_rollups():
+    """Recompute daily_totals and monthly_totals from the ledgers."""
+    with transaction() as conn:
+        for sql in migrations.REBUILD_ROLLUPS:
+            conn.execute(sql)
+
+
+def verify_rollups():
+    """Return days/months whose rollup totals disagree with the ledgers,
+    and any rollup row without a day or month (key None)."""
+    cols = migrations.ROLLUP_COLUMNS
+    sums = ", ".join(f"SUM({c}) as {c}" for c in cols)
+    negated = ", ".join(f"-{c}" for c in cols)
+    drift = " OR ".join(f"ABS(SUM({c})) > 0.005" for c in cols)
+    with connection() as conn:
+        rows = conn.execute(f"""
+            WITH expected AS (
+                SELECT day, {sums} FROM ({migrations.ROLLUP_FROM_LEDGERS}) GROUP BY day
+            )
+            SELECT 'day' as level, key, {sums} FROM (
+                SELECT day as key, {", ".join(cols)} FROM expected
+                UNION ALL
+                SELECT day, {negated} FROM daily_totals
+            ) GROUP BY key HAVING {drift} OR key IS NULL
+            UNION ALL
+            SELECT 'month', key, {sums} FROM (
+                SELECT substr(day, 1, 7) as key, {", ".join(cols)} FROM expected
+                UNION ALL
+                SELECT month, {negated} FROM monthly_totals
+            ) GROUP BY key HAVING {drift} OR key IS NULL
+        """).fetchall()
     return rows
 
 
+@cached("sales", "products")
+def get_top_selling_products(limit=5):
+    with connection() as conn:
+        return fetch_frame(conn, """
+            SELECT s.batch_id, pr.product_name, SUM(s.units_sold) as total_qty,
+                   SUM(s.revenue) as total_revenue
+            FROM sales_summary s
+            LEFT JOIN products pr ON s.batch_id = pr.batch_id
+            GROUP BY s.batch_id
+            HAVING SUM(s.sale_lines) > 0
+            ORDER BY total_qty DESC
+            LIMIT ?
+        """, (limit,))
+
+
+@cached("products", "purchases", "sales", "expenses", "cash_flow")
 def get_dashboard_kpis():
-    conn = get_connection()
-
-    total_products = conn.execute("SELECT COUNT(*) as c FROM products").fetchone()["c"]
-
-    stock_value = conn.execute("""
-        SELECT COALESCE(SUM(
-            pr.cost_per_unit * (COALESCE(purch.tp, 0) - COALESCE(sl.ts, 0))
-        ), 0) as val
-        FROM products pr
-        LEFT JOIN (SELECT batch_id, SUM(quantity) as tp FROM purchases GROUP BY batch_id) purch
-            ON pr.batch_id = purch.batch_id
-        LEFT JOIN (SELECT batch_id, SUM(quantity) as ts FROM sales GROUP BY batch_id) sl
-            ON pr.batch_id = sl.batch_id
-    """).fetchone()["val"]
-
-    now = datetime.now()
-    month_start = now.strftime("%Y-%m-01")
-    month_end = now.strftime("%Y-%m-31")
-
-    monthly_revenue = conn.execute(
-        "SELECT COALESCE(SUM(selling_price_retailer * quantity), 0) as rev FROM sales WHERE date BETWEEN ? AND ?",
-        (month_start, month_end)
-    ).fetchone()["rev"]
-
-    monthly_cost = conn.execute("""
-        SELECT COALESCE(SUM(pr.cost_per_unit * s.quantity), 0) as cost
-        FROM sales s LEFT JOIN products pr ON s.batch_id = pr.batch_id
-        WHERE s.date BETWEEN ? AND ?
-    """, (month_start, month_end)).fetchone()["cost"]
-
-    monthly_expenses = conn.execute(
-        "SELECT COALESCE(SUM(amount), 0) as exp FROM expenses WHERE date BETWEEN ? AND ?",
-        (month_start, month_end)
-    ).fetchone()["exp"]
-
-    monthly_profit = monthly_revenue - monthly_cost - monthly_expenses
-
-    cash_summary = get_cash_summary()
+    with connection() as conn:
+        total_products = conn.execute("SELECT COUNT(*) as c FROM products").fetchone()["c"]
+
+        stock_value = conn.execute("""
+            SELECT COALESCE(SUM(pr.cost_per_unit * sl.closing_stock), 0) as val
+            FROM stock_levels sl
+            JOIN products pr ON pr.batch_id = sl.batch_id
+        """).fetchone()["val"]
+
+        month = conn.execute(
+            "SELECT revenue, cogs, expenses FROM monthly_totals WHERE month = ?",
+            (datetime.now().strftime("%Y-%m"),)
+        ).fetchone()
+        monthly_revenue = month["revenue"] if month else 0
+        monthly_profit = month["revenue"] - month["cogs"] - month["expenses"] if month else 0
 
-    conn.close()
+        # Reuses the connection checked out above.
+        cash_summary = get_cash_summary()
     return {
         "total_products": total_products,
         "stock_value": stock_value,
@@ -540,49 +1876,396 @@ def get_dashboard_kpis():
     }
 
 
+@cached("sales", "products")
 def get_recent_sales(limit=5):
-    conn = get_connection()
-    rows = conn.execute("""
-        SELECT s.date, s.batch_id, pr.product_name, s.quantity,
-               s.selling_price_customer, s.sale_type
-        FROM sales s LEFT JOIN products pr ON s.batch_id = pr.batch_id
-        ORDER BY s.date DESC, s.id DESC LIMIT ?
-    """, (limit,)).fetchall()
-    conn.close()
-    return rows
+    with connection() as conn:
+        return fetch_frame(conn, """
+            SELECT s.date, s.batch_id, pr.product_name, s.quantity,
+                   s.selling_price_customer, s.sale_type
+            FROM sales s LEFT JOIN products pr ON s.batch_id = pr.batch_id
+            ORDER BY s.date DESC, s.id DESC LIMIT ?
+        """, (limit,))
 
 
+@cached("purchases", "products")
 def get_recent_purchases(limit=5):
-    conn = get_connection()
-    rows = conn.execute("""
-        SELECT p.date, p.batch_id, pr.product_name, p.quantity, p.cost_per_unit
-        FROM purchases p LEFT JOIN products pr ON p.batch_id = pr.batch_id
-        ORDER BY p.date DESC, p.id DESC LIMIT ?
-    """, (limit,)).fetchall()
-    conn.close()
-    return rows
+    with connection() as conn:
+        return fetch_frame(conn, """
+            SELECT p.date, p.batch_id, pr.product_name, p.quantity, p.cost_per_unit
+            FROM purchases p LEFT JOIN products pr ON p.batch_id = pr.batch_id
+            ORDER BY p.date DESC, p.id DESC LIMIT ?
+        """, (limit,))
 
 
+@cached("products", "purchases", "sales")
 def get_low_stock_alerts(threshold=1):
-    conn = get_connection()
-    rows = conn.execute("""
-        SELECT pr.batch_id, pr.product_name,
-            (COALESCE(purch.tp, 0) - COALESCE(sl.ts, 0)) as closing_stock
-        FROM products pr
-        LEFT JOIN (SELECT batch_id, SUM(quantity) as tp FROM purchases GROUP BY batch_id) purch
-            ON pr.batch_id = purch.batch_id
-        LEFT JOIN (SELECT batch_id, SUM(quantity) as ts FROM sales GROUP BY batch_id) sl
-            ON pr.batch_id = sl.batch_id
-        WHERE (COALESCE(purch.tp, 0) - COALESCE(sl.ts, 0)) <= ?
-          AND (COALESCE(purch.tp, 0) - COALESCE(sl.ts, 0)) >= 0
-        ORDER BY closing_stock ASC
-    """, (threshold,)).fetchall()
-    conn.close()
+    with connection() as conn:
+        rows = conn.execute("""
+            SELECT pr.batch_id, pr.product_name,
+                COALESCE(sl.closing_stock, 0) as closing_stock
+            FROM products pr
+            LEFT JOIN stock_levels sl ON pr.batch_id = sl.batch_id
+            WHERE COALESCE(sl.closing_stock, 0) BETWEEN 0 AND ?
+            ORDER BY closing_stock ASC
+        """, (threshold,)).fetchall()
     return rows
 
 
+@cached("products")
 def is_db_empty():
-    conn = get_connection()
-    count = conn.execute("SELECT COUNT(*) as c FROM products").fetchone()["c"]
-    conn.close()
+    with connection() as conn:
+        count = conn.execute("SELECT COUNT(*) as c FROM products").fetchone()["c"]
     return count == 0
+
+
+# --------------- Sales Analysis ---------------
+# Channel, product and month-by-channel totals for the Reports tab, read
+# from sales_summary (one row per batch, sale type and month). Margin is
+# revenue less units at the product's current cost, as in the P&L; it is
+# worked out per batch, so products are looked up once per batch.
+
+def _sales_summary_rows(start_date, end_date):
+    """SQL and params yielding sales_summary-shaped rows for sales dated
+    start_date..end_date, or for every sale unless both are given.
+
+    Whole months come from sales_summary; only the sales in a partial
+    month at either end of the range are summed from the ledger.
+    """
+    summary = "SELECT batch_id, sale_type, month, revenue, units_sold, sale_lines FROM sales_summary"
+    if not (start_date and end_date):
+        return summary, []
+    start, end = str(start_date)[:10], str(end_date)[:10]
+    first = date.fromisoformat(start)
+    if first.day != 1:
+        first = (first.replace(day=1) + timedelta(days=31)).replace(day=1)
+    after = (date.fromisoformat(end) + timedelta(days=1)).replace(day=1)
+    ledger = """SELECT batch_id, sale_type, COALESCE(substr(date(date), 1, 7), '') as month,
+                       SUM(selling_price_retailer * quantity) as revenue,
+                       SUM(quantity) as units_sold, COUNT(*) as sale_lines
+                FROM sales WHERE date BETWEEN ? AND ?{} GROUP BY 1, 2, 3"""
+    if first >= after:  # no whole month inside the range
+        return ledger.format(""), [start, end]
+    return (f"{summary} WHERE month >= ? AND month < ? UNION ALL "
+            + ledger.format(" AND (date < ? OR date >= ?)"),
+            [str(first)[:7], str(after)[:7], start, end, str(first), str(after)])
+
+
+def _by_batch(start_date, end_date, keys):
+    """Per-batch totals (grouped further by `keys`) and their params."""
+    source, params = _sales_summary_rows(start_date, end_date)
+    return f"""
+        SELECT batch_id, {keys + ", " if keys else ""}SUM(revenue) as revenue,
+               SUM(units_sold) as units_sold, SUM(sale_lines) as sale_lines
+        FROM ({source}) GROUP BY batch_id{", " + keys if keys else ""}""", params
+
+
+@cached("sales", "products")
+def get_sales_by_channel(start_date=None, end_date=None, category=None):
+    """Revenue, units and margin per sale type."""
+    batches, params = _by_batch(start_date, end_date, "sale_type")
+    with connection() as conn:
+        return fetch_frame(conn, f"""
+            SELECT x.sale_type, SUM(x.revenue) as revenue, SUM(x.units_sold) as units_sold,
+                   SUM(x.revenue - x.units_sold * COALESCE(pr.cost_per_unit, 0)) as margin
+            FROM ({batches}) x
+            LEFT JOIN products pr ON pr.batch_id = x.batch_id
+            {"WHERE pr.category = ?" if category else ""}
+            GROUP BY x.sale_type
+            HAVING SUM(x.sale_lines) > 0
+            ORDER BY x.sale_type
+        """, params + ([category] if category else []))
+
+
+@cached("sales", "products")
+def get_sales_by_product(start_date=None, end_date=None, category=None, limit=None):
+    """Revenue, units and margin per product name, highest revenue first;
+    only the top `limit` products if given. Sales of unknown batches are
+    left out."""
+    batches, params = _by_batch(start_date, end_date, "")
+    with connection() as conn:
+        return fetch_frame(conn, f"""
+            SELECT pr.product_name, SUM(x.revenue) as revenue, SUM(x.units_sold) as units_sold,
+                   SUM(x.revenue - x.units_sold * COALESCE(pr.cost_per_unit, 0)) as margin
+            FROM ({batches}) x
+            JOIN products pr ON pr.batch_id = x.batch_id
+            WHERE pr.product_name IS NOT NULL{" AND pr.category = ?" if category else ""}
+            GROUP BY pr.product_name
+            HAVING SUM(x.sale_lines) > 0
+            ORDER BY revenue DESC, pr.product_name
+            LIMIT ?
+        """, params + ([category] if category else []) + [-1 if limit is None else limit])
+
+
+@cached("sales", "products")
+def get_monthly_sales_by_channel(start_date=None, end_date=None, category=None):
+    """Revenue and units per month and sale type."""
+    source, params = _sales_summary_rows(start_date, end_date)
+    where = ["x.month <> ''"]
+    if category:
+        where.append("x.batch_id IN (SELECT batch_id FROM products WHERE category = ?)")
+        params.append(category)
+    with connection() as conn:
+        return fetch_frame(conn, f"""
+            SELECT x.month, x.sale_type, SUM(x.revenue) as revenue, SUM(x.units_sold) as units_sold
+            FROM ({source}) x
+            WHERE {" AND ".join(where)}
+            GROUP BY x.month, x.sale_type
+            HAVING SUM(x.sale_lines) > 0
+            ORDER BY x.month, x.sale_type
+        """, params)
+
+
+def rebuild_sales_summary():
+    """Recompute sales_summary from the sales ledger."""
+    with transaction() as conn:
+        for sql in migrations.REBUILD_SALES_SUMMARY:
+            conn.execute(sql)
+
+
+def verify_sales_summary():
+    """Return (batch, sale type, month) keys whose summary disagrees with the sales."""
+    with connection() as conn:
+        rows = conn.execute(f"""
+            SELECT batch_id, sale_type, month, SUM(revenue) as revenue,
+                   SUM(units_sold) as units_sold, SUM(sale_lines) as sale_lines
+            FROM (
+                {migrations.SALES_SUMMARY_FROM_SALES}
+                UNION ALL
+                SELECT batch_id, sale_type, month, -revenue, -units_sold, -sale_lines
+                FROM sales_summary
+            )
+            GROUP BY batch_id, sale_type, month
+            HAVING ABS(SUM(revenue)) > 0.005 OR SUM(units_sold) != 0 OR SUM(sale_lines) != 0
+            ORDER BY batch_id, sale_type, month
+        """).fetchall()
+    return rows
+
+
+def rebuild_ledger_totals():
+    """Recompute cash_flow_totals and capital_totals from their ledgers."""
+    with transaction() as conn:
+        for sql in migrations.REBUILD_LEDGER_TOTALS:
+            conn.execute(sql)
+
+
+def verify_ledger_totals():
+    """Return (table, key) pairs whose totals disagree with the ledger."""
+    with connection() as conn:
+        rows = []
+        for name, (_, key, _, cols) in migrations.LEDGER_TOTALS.items():
+            drift = " OR ".join(f"ABS(SUM({c})) > 0.005" for c in cols)
+            rows += conn.execute(f"""
+                SELECT '{name}' as totals, {key} as key, {", ".join(f"SUM({c}) as {c}" for c in cols)}
+                FROM (
+                    {migrations.ledger_totals_from_ledger(name)}
+                    UNION ALL
+                    SELECT {key}, {", ".join(f"-{c}" for c in cols)} FROM {name}
+                )
+                GROUP BY {key}
+                HAVING {drift}
+                ORDER BY {key}
+            """).fetchall()
+    return rows
+
+
+# --------------- Dashboard ---------------
+# The dashboard's widgets read independent queries, so they are loaded side
+# by side on a small thread pool, each on a read-only connection of its own;
+# a cold dashboard costs its slowest query rather than the sum of them.
+# Each connection reads its own WAL snapshot, so a write committing
+# mid-load can show in one widget and not yet in another.
+
+DASHBOARD_WORKERS = 6
+
+# Widget -> reader, in the order the dashboard draws them.
+DASHBOARD_WIDGETS = {
+    "kpis": get_dashboard_kpis,
+    "monthly_revenue": get_monthly_revenue,
+    "top_products": lambda: get_top_selling_products(5),
+    "stock": get_stock,
+    "recent_sales": lambda: get_recent_sales(5),
+    "recent_purchases": lambda: get_recent_purchases(5),
+}
+
+
+class DashboardSnapshot(NamedTuple):
+    """The dashboard's data, one field per widget, plus load `timings`
+    (ms per widget and "total")."""
+    kpis: MappingProxyType
+    monthly_revenue: pd.DataFrame
+    top_products: pd.DataFrame
+    stock: tuple
+    recent_sales: pd.DataFrame
+    recent_purchases: pd.DataFrame
+    timings: MappingProxyType
+
+
+_dashboard_executor = None
+_dashboard_lock = threading.Lock()
+
+
+def _dashboard_pool():
+    global _dashboard_executor
+    with _dashboard_lock:
+        if _dashboard_executor is None:
+            _dashboard_executor = ThreadPoolExecutor(DASHBOARD_WORKERS, thread_name_prefix="lookiva-dashboard")
+        return _dashboard_executor
+
+
+def _load_widget(reader):
+    start = time.perf_counter()
+    with connection(read_only=True):
+        value = reader()
+    return value, (time.perf_counter() - start) * 1000
+
+
+def load_dashboard():
+    """Read every dashboard widget concurrently into a DashboardSnapshot."""
+    start = time.perf_counter()
+    pool = _dashboard_pool()
+    futures = {name: pool.submit(_load_widget, reader) for name, reader in DASHBOARD_WIDGETS.items()}
+    values, timings = {}, {}
+    for name, future in futures.items():
+        values[name], timings[name] = future.result()
+    timings["total"] = (time.perf_counter() - start) * 1000
+    values["kpis"] = MappingProxyType(values["kpis"])
+    values["stock"] = tuple(values["stock"])
+    return DashboardSnapshot(**values, timings=MappingProxyType(timings))
+
+
+# --------------- Exports ---------------
+# Full-length exports are read straight off the cursor in chunks instead of
+# through the cached readers above, so a multi-year ledger is never held in
+# memory at once. Each entry is the query, the date column the optional
+# range filters on, and the ORDER BY. Running balances and the cumulative
+# profit are window sums over the whole ledger, filtered afterwards, so a
+# date range still starts from the true brought-forward figure.
+
+EXPORT_CHUNK_SIZE = 5000
+
+EXPORTS = {
+    "sales": ("""
+        SELECT s.date, s.batch_id, pr.product_name, pr.category, s.quantity,
+               s.selling_price_customer, s.selling_price_retailer,
+               (s.selling_price_retailer - COALESCE(pr.cost_per_unit, 0)) * s.quantity as margin,
+               s.sale_type, s.remarks
+        FROM sales s
+        LEFT JOIN products pr ON s.batch_id = pr.batch_id""", "s.date", "s.date, s.id"),
+    "purchases": ("""
+        SELECT p.date, p.batch_id, pr.product_name, pr.category, p.supplier_name,
+               p.quantity, p.cost_per_unit, p.quantity * p.cost_per_unit as total,
+               p.payment_method, p.remarks
+        FROM purchases p
+        LEFT JOIN products pr ON p.batch_id = pr.batch_id""", "p.date", "p.date, p.id"),
+    "expenses": ("""
+        SELECT e.date, e.expense_type, e.description, e.amount
+        FROM expenses e""", "e.date", "e.date, e.id"),
+    "cash_flow": ("""
+        SELECT date, description, inflow, outflow, balance, pending_type, status FROM (
+            SELECT date, description, inflow, outflow,
+                   SUM(COALESCE(inflow, 0) - COALESCE(outflow, 0))
+                       OVER (ORDER BY date, id) as balance,
+                   pending_type, status, id
+            FROM cash_flow) c""", "c.date", "c.date, c.id"),
+    "capital": ("""
+        SELECT date, description, type, amount, balance FROM (
+            SELECT date, description, type, amount,
+                   SUM(CASE WHEN type='Capital In' THEN amount ELSE -amount END)
+                       OVER (ORDER BY date, id) as balance,
+                   id
+            FROM capital) c""", "c.date", "c.date, c.id"),
+    "stock": ("""
+        SELECT pr.batch_id, pr.product_name, pr.category,
+               COALESCE(sl.total_purchased, 0) as total_purchased,
+               COALESCE(sl.total_sold, 0) as total_sold,
+               COALESCE(sl.closing_stock, 0) as closing_stock,
+               pr.cost_per_unit,
+               CASE WHEN sl.closing_stock > 0 THEN pr.cost_per_unit * sl.closing_stock END as stock_value,
+               CASE WHEN COALESCE(sl.closing_stock, 0) <= 0 THEN 'Out of Stock'
+                    WHEN sl.closing_stock <= 2 THEN 'Low Stock'  -- tables.LOW_STOCK_LEVEL
+                    ELSE 'Available' END as status
+        FROM products pr
+        LEFT JOIN stock_levels sl ON pr.batch_id = sl.batch_id""", None, "pr.batch_id"),
+    "pnl": ("""
+        SELECT * FROM (
+            SELECT month, revenue - cogs as gross_profit, expenses,
+                   revenue - cogs - expenses as net_profit,
+                   SUM(revenue - cogs - expenses) OVER (ORDER BY month) as cumulative
+            FROM monthly_totals
+            WHERE sale_lines > 0) m""", "m.month", "m.month"),
+}
+
+
+def iter_export(name, start_date=None, end_date=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Stream export `name` (a key of EXPORTS) in date order.
+
+    Yields the column names first, then lists of up to `chunk_size` row
+    tuples. `start_date`/`end_date` bound the date (or, for "pnl", the
+    month) inclusively; either may be None.
+    """
+    query, date_col, order = EXPORTS[name]
+    where, params = [], []
+    if date_col and start_date:
+        where.append(f"{date_col} >= ?")
+        params.append(str(start_date)[:7] if name == "pnl" else str(start_date))
+    if date_col and end_date:
+        where.append(f"{date_col} <= ?")
+        params.append(str(end_date)[:7] if name == "pnl" else str(end_date))
+    if where:
+        query += " WHERE " + " AND ".join(where)
+    query += f" ORDER BY {order}"
+
+    # A connection of its own, never checked out to the thread: the
+    # consumer may abandon the generator, or finalize it from another thread.
+    conn = get_connection(read_only=True)
+    try:
+        cur = conn.cursor()
+        cur.row_factory = None
+        cur.execute(query, params)
+        yield tuple(d[0] for d in cur.description)
+        while chunk := cur.fetchmany(chunk_size):
+            yield chunk
+    finally:
+        conn.close()
+
+
+# --------------- Maintenance CLI ---------------
+
+_DERIVED_TABLES = {
+    "stock": (rebuild_stock_levels, verify_stock_levels),
+    "rollups": (rebuild_rollups, verify_rollups),
+    "sales-summary": (rebuild_sales_summary, verify_sales_summary),
+    "totals": (rebuild_ledger_totals, verify_ledger_totals),
+    "search": (rebuild_search_index, verify_search_index),
+}
+
+
+def _main(argv=None):
+    import argparse
+
+    commands = ["migrate"] + [f"{verb}-{name}" for name in _DERIVED_TABLES
+                              for verb in ("verify", "rebuild")]
+    parser = argparse.ArgumentParser(description="LookIva database maintenance")
+    parser.add_argument("command", choices=commands)
+    args = parser.parse_args(argv)
+
+    for version, description in init_db():
+        print(f"Migrated schema to v{version}: {description}")
+    if args.command == "migrate":
+        return 0
+
+    verb, name = args.command.split("-", 1)
+    rebuild, verify = _DERIVED_TABLES[name]
+    if verb == "rebuild":
+        rebuild()
+        print(f"{name} rebuilt.")
+
+    mismatches = verify()
+    for m in mismatches:
+        print("  " + ", ".join(f"{k}={m[k]}" for k in m.keys()))
+    print(f"{name}: {len(mismatches)} mismatch(es).")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(_main())
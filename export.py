@@ -0,0 +1,156 @@
+"""
+Streaming CSV and Excel exports.
+
+Rows come off database.iter_export() a chunk at a time and are written
+straight to the output: CSV through the csv module, XLSX through an
+openpyxl write-only workbook. Neither ever holds the whole export as a
+DataFrame, so a multi-year ledger costs the size of the finished file
+rather than of its rows as Python objects. The download buttons build
+the file only when clicked, on Streamlit's download thread, so the page
+is never blocked.
+
+Usage: python export.py {sales,purchases,...} OUT.csv|OUT.xlsx [--from DATE] [--to DATE]
+"""
+import io
+import os
+import csv
+import argparse
+from datetime import date
+import openpyxl
+import database as db
+
+# Headers written for each column; columns not listed keep their name.
+HEADERS = {
+    "date": "Date",
+    "month": "Month",
+    "batch_id": "Batch ID",
+    "product_name": "Product",
+    "category": "Category",
+    "supplier_name": "Supplier",
+    "quantity": "Qty",
+    "cost_per_unit": "Cost/Unit",
+    "total": "Total",
+    "payment_method": "Payment",
+    "selling_price_customer": "Customer Price",
+    "selling_price_retailer": "Your Price",
+    "margin": "Margin",
+    "sale_type": "Type",
+    "remarks": "Remarks",
+    "expense_type": "Type",
+    "description": "Description",
+    "amount": "Amount",
+    "inflow": "Inflow",
+    "outflow": "Outflow",
+    "balance": "Balance",
+    "pending_type": "Pending Type",
+    "status": "Status",
+    "type": "Type",
+    "total_purchased": "Purchased",
+    "total_sold": "Sold",
+    "closing_stock": "Closing Stock",
+    "stock_value": "Stock Value",
+    "gross_profit": "Gross Profit",
+    "expenses": "Expenses",
+    "net_profit": "Net Profit",
+    "cumulative": "Cumulative",
+}
+
+FORMATS = {
+    "csv": ("text/csv", "📥 Export to CSV"),
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "📥 Export to Excel"),
+}
+
+
+def excel_date(value):
+    """`value` as a date for an Excel cell; anything that does not read as
+    YYYY-MM-DD (blank, or typed in another format) is kept as it is."""
+    try:
+        return date.fromisoformat(value[:10])
+    except (TypeError, ValueError):
+        return value
+
+
+def write_csv(name, out, start_date=None, end_date=None):
+    """Write export `name` as CSV to the text file `out`; returns the row count."""
+    rows = db.iter_export(name, start_date, end_date)
+    writer = csv.writer(out)
+    writer.writerow([HEADERS.get(c, c) for c in next(rows)])
+    count = 0
+    for chunk in rows:
+        writer.writerows(chunk)
+        count += len(chunk)
+    return count
+
+
+def write_xlsx(name, out, start_date=None, end_date=None):
+    """Write export `name` as a one-sheet workbook to `out` (a path or binary
+    file); returns the row count. Dates are written as Excel dates, or as
+    text when they do not parse."""
+    rows = db.iter_export(name, start_date, end_date)
+    columns = next(rows)
+    dated = [i for i, c in enumerate(columns) if c == "date"]
+
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet(name)
+    ws.append([HEADERS.get(c, c) for c in columns])
+    count = 0
+    for chunk in rows:
+        for row in chunk:
+            if dated:
+                row = list(row)
+                for i in dated:
+                    row[i] = excel_date(row[i])
+            ws.append(row)
+        count += len(chunk)
+    wb.save(out)
+    return count
+
+
+def export_bytes(name, fmt, start_date=None, end_date=None):
+    """The file contents of export `name` in `fmt` ("csv" or "xlsx")."""
+    out = io.BytesIO()
+    if fmt == "csv":
+        text = io.TextIOWrapper(out, encoding="utf-8", newline="")
+        write_csv(name, text, start_date, end_date)
+        text.flush()
+        text.detach()
+    else:
+        write_xlsx(name, out, start_date, end_date)
+    return out.getvalue()
+
+
+def download_buttons(name, start_date=None, end_date=None, key=None):
+    """CSV and Excel download buttons for export `name`, built on click."""
+    import streamlit as st
+
+    key = key or f"export_{name}"
+    stem = f"lookiva_{name}"
+    if start_date and end_date:
+        stem += f"_{start_date}_{end_date}"
+    cols = st.columns([1] * len(FORMATS) + [2])
+    for col, (fmt, (mime, button)) in zip(cols, FORMATS.items()):
+        col.download_button(
+            button,
+            lambda fmt=fmt: export_bytes(name, fmt, start_date, end_date),
+            f"{stem}.{fmt}",
+            mime,
+            key=f"{key}_{fmt}",
+            on_click="ignore",
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export a ledger or report to CSV or Excel.")
+    parser.add_argument("name", choices=sorted(db.EXPORTS))
+    parser.add_argument("path", help="output file; .xlsx writes a workbook, anything else CSV")
+    parser.add_argument("--from", dest="start", help="first date (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="end", help="last date (YYYY-MM-DD)")
+    args = parser.parse_args()
+    for version, description in db.init_db():
+        print(f"Migrated schema to v{version}: {description}")
+    if os.path.splitext(args.path)[1].lower() == ".xlsx":
+        count = write_xlsx(args.name, args.path, args.start, args.end)
+    else:
+        with open(args.path, "w", newline="", encoding="utf-8") as f:
+            count = write_csv(args.name, f, args.start, args.end)
+    print(f"Exported {count:,} {args.name} rows to {args.path}")
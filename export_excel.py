@@ -0,0 +1,160 @@
+"""
+Export the whole database back to the SareeBusinessTracker.xlsx layout.
+
+Writes the six sheets import_excel.py reads, under the same headers, so the
+result imports into an empty database with the same rows, returns included;
+`python benchmark.py roundtrip` checks this. Rows with a zero quantity or
+amount are written too, but the importer skips them as blank.
+
+Each sheet is streamed off its own connection into its own openpyxl
+write-only workbook in a worker process, so every process holds one chunk
+of rows at a time however long the ledgers are. openpyxl writes strings
+inline and every part registers the same date style first, so the worksheet
+XML of each part is self-contained; the finished parts are copied into one
+workbook zip at the end.
+
+Usage: python export_excel.py OUT.xlsx [--workers N]
+"""
+import os
+import re
+import time
+import shutil
+import zipfile
+import argparse
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+import database as db
+from export import excel_date
+
+DATE_FORMAT = "yyyy-mm-dd"
+
+# (sheet, table, [(header, column)]) in the order import_excel.IMPORTS loads them.
+SHEETS = [
+    ("ProductMaster", "products", [
+        ("BatchID", "batch_id"), ("BaseProductID", "base_product_id"),
+        ("ProductCategory", "category"), ("ProductName", "product_name"),
+        ("Fabric", "fabric"), ("Color", "color"), ("Pattern", "pattern"), ("Size", "size"),
+        ("Source", "source"), ("CostPerUnit", "cost_per_unit"),
+        ("FirstPurchaseDate", "first_purchase_date"), ("Remarks", "remarks"),
+    ]),
+    ("Purchases", "purchases", [
+        ("Date", "date"), ("BatchID", "batch_id"), ("SupplierName", "supplier_name"),
+        ("Quantity", "quantity"), ("CostPerUnit", "cost_per_unit"),
+        ("PaymentMethod", "payment_method"), ("Remarks", "remarks"),
+    ]),
+    ("Sales", "sales", [
+        ("Date", "date"), ("BatchID", "batch_id"), ("Quantity", "quantity"),
+        ("SellingPriceToCustomer", "selling_price_customer"),
+        ("SellingPriceToRetailer", "selling_price_retailer"),
+        ("SaleType", "sale_type"), ("Remarks", "remarks"),
+    ]),
+    ("OtherExpenses", "expenses", [
+        ("Date", "date"), ("ExpenseType", "expense_type"),
+        ("Description", "description"), ("Amount", "amount"),
+    ]),
+    ("CashFlowTracker", "cash_flow", [
+        ("Date", "date"), ("Description", "description"), ("Inflow", "inflow"),
+        ("Outflow", "outflow"), ("Pending Type", "pending_type"), ("Status", "status"),
+    ]),
+    ("CapitalTracking", "capital", [
+        ("Date", "date"), ("Description", "description"), ("Type", "type"), ("Amount", "amount"),
+    ]),
+]
+
+DATE_COLUMNS = ("date", "first_purchase_date")
+
+
+def _workbook():
+    """A write-only workbook with the date style registered as style 1."""
+    wb = openpyxl.Workbook(write_only=True)
+    cell = WriteOnlyCell(wb.create_sheet())
+    cell.number_format = DATE_FORMAT
+    cell.style_id  # reading it adds the style to the workbook
+    wb.remove(wb.worksheets[0])
+    return wb
+
+
+def _write_sheet(db_path, sheet, table, columns, path):
+    """Stream one table into a one-sheet workbook at `path`; returns its row count."""
+    db.DB_PATH = db_path  # spawned workers start from the environment default
+    wb = _workbook()
+    ws = wb.create_sheet(sheet)
+    ws.append([header for header, _ in columns])
+    names = [col for _, col in columns]
+    dated = [i for i, col in enumerate(names) if col in DATE_COLUMNS]
+    # Products in the order they were added, ledgers by id: the sheet order.
+    order = "rowid" if table == "products" else "id"
+
+    count = 0
+    with db.connection() as conn:
+        cur = conn.cursor()
+        cur.row_factory = None
+        cur.execute(f"SELECT {', '.join(names)} FROM {table} ORDER BY {order}")
+        while chunk := cur.fetchmany(db.EXPORT_CHUNK_SIZE):
+            for row in chunk:
+                row = list(row)
+                for i in dated:
+                    row[i] = excel_date(row[i])
+                ws.append(row)
+            count += len(chunk)
+    wb.save(path)
+    return count
+
+
+def _assemble(parts, out):
+    """Copy each part's worksheet into a workbook holding every sheet."""
+    skeleton = os.path.join(os.path.dirname(parts[0]), "skeleton.xlsx")
+    wb = _workbook()
+    for sheet, _, _ in SHEETS:
+        wb.create_sheet(sheet)
+    wb.save(skeleton)
+
+    with zipfile.ZipFile(skeleton) as skel, \
+            zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as dest:
+        styles = skel.read("xl/styles.xml")
+        for item in skel.infolist():
+            sheet = re.fullmatch(r"xl/worksheets/sheet(\d+)\.xml", item.filename)
+            if sheet:
+                with zipfile.ZipFile(parts[int(sheet.group(1)) - 1]) as part:
+                    if part.read("xl/styles.xml") != styles:
+                        raise RuntimeError(f"{part.filename}: styles differ from the workbook's")
+                    with part.open("xl/worksheets/sheet1.xml") as src, \
+                            dest.open(item.filename, "w", force_zip64=True) as dst:
+                        shutil.copyfileobj(src, dst, 1024 * 1024)
+            else:
+                dest.writestr(item, skel.read(item.filename))
+
+
+def export_workbook(path, workers=None):
+    """Write every table to `path` in the tracker layout; returns {sheet: rows}."""
+    workers = workers or min(len(SHEETS), os.cpu_count() or 1)
+    with tempfile.TemporaryDirectory() as tmp:
+        parts = [os.path.join(tmp, f"{sheet}.xlsx") for sheet, _, _ in SHEETS]
+        jobs = [(db.DB_PATH, sheet, table, columns, part)
+                for (sheet, table, columns), part in zip(SHEETS, parts)]
+        if workers > 1:
+            # spawn: forking would copy this process's open connections and threads.
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(workers, mp_context=context) as pool:
+                counts = list(pool.map(_write_sheet, *zip(*jobs)))
+        else:
+            counts = [_write_sheet(*job) for job in jobs]
+        _assemble(parts, path)
+    return {sheet: count for (sheet, _, _), count in zip(SHEETS, counts)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the database to the tracker workbook layout.")
+    parser.add_argument("path", help="workbook to write")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per sheet, up to the CPU count)")
+    args = parser.parse_args()
+    for version, description in db.init_db():
+        print(f"Migrated schema to v{version}: {description}")
+    start = time.perf_counter()
+    counts = export_workbook(args.path, args.workers)
+    for sheet, count in counts.items():
+        print(f"  {sheet}: {count:,} rows")
+    print(f"Wrote {args.path} in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,275 @@
+"""
+Streaming CSV import for sales and purchases (POS and marketplace exports).
+
+The file is read in fixed-size chunks, so memory stays flat however long
+it is. Each chunk is validated a column at a time, with batch IDs checked
+against the product list; rows that fail are written to an error report
+with their line number and the reason, and the rest are inserted with
+executemany. The whole file loads in one transaction.
+
+Headers are matched loosely: "batch_id", "BatchID" and "Batch ID" all
+work, as do the tracker workbook's names and the app's own CSV exports.
+
+Usage: python import_csv.py {sales,purchases} FILE [--errors REPORT] [--chunk-size N]
+"""
+import os
+import re
+import time
+import argparse
+import pandas as pd
+import database as db
+
+
+CHUNK_SIZE = 20_000
+
+# Files above this size load through db.bulk_load(), which rebuilds stock
+# and rollups once at the end; smaller ones are cheaper through the
+# per-row triggers.
+BULK_LOAD_BYTES = 2_000_000
+
+# Per table: insert columns with the header spellings they accept
+# (compared lower-cased with spaces and punctuation removed), and which
+# of them must be present.
+SPECS = {
+    "sales": {
+        "columns": {
+            "date": ["date"],
+            "batch_id": ["batchid", "batch"],
+            "quantity": ["quantity", "qty"],
+            "selling_price_customer": ["sellingpricecustomer", "sellingpricetocustomer",
+                                       "customerprice", "price"],
+            "selling_price_retailer": ["sellingpriceretailer", "sellingpricetoretailer",
+                                       "yourprice", "retailerprice"],
+            "sale_type": ["saletype", "type", "channel"],
+            "remarks": ["remarks", "notes"],
+        },
+        "required": ["date", "batch_id", "quantity", "selling_price_customer"],
+    },
+    "purchases": {
+        "columns": {
+            "date": ["date"],
+            "batch_id": ["batchid", "batch"],
+            "supplier_name": ["suppliername", "supplier"],
+            "quantity": ["quantity", "qty"],
+            "cost_per_unit": ["costperunit", "costunit", "unitcost", "cost"],
+            "payment_method": ["paymentmethod", "payment"],
+            "remarks": ["remarks", "notes"],
+        },
+        "required": ["date", "batch_id", "quantity", "cost_per_unit"],
+    },
+}
+
+SALE_TYPES = ("Direct", "Indirect")
+
+
+def _normalize(header):
+    return re.sub(r"[^a-z0-9]", "", str(header).lower())
+
+
+def _header_map(headers, table):
+    """{source header: insert column} for the headers this table knows."""
+    spec = SPECS[table]
+    aliases = {alias: col for col, names in spec["columns"].items() for alias in names}
+    mapping = {}
+    for header in headers:
+        col = aliases.get(_normalize(header))
+        if col and col not in mapping.values():
+            mapping[header] = col
+    missing = [c for c in spec["required"] if c not in mapping.values()]
+    if missing:
+        raise ValueError(f"CSV is missing required column(s): {', '.join(missing)}")
+    return mapping
+
+
+def _clean_chunk(chunk, table, mapping, known_batches):
+    """Split a chunk of raw strings into (rows to insert, rejected rows).
+
+    Rejected rows keep their original cells plus "line" and "error".
+    """
+    spec = SPECS[table]
+    raw = chunk.rename(columns=mapping)
+    col = lambda name: raw[name] if name in raw else pd.Series("", index=raw.index)
+    text = lambda name: col(name).fillna("").str.strip()
+
+    date_text = text("date")
+    dates = pd.to_datetime(date_text.mask(date_text == ""), errors="coerce", format="ISO8601")
+    retry = dates.isna() & (date_text != "")
+    if retry.any():
+        # Parsing element by element is slow; only do it for non-ISO dates.
+        dates[retry] = pd.to_datetime(date_text[retry], errors="coerce", format="mixed")
+    batch_id = text("batch_id")
+    quantity = pd.to_numeric(text("quantity"), errors="coerce")
+
+    out = pd.DataFrame(index=raw.index)
+    out["date"] = dates.dt.strftime("%Y-%m-%d")
+    out["batch_id"] = batch_id
+    checks = [
+        (date_text == "", "missing date"),
+        (dates.isna(), "unreadable date"),
+        (batch_id == "", "missing batch ID"),
+        (~batch_id.isin(known_batches), "unknown batch ID"),
+        (quantity.isna() | (quantity == 0) | (quantity % 1 != 0), "quantity must be a non-zero whole number"),
+    ]
+
+    if table == "sales":
+        customer = pd.to_numeric(text("selling_price_customer"), errors="coerce")
+        retailer_text = text("selling_price_retailer")
+        retailer = pd.to_numeric(retailer_text.mask(retailer_text == "", "0"), errors="coerce")
+        sale_type = text("sale_type").str.title().replace("", "Direct")
+        checks += [
+            (customer.isna() | (customer <= 0), "invalid customer price"),
+            (retailer.isna() | (retailer < 0), "invalid retailer price"),
+            (~sale_type.isin(SALE_TYPES), "sale type must be Direct or Indirect"),
+        ]
+        out["quantity"] = quantity
+        out["selling_price_customer"] = customer
+        out["selling_price_retailer"] = retailer.mask(retailer == 0, customer)
+        out["sale_type"] = sale_type
+    else:
+        cost = pd.to_numeric(text("cost_per_unit"), errors="coerce")
+        checks.append((cost.isna() | (cost < 0), "invalid cost per unit"))
+        out["supplier_name"] = text("supplier_name").replace("", "Unknown")
+        out["quantity"] = quantity
+        out["cost_per_unit"] = cost
+        out["payment_method"] = text("payment_method").replace("", "Cash")
+    out["remarks"] = text("remarks").replace("", None)
+
+    error = pd.Series(None, index=raw.index, dtype=object)
+    for failed, reason in checks:
+        error = error.mask(error.isna() & failed, reason)
+    bad = error.notna()
+
+    # Date order (stable, so same-day rows keep file order) makes the index
+    # inserts mostly appends: over twice as fast as file order for POS dumps.
+    good = out.loc[~bad, list(spec["columns"])].sort_values("date", kind="stable")
+    good["quantity"] = good["quantity"].astype(int)
+    rejected = chunk.loc[bad].assign(error=error[bad])
+    return good, rejected
+
+
+def import_csv(source, table, errors=None, chunk_size=CHUNK_SIZE, progress=None):
+    """Stream `source` (a path or binary file object) into `table`.
+
+    Rejected rows are written as CSV to the text file `errors`, if given.
+    `progress(fraction, imported, rejected)` is called after each chunk.
+    Returns {"imported", "rejected", "seconds"}.
+    """
+    if table not in SPECS:
+        raise ValueError(f"Unknown table: {table}")
+    handle = open(source, "rb") if isinstance(source, (str, os.PathLike)) else source
+    try:
+        handle.seek(0, os.SEEK_END)
+        size = handle.tell() or 1
+        handle.seek(0)
+
+        start = time.perf_counter()
+        imported = rejected = 0
+        cols = list(SPECS[table]["columns"])
+        insert = f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})"
+        reader = pd.read_csv(handle, chunksize=chunk_size, dtype=str,
+                             keep_default_na=False, skipinitialspace=True)
+
+        load = db.bulk_load if size > BULK_LOAD_BYTES else db.transaction
+        with load(table) as conn:
+            known_batches = {r[0] for r in conn.execute("SELECT batch_id FROM products")}
+            mapping = None
+            line = 2  # first data row, after the header
+            for chunk in reader:
+                if mapping is None:
+                    mapping = _header_map(chunk.columns, table)
+                    chunk_columns = list(chunk.columns)
+                chunk.index = range(line, line + len(chunk))
+                line += len(chunk)
+
+                good, bad = _clean_chunk(chunk, table, mapping, known_batches)
+                conn.executemany(insert, good.astype(object).where(good.notna(), None)
+                                 .itertuples(index=False, name=None))
+                imported += len(good)
+                if len(bad) and errors is not None:
+                    bad.to_csv(errors, index=True, index_label="line",
+                               header=rejected == 0, columns=chunk_columns + ["error"])
+                rejected += len(bad)
+                if progress:
+                    progress(min(handle.tell() / size, 1.0), imported, rejected)
+    finally:
+        if handle is not source:
+            handle.close()
+
+    return {"imported": imported, "rejected": rejected, "seconds": time.perf_counter() - start}
+
+
+def _read_file(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def upload_widget(table):
+    """File uploader plus Import button for a view; reruns the app after a load.
+
+    Rejected rows go to a temporary file rather than the session, so a bad
+    export does not stay in server memory; it is read only when downloaded.
+    """
+    import tempfile
+    import streamlit as st
+
+    uploaded = st.file_uploader("CSV file", type=["csv"], key=f"{table}_csv")
+    st.caption(f"Needs columns: {', '.join(SPECS[table]['required'])}. "
+               "Rows with unknown batch IDs or bad values are skipped and listed for download.")
+    result = st.session_state.get(f"{table}_csv_result")
+    if result:
+        st.success(f"Imported {result['imported']:,} rows in {result['seconds']:.1f}s; "
+                   f"{result['rejected']:,} rejected.")
+        if result["errors_path"] and os.path.exists(result["errors_path"]):
+            st.download_button("📥 Download rejected rows", lambda: _read_file(result["errors_path"]),
+                               f"rejected_{table}.csv", "text/csv", on_click="ignore")
+
+    if uploaded is not None and st.button("Import", key=f"{table}_csv_import", type="primary"):
+        if result and result["errors_path"] and os.path.exists(result["errors_path"]):
+            os.remove(result["errors_path"])
+        bar = st.progress(0.0, text="Importing...")
+        with tempfile.NamedTemporaryFile("w", newline="", suffix=".csv", delete=False,
+                                         prefix=f"lookiva_rejected_{table}_") as errors:
+            try:
+                result = import_csv(
+                    uploaded, table, errors=errors,
+                    progress=lambda f, ok, bad: bar.progress(f, text=f"{ok:,} imported, {bad:,} rejected"),
+                )
+            except ValueError as e:
+                result = None
+                st.error(str(e))
+        if not (result and result["rejected"]):
+            os.remove(errors.name)
+        if result:
+            result["errors_path"] = errors.name if result["rejected"] else None
+            st.session_state[f"{table}_csv_result"] = result
+            st.rerun(scope="app")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream a sales or purchases CSV into the database.")
+    parser.add_argument("table", choices=sorted(SPECS))
+    parser.add_argument("path", help="CSV file to read")
+    parser.add_argument("--errors", help="where to write rejected rows (default: <file>.errors.csv)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+    for version, description in db.init_db():
+        print(f"Migrated schema to v{version}: {description}")
+
+    def report(fraction, imported, rejected):
+        print(f"\r  {fraction:6.1%}  {imported:,} imported, {rejected:,} rejected", end="", flush=True)
+
+    errors_path = args.errors or os.path.splitext(args.path)[0] + ".errors.csv"
+    try:
+        with open(errors_path, "w", newline="") as errors:
+            result = import_csv(args.path, args.table, errors, args.chunk_size, report)
+    except ValueError as e:
+        os.remove(errors_path)
+        parser.error(str(e))
+    print()
+    rate = result["imported"] / result["seconds"] if result["seconds"] else 0
+    print(f"Imported {result['imported']:,} {args.table} rows in {result['seconds']:.2f}s "
+          f"({rate:,.0f} rows/s); {result['rejected']:,} rejected")
+    if result["rejected"]:
+        print(f"Rejected rows written to {errors_path}")
+    else:
+        os.remove(errors_path)
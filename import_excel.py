@@ -1,18 +1,36 @@
 """
-One-time migration script to import data from SareeBusinessTracker.xlsx into SQLite.
-Called automatically on first app launch if the database is empty.
+Imports data from SareeBusinessTracker.xlsx into SQLite.
+The first import runs automatically on app launch if the database is empty.
+
+The workbook is parsed once, each sheet is cleaned a column at a time, and
+the tables are written with executemany inside a single transaction, so a
+failed import leaves the database as it was.
+
+Run with --sync to re-apply the workbook to a database that already has
+data: each sheet row is fingerprinted, so only new and changed rows are
+written (see sync()).
 """
 import os
-import pandas as pd
+import time
+import argparse
+import hashlib
+import importlib.util
 from datetime import datetime
+import pandas as pd
 import database as db
 
 
 EXCEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "SareeBusinessTracker.xlsx")
 
+# python-calamine parses large workbooks several times faster than
+# openpyxl; use it when it is installed.
+ENGINE = "calamine" if importlib.util.find_spec("python_calamine") else "openpyxl"
+
 
-def import_all():
-    if not os.path.exists(EXCEL_PATH):
+def import_all(path=None):
+    """First-launch import of the workbook into an empty database."""
+    path = path or EXCEL_PATH
+    if not os.path.exists(path):
         return False
 
     if not db.is_db_empty():
@@ -21,284 +39,350 @@ def import_all():
     print("Importing data from Excel...")
 
     try:
-        _import_products()
-        _import_purchases()
-        _import_sales()
-        _import_expenses()
-        _import_cash_flow()
-        _import_capital()
-        print("Import completed successfully!")
+        sync(path)
         return True
     except Exception as e:
         print(f"Import error: {e}")
         raise
 
 
-def _import_products():
-    df = pd.read_excel(EXCEL_PATH, sheet_name="ProductMaster")
-    df = df.dropna(subset=["BatchID"])
-    df = df[df["BatchID"].str.strip() != ""]
-
-    conn = db.get_connection()
-    count = 0
-    for _, row in df.iterrows():
-        batch_id = str(row.get("BatchID", "")).strip()
-        if not batch_id:
-            continue
-
-        first_date = row.get("FirstPurchaseDate")
-        if pd.notna(first_date):
-            if isinstance(first_date, datetime):
-                first_date = first_date.strftime("%Y-%m-%d")
-            else:
-                first_date = str(first_date)
-        else:
-            first_date = None
-
-        conn.execute(
-            """INSERT OR IGNORE INTO products
-               (batch_id, base_product_id, category, product_name, fabric, color,
-                pattern, size, source, cost_per_unit, first_purchase_date, remarks)
-               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-            (
-                batch_id,
-                str(row.get("BaseProductID", "")).strip() or batch_id,
-                str(row.get("ProductCategory", "Saree")).strip() or "Saree",
-                str(row.get("ProductName", "")).strip(),
-                _clean(row.get("Fabric")),
-                _clean(row.get("Color")),
-                _clean(row.get("Pattern")),
-                _clean(row.get("Size")),
-                _clean(row.get("Source")),
-                float(row.get("CostPerUnit", 0) or 0),
-                first_date,
-                _clean(row.get("Remarks")),
-            )
-        )
-        count += 1
-
-    conn.commit()
-    conn.close()
-    print(f"  Products imported: {count}")
-
-
-def _import_purchases():
-    df = pd.read_excel(EXCEL_PATH, sheet_name="Purchases")
-    df = df.dropna(subset=["BatchID"])
-    df = df[df["BatchID"].str.strip() != ""]
-
-    conn = db.get_connection()
-    count = 0
-    for _, row in df.iterrows():
-        batch_id = str(row.get("BatchID", "")).strip()
-        if not batch_id:
-            continue
-
-        date_val = row.get("Date")
-        if pd.notna(date_val):
-            if isinstance(date_val, datetime):
-                date_val = date_val.strftime("%Y-%m-%d")
-            else:
-                date_val = str(date_val)
-        else:
-            continue
-
-        quantity = int(row.get("Quantity", 0) or 0)
-        if quantity <= 0:
-            continue
-
-        conn.execute(
-            """INSERT INTO purchases (date, batch_id, supplier_name, quantity, cost_per_unit, payment_method, remarks)
-               VALUES (?, ?, ?, ?, ?, ?, ?)""",
-            (
-                date_val,
-                batch_id,
-                _clean(row.get("SupplierName")) or "Unknown",
-                quantity,
-                float(row.get("CostPerUnit", 0) or 0),
-                _clean(row.get("PaymentMethod")) or "Cash",
-                _clean(row.get("Remarks")),
-            )
-        )
-        count += 1
-
-    conn.commit()
-    conn.close()
-    print(f"  Purchases imported: {count}")
-
-
-def _import_sales():
-    df = pd.read_excel(EXCEL_PATH, sheet_name="Sales")
-    df = df.dropna(subset=["BatchID"])
-    df = df[df["BatchID"].str.strip() != ""]
-
-    conn = db.get_connection()
-    count = 0
-    for _, row in df.iterrows():
-        batch_id = str(row.get("BatchID", "")).strip()
-        if not batch_id:
-            continue
-
-        date_val = row.get("Date")
-        if pd.notna(date_val):
-            if isinstance(date_val, datetime):
-                date_val = date_val.strftime("%Y-%m-%d")
-            else:
-                date_val = str(date_val)
-        else:
-            continue
-
-        quantity = int(row.get("Quantity", 0) or 0)
-        if quantity <= 0:
-            continue
-
-        price_customer = float(row.get("SellingPriceToCustomer", 0) or 0)
-        price_retailer = float(row.get("SellingPriceToRetailer", 0) or 0)
-        sale_type = str(row.get("SaleType", "Direct")).strip()
-        if sale_type not in ("Direct", "Indirect"):
-            sale_type = "Direct"
-
-        if price_retailer == 0:
-            price_retailer = price_customer
-
-        conn.execute(
-            """INSERT INTO sales (date, batch_id, quantity, selling_price_customer,
-               selling_price_retailer, sale_type, remarks)
-               VALUES (?, ?, ?, ?, ?, ?, ?)""",
-            (
-                date_val,
-                batch_id,
-                quantity,
-                price_customer,
-                price_retailer,
-                sale_type,
-                _clean(row.get("Remarks")),
-            )
-        )
-        count += 1
-
-    conn.commit()
-    conn.close()
-    print(f"  Sales imported: {count}")
-
-
-def _import_expenses():
-    df = pd.read_excel(EXCEL_PATH, sheet_name="OtherExpenses")
-    df = df.dropna(subset=["Date"])
-
-    conn = db.get_connection()
-    count = 0
-    for _, row in df.iterrows():
-        date_val = row.get("Date")
-        if pd.notna(date_val):
-            if isinstance(date_val, datetime):
-                date_val = date_val.strftime("%Y-%m-%d")
+def sync(path=None):
+    """Bring the database in line with the workbook, in one transaction.
+
+    Rows new to the sheet are inserted and changed rows updated in place;
+    rows that have left the sheet are reported but kept. Running it again
+    on an unchanged workbook writes nothing. Returns a result dict per
+    sheet label (see _sync_products / _sync_ledger).
+    """
+    path = path or EXCEL_PATH
+    start = time.perf_counter()
+    sheets = pd.read_excel(path, sheet_name=None, engine=ENGINE)
+    print(f"  Workbook parsed in {time.perf_counter() - start:.2f}s ({ENGINE})")
+
+    # Filling an empty database skips the per-row triggers.
+    load = db.bulk_load if db.is_db_empty() else db.transaction
+    results = {}
+    with load(*db.TABLES) as conn:
+        for label, sheet, table, clean in IMPORTS:
+            if sheet not in sheets:
+                raise ValueError(f"Worksheet named '{sheet}' not found")
+            sheet_start = time.perf_counter()
+            rows = clean(sheets[sheet])
+            if table == "products":
+                result = _sync_products(conn, sheet, rows)
             else:
-                date_val = str(date_val)
-        else:
+                result = _sync_ledger(conn, sheet, table, rows)
+            results[label] = result
+            _report(label, result, len(rows), time.perf_counter() - sheet_start)
+
+    print(f"Sync completed successfully in {time.perf_counter() - start:.2f}s!")
+    return results
+
+
+def _report(label, result, count, elapsed):
+    rate = count / elapsed if elapsed > 0 else 0
+    print(f"  {label}: {result['inserted']} new, {result['updated']} updated, "
+          f"{result['unchanged']} unchanged ({elapsed:.2f}s, {rate:,.0f} rows/s)")
+    removed = result["removed"]
+    if removed:
+        shown = ", ".join(str(r) for r in removed[:10]) + (" ..." if len(removed) > 10 else "")
+        print(f"    {len(removed)} no longer in the sheet, kept in the database (ids: {shown})")
+
+
+def _records(df):
+    """Row tuples of plain Python values, with missing cells as None."""
+    df = df.astype(object).where(df.notna(), None)
+    return df.itertuples(index=False, name=None)
+
+
+# --------------- Column cleaning ---------------
+
+def _column(df, name):
+    if name in df:
+        return df[name]
+    return pd.Series(None, index=df.index, dtype=object)
+
+
+def _text(col):
+    """Stripped strings, with blank cells as NA."""
+    s = col.astype("string").str.strip()
+    return s.mask(s == "")
+
+
+def _number(col):
+    return pd.to_numeric(col, errors="coerce").fillna(0)
+
+
+def _dates(col):
+    """YYYY-MM-DD for date cells; other non-empty cells kept as text."""
+    if pd.api.types.is_datetime64_any_dtype(col):
+        return col.dt.strftime("%Y-%m-%d")
+    is_date = col.map(lambda v: isinstance(v, datetime))
+    out = col.where(col.isna() | is_date, col.astype("string"))
+    out[is_date] = pd.to_datetime(col[is_date]).dt.strftime("%Y-%m-%d")
+    return out.astype("string")
+
+
+def _keyed(df, column):
+    """Rows whose `column` holds a non-blank value."""
+    key = _text(_column(df, column))
+    return df[key.notna()], key[key.notna()]
+
+
+# --------------- Sheets ---------------
+
+def _products(df):
+    df, batch_id = _keyed(df, "BatchID")
+    return pd.DataFrame({
+        "batch_id": batch_id,
+        "base_product_id": _text(_column(df, "BaseProductID")).fillna(batch_id),
+        "category": _text(_column(df, "ProductCategory")).fillna("Saree"),
+        "product_name": _text(_column(df, "ProductName")).fillna(""),
+        "fabric": _text(_column(df, "Fabric")),
+        "color": _text(_column(df, "Color")),
+        "pattern": _text(_column(df, "Pattern")),
+        "size": _text(_column(df, "Size")),
+        "source": _text(_column(df, "Source")),
+        "cost_per_unit": _number(_column(df, "CostPerUnit")).astype(float),
+        "first_purchase_date": _dates(_column(df, "FirstPurchaseDate")),
+        "remarks": _text(_column(df, "Remarks")),
+    })
+
+
+def _purchases(df):
+    df, batch_id = _keyed(df, "BatchID")
+    out = pd.DataFrame({
+        "date": _dates(_column(df, "Date")),
+        "batch_id": batch_id,
+        "supplier_name": _text(_column(df, "SupplierName")).fillna("Unknown"),
+        "quantity": _number(_column(df, "Quantity")).astype(int),
+        "cost_per_unit": _number(_column(df, "CostPerUnit")).astype(float),
+        "payment_method": _text(_column(df, "PaymentMethod")).fillna("Cash"),
+        "remarks": _text(_column(df, "Remarks")),
+    })
+    return out[out["date"].notna() & (out["quantity"] != 0)]
+
+
+def _sales(df):
+    df, batch_id = _keyed(df, "BatchID")
+    price_customer = _number(_column(df, "SellingPriceToCustomer")).astype(float)
+    price_retailer = _number(_column(df, "SellingPriceToRetailer")).astype(float)
+    sale_type = _text(_column(df, "SaleType"))
+    out = pd.DataFrame({
+        "date": _dates(_column(df, "Date")),
+        "batch_id": batch_id,
+        "quantity": _number(_column(df, "Quantity")).astype(int),
+        "selling_price_customer": price_customer,
+        "selling_price_retailer": price_retailer.mask(price_retailer == 0, price_customer),
+        "sale_type": sale_type.where(sale_type.isin(["Direct", "Indirect"]), "Direct"),
+        "remarks": _text(_column(df, "Remarks")),
+    })
+    return out[out["date"].notna() & (out["quantity"] != 0)]
+
+
+def _expenses(df):
+    out = pd.DataFrame({
+        "date": _dates(_column(df, "Date")),
+        "expense_type": _text(_column(df, "ExpenseType")).fillna("Other"),
+        "description": _text(_column(df, "Description")).fillna(""),
+        "amount": _number(_column(df, "Amount")).astype(float),
+    })
+    return out[out["date"].notna() & (out["amount"] != 0)]
+
+
+def _cash_flow(df):
+    out = pd.DataFrame({
+        "date": _dates(_column(df, "Date")),
+        "description": _text(_column(df, "Description")).fillna(""),
+        "inflow": _number(_column(df, "Inflow")).astype(float),
+        "outflow": _number(_column(df, "Outflow")).astype(float),
+        "pending_type": _text(_column(df, "Pending Type")).fillna("Receipt"),
+        "status": _text(_column(df, "Status")).fillna("Completed"),
+    })
+    return out[out["date"].notna() & ((out["inflow"] != 0) | (out["outflow"] != 0))]
+
+
+def _capital(df):
+    out = pd.DataFrame({
+        "date": _dates(_column(df, "Date")),
+        "description": _text(_column(df, "Description")).fillna(""),
+        "type": _text(_column(df, "Type")).fillna("Capital In"),
+        "amount": _number(_column(df, "Amount")).astype(float),
+    })
+    return out[out["date"].notna() & (out["amount"] != 0)]
+
+
+# (label, sheet, table, cleaner) in load order; products first so the
+# ledgers' batch IDs resolve. Each cleaner returns the table's columns.
+IMPORTS = [
+    ("Products", "ProductMaster", "products", _products),
+    ("Purchases", "Purchases", "purchases", _purchases),
+    ("Sales", "Sales", "sales", _sales),
+    ("Expenses", "OtherExpenses", "expenses", _expenses),
+    ("Cash flow", "CashFlowTracker", "cash_flow", _cash_flow),
+    ("Capital", "CapitalTracking", "capital", _capital),
+]
+
+
+# --------------- Sync ---------------
+# sync_rows holds one fingerprint per imported sheet row: the database row
+# it became, a hash of its cleaned values and its sheet row number.
+
+def _fingerprint(record):
+    return hashlib.blake2b(repr(record).encode(), digest_size=16).hexdigest()
+
+
+def _prepare(rows):
+    """Records, fingerprints and sheet row numbers (header is row 1)."""
+    records = list(_records(rows))
+    return records, [_fingerprint(r) for r in records], (rows.index + 2).tolist()
+
+
+def _save_fingerprints(conn, sheet, fingerprints):
+    conn.executemany(
+        "INSERT OR REPLACE INTO sync_rows (sheet, target, row_hash, source_row) VALUES (?, ?, ?, ?)",
+        [(sheet, str(target), row_hash, source_row) for target, row_hash, source_row in fingerprints],
+    )
+
+
+def _sync_products(conn, sheet, rows):
+    """Products match on batch ID; a changed row overwrites the product."""
+    # The first row for a batch ID wins, as the original INSERT OR IGNORE did.
+    rows = rows.drop_duplicates("batch_id")
+    cols = list(rows.columns)
+    records, hashes, source_rows = _prepare(rows)
+
+    known = {target: (row_hash, source_row) for target, row_hash, source_row in conn.execute(
+        "SELECT target, row_hash, source_row FROM sync_rows WHERE sheet = ?", (sheet,))}
+    existing = {
+        r[0]: _fingerprint(tuple(r))
+        for r in conn.execute(f"SELECT {', '.join(cols)} FROM products")
+    }
+    adopting = not known
+    if adopting:
+        # A database imported before fingerprints existed: adopt the
+        # products that still match the sheet.
+        known = {bid: (h, None) for bid, h in existing.items()}
+
+    result = {"inserted": 0, "updated": 0, "unchanged": 0, "removed": []}
+    writes, fingerprints = [], []
+    for record, row_hash, source_row in zip(records, hashes, source_rows):
+        batch_id = record[0]
+        old_hash, old_row = known.get(batch_id, (None, None))
+        if old_hash == row_hash:
+            result["unchanged"] += 1
+            if old_row != source_row:
+                fingerprints.append((batch_id, row_hash, source_row))
             continue
-
-        amount = float(row.get("Amount", 0) or 0)
-        if amount <= 0:
-            continue
-
-        conn.execute(
-            "INSERT INTO expenses (date, expense_type, description, amount) VALUES (?, ?, ?, ?)",
-            (
-                date_val,
-                _clean(row.get("ExpenseType")) or "Other",
-                _clean(row.get("Description")) or "",
-                amount,
-            )
-        )
-        count += 1
-
-    conn.commit()
-    conn.close()
-    print(f"  Expenses imported: {count}")
-
-
-def _import_cash_flow():
-    df = pd.read_excel(EXCEL_PATH, sheet_name="CashFlowTracker")
-    df = df.dropna(subset=["Date"])
-
-    conn = db.get_connection()
-    count = 0
-    for _, row in df.iterrows():
-        date_val = row.get("Date")
-        if pd.notna(date_val):
-            if isinstance(date_val, datetime):
-                date_val = date_val.strftime("%Y-%m-%d")
-            else:
-                date_val = str(date_val)
+        writes.append(record)
+        fingerprints.append((batch_id, row_hash, source_row))
+        result["updated" if batch_id in existing else "inserted"] += 1
+
+    updates = ", ".join(f"{c} = excluded.{c}" for c in cols[1:])
+    conn.executemany(
+        f"""INSERT INTO products ({", ".join(cols)}) VALUES ({", ".join("?" * len(cols))})
+            ON CONFLICT(batch_id) DO UPDATE SET {updates}""",
+        writes,
+    )
+    _save_fingerprints(conn, sheet, fingerprints)
+    if not adopting:
+        result["removed"] = sorted((set(known) - set(rows["batch_id"])) & set(existing))
+    return result
+
+
+def _sync_ledger(conn, sheet, table, rows):
+    """Ledger rows have no key in the sheet. A row whose content is already
+    on file is unchanged wherever it has moved to; of the rest, one sitting
+    at the sheet row of an unmatched fingerprint is an edit of that row,
+    and anything left over is new. Unmatched fingerprints are reported as
+    removed.
+    """
+    cols = list(rows.columns)
+    records, hashes, source_rows = _prepare(rows)
+
+    stored = conn.execute(
+        "SELECT target, row_hash, source_row FROM sync_rows WHERE sheet = ? ORDER BY source_row",
+        (sheet,),
+    ).fetchall()
+    adopting = not stored
+    if adopting:
+        # A database imported before fingerprints existed: adopt the rows
+        # that still match the sheet. Rows entered in the app never match
+        # and are left alone.
+        stored = [
+            (str(r[0]), _fingerprint(tuple(r[1:])), None)
+            for r in conn.execute(f"SELECT id, {', '.join(cols)} FROM {table} ORDER BY id")
+        ]
+
+    by_hash = {}
+    for target, row_hash, source_row in stored:
+        by_hash.setdefault(row_hash, []).append((target, source_row))
+    for candidates in by_hash.values():
+        candidates.reverse()
+
+    result = {"inserted": 0, "updated": 0, "unchanged": 0, "removed": []}
+    fingerprints, pending = [], []
+    for i, row_hash in enumerate(hashes):
+        candidates = by_hash.get(row_hash)
+        if candidates:
+            target, old_row = candidates.pop()
+            result["unchanged"] += 1
+            if old_row != source_rows[i]:
+                fingerprints.append((target, row_hash, source_rows[i]))
         else:
+            pending.append(i)
+
+    unmatched = {} if adopting else {
+        source_row: target
+        for candidates in by_hash.values()
+        for target, source_row in candidates
+    }
+
+    inserts = []
+    set_clause = ", ".join(f"{c} = ?" for c in cols)
+    for i in pending:
+        target = unmatched.pop(source_rows[i], None)
+        if target is None:
+            inserts.append(i)
             continue
-
-        description = _clean(row.get("Description")) or ""
-        inflow = float(row.get("Inflow", 0) or 0)
-        outflow = float(row.get("Outflow", 0) or 0)
-
-        if inflow == 0 and outflow == 0:
-            continue
-
-        pending_type = _clean(row.get("Pending Type")) or "Receipt"
-        status = _clean(row.get("Status")) or "Completed"
-
-        conn.execute(
-            """INSERT INTO cash_flow (date, description, inflow, outflow, pending_type, status)
-               VALUES (?, ?, ?, ?, ?, ?)""",
-            (date_val, description, inflow, outflow, pending_type, status)
-        )
-        count += 1
-
-    conn.commit()
-    conn.close()
-    print(f"  Cash flow imported: {count}")
-
-
-def _import_capital():
-    df = pd.read_excel(EXCEL_PATH, sheet_name="CapitalTracking")
-    df = df.dropna(subset=["Date"])
-
-    conn = db.get_connection()
-    count = 0
-    for _, row in df.iterrows():
-        date_val = row.get("Date")
-        if pd.notna(date_val):
-            if isinstance(date_val, datetime):
-                date_val = date_val.strftime("%Y-%m-%d")
-            else:
-                date_val = str(date_val)
+        updated = conn.execute(
+            f"UPDATE {table} SET {set_clause} WHERE id = ?", records[i] + (int(target),)
+        ).rowcount
+        if updated:
+            result["updated"] += 1
+            fingerprints.append((target, hashes[i], source_rows[i]))
         else:
-            continue
-
-        amount = float(row.get("Amount", 0) or 0)
-        if amount <= 0:
-            continue
-
-        conn.execute(
-            "INSERT INTO capital (date, description, type, amount) VALUES (?, ?, ?, ?)",
-            (
-                date_val,
-                _clean(row.get("Description")) or "",
-                _clean(row.get("Type")) or "Capital In",
-                amount,
-            )
+            # Deleted from the database since the last sync; add it back.
+            conn.execute("DELETE FROM sync_rows WHERE sheet = ? AND target = ?", (sheet, target))
+            inserts.append(i)
+
+    if inserts:
+        inserts.sort()
+        # AUTOINCREMENT ids only grow, and this transaction holds the write
+        # lock, so the new rows are exactly those above the current maximum.
+        before = conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0]
+        conn.executemany(
+            f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})",
+            (records[i] for i in inserts),
         )
-        count += 1
-
-    conn.commit()
-    conn.close()
-    print(f"  Capital imported: {count}")
-
+        ids = [r[0] for r in conn.execute(f"SELECT id FROM {table} WHERE id > ? ORDER BY id", (before,))]
+        fingerprints += [(new_id, hashes[i], source_rows[i]) for new_id, i in zip(ids, inserts)]
+        result["inserted"] = len(inserts)
 
-def _clean(val):
-    if pd.isna(val) or val is None:
-        return None
-    s = str(val).strip()
-    return s if s else None
+    _save_fingerprints(conn, sheet, fingerprints)
+    result["removed"] = sorted(int(target) for target in unmatched.values())
+    return result
 
 
 if __name__ == "__main__":
-    db.init_db()
-    import_all()
+    parser = argparse.ArgumentParser(description="Import SareeBusinessTracker.xlsx into the database.")
+    parser.add_argument("path", nargs="?", default=EXCEL_PATH, help="workbook to read")
+    parser.add_argument("--sync", action="store_true",
+                        help="apply new and changed rows to a database that already has data")
+    args = parser.parse_args()
+    for version, description in db.init_db():
+        print(f"Migrated schema to v{version}: {description}")
+    if args.sync:
+        sync(args.path)
+    else:
+        import_all(args.path)
@@ -0,0 +1,570 @@
+"""
+Ordered schema migrations for the LookIva database.
+
+The applied version is stored in PRAGMA user_version. Each entry in
+MIGRATIONS moves the schema up by one version and runs in its own
+transaction; a step is either an SQL statement or a callable taking the
+connection. Append new migrations to the end — never edit or reorder
+ones that have shipped.
+"""
+
+# Recomputes stock_levels from the ledgers. Shared by the v3 backfill and
+# database.rebuild_stock_levels().
+REBUILD_STOCK_LEVELS = [
+    "DELETE FROM stock_levels",
+    """INSERT INTO stock_levels (batch_id, total_purchased, total_sold, closing_stock)
+       SELECT batch_id, SUM(purchased), SUM(sold), SUM(purchased) - SUM(sold)
+       FROM (
+           SELECT batch_id, SUM(quantity) as purchased, 0 as sold
+           FROM purchases GROUP BY batch_id
+           UNION ALL
+           SELECT batch_id, 0, SUM(quantity) FROM sales GROUP BY batch_id
+       )
+       GROUP BY batch_id""",
+]
+
+
+def _stock_triggers(table, column):
+    """Triggers that keep stock_levels.<column> in step with <table>."""
+    sign = "+" if column == "total_purchased" else "-"
+    add_new = f"""
+        INSERT INTO stock_levels (batch_id, {column}, closing_stock)
+        VALUES (NEW.batch_id, NEW.quantity, {sign}NEW.quantity)
+        ON CONFLICT(batch_id) DO UPDATE SET
+            {column} = {column} + NEW.quantity,
+            closing_stock = closing_stock {sign} NEW.quantity;"""
+    remove_old = f"""
+        UPDATE stock_levels SET
+            {column} = {column} - OLD.quantity,
+            closing_stock = closing_stock {"-" if sign == "+" else "+"} OLD.quantity
+        WHERE batch_id = OLD.batch_id;"""
+    return [
+        f"""CREATE TRIGGER IF NOT EXISTS trg_{table}_stock_insert
+            AFTER INSERT ON {table} BEGIN{add_new}
+            END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_{table}_stock_delete
+            AFTER DELETE ON {table} BEGIN{remove_old}
+            END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_{table}_stock_update
+            AFTER UPDATE OF batch_id, quantity ON {table} BEGIN{remove_old}{add_new}
+            END""",
+    ]
+
+
+STOCK_TRIGGERS = [
+    *_stock_triggers("purchases", "total_purchased"),
+    *_stock_triggers("sales", "total_sold"),
+]
+
+
+# Per-day and per-month totals behind the P&L, revenue and KPI readers.
+# Each ledger contributes these columns, written in terms of the row alias.
+ROLLUP_COLUMNS = ["revenue", "cogs", "units_sold", "sale_lines",
+                  "expenses", "purchase_cost", "purchased_units"]
+
+_ROLLUP_SOURCES = {
+    "sales": {
+        "revenue": "{r}.selling_price_retailer * {r}.quantity",
+        "cogs": "COALESCE((SELECT cost_per_unit FROM products WHERE batch_id = {r}.batch_id), 0) * {r}.quantity",
+        "units_sold": "{r}.quantity",
+        "sale_lines": "1",
+    },
+    "expenses": {
+        "expenses": "{r}.amount",
+    },
+    "purchases": {
+        "purchase_cost": "{r}.quantity * {r}.cost_per_unit",
+        "purchased_units": "{r}.quantity",
+    },
+}
+
+# Recomputes daily_totals and monthly_totals from the ledgers. Shared by the
+# v4 backfill and database.rebuild_rollups().
+ROLLUP_FROM_LEDGERS = " UNION ALL ".join(
+    "SELECT date({r}.date) as day, ".format(r=table)
+    + ", ".join(
+        f"SUM({cols[c].format(r=table)}) as {c}" if c in cols else f"0 as {c}"
+        for c in ROLLUP_COLUMNS
+    )
+    + f" FROM {table} WHERE date({table}.date) IS NOT NULL GROUP BY date({table}.date)"
+    for table, cols in _ROLLUP_SOURCES.items()
+)
+
+REBUILD_ROLLUPS = [
+    "DELETE FROM daily_totals",
+    "DELETE FROM monthly_totals",
+    f"""INSERT INTO daily_totals (day, {", ".join(ROLLUP_COLUMNS)})
+        SELECT day, {", ".join(f"SUM({c})" for c in ROLLUP_COLUMNS)}
+        FROM ({ROLLUP_FROM_LEDGERS})
+        GROUP BY day""",
+    f"""INSERT INTO monthly_totals (month, {", ".join(ROLLUP_COLUMNS)})
+        SELECT substr(day, 1, 7), {", ".join(f"SUM({c})" for c in ROLLUP_COLUMNS)}
+        FROM daily_totals
+        GROUP BY substr(day, 1, 7)""",
+]
+
+
+def _rollup_upserts(table, row, sign):
+    """Add (sign="+") or remove (sign="-") one ledger row from both rollups.
+
+    A row whose date SQLite cannot parse has no day, and is left out of
+    the rollups as it is by the rebuild: a NULL key would never conflict,
+    so every such row would add a rollup row of its own.
+    """
+    cols = _ROLLUP_SOURCES[table]
+    names = ", ".join(cols)
+    values = ", ".join(f"{sign}({expr.format(r=row)})" for expr in cols.values())
+    updates = ", ".join(f"{c} = {c} + excluded.{c}" for c in cols)
+    return "".join(
+        f"""
+        INSERT INTO {target} ({key}, {names}) SELECT {key_expr}, {values}
+        WHERE date({row}.date) IS NOT NULL
+        ON CONFLICT({key}) DO UPDATE SET {updates};"""
+        for target, key, key_expr in (
+            ("daily_totals", "day", f"date({row}.date)"),
+            ("monthly_totals", "month", f"substr(date({row}.date), 1, 7)"),
+        )
+    )
+
+
+# Ledger columns that feed the rollups; updating any of them re-posts the row.
+_ROLLUP_WATCHED = {
+    "sales": ["date", "batch_id", "quantity", "selling_price_retailer"],
+    "expenses": ["date", "amount"],
+    "purchases": ["date", "quantity", "cost_per_unit"],
+}
+
+
+def _rollup_triggers(table):
+    watched = _ROLLUP_WATCHED[table]
+    return [
+        f"""CREATE TRIGGER IF NOT EXISTS trg_{table}_rollup_insert
+            AFTER INSERT ON {table} BEGIN{_rollup_upserts(table, "NEW", "+")}
+            END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_{table}_rollup_delete
+            AFTER DELETE ON {table} BEGIN{_rollup_upserts(table, "OLD", "-")}
+            END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_{table}_rollup_update
+            AFTER UPDATE OF {", ".join(watched)} ON {table} BEGIN"""
+        f"""{_rollup_upserts(table, "OLD", "-")}{_rollup_upserts(table, "NEW", "+")}
+            END""",
+    ]
+
+
+ROLLUP_TRIGGERS = [
+    *_rollup_triggers("sales"),
+    *_rollup_triggers("expenses"),
+    *_rollup_triggers("purchases"),
+]
+
+
+_INTEGER_ROLLUPS = {"units_sold", "sale_lines", "purchased_units"}
+
+
+def _rollup_table(name, key):
+    columns = ", ".join(
+        f"{c} {'INTEGER' if c in _INTEGER_ROLLUPS else 'REAL'} NOT NULL DEFAULT 0"
+        for c in ROLLUP_COLUMNS
+    )
+    return f"CREATE TABLE IF NOT EXISTS {name} ({key} TEXT PRIMARY KEY, {columns})"
+
+
+
+# Batch IDs read <prefix><number><MON><YY>, e.g. SR0012OCT26. These pick
+# one apart in SQL; an ID of any other shape never touches the counters.
+def _batch_id_parts(b):
+    body = f"substr({b}, 1, length({b}) - 5)"
+    prefix = f"rtrim({body}, '0123456789')"
+    number = f"substr({body}, length({prefix}) + 1)"
+    period = f"substr({b}, -5)"
+    valid = f"""length({b}) > 5
+        AND {period} GLOB '[A-Z][A-Z][A-Z][0-9][0-9]'
+        AND {prefix} <> '' AND {prefix} NOT GLOB '*[^A-Z]*'
+        AND {number} <> '' AND {number} NOT GLOB '*[^0-9]*'"""
+    return prefix, f"CAST({number} AS INTEGER)", period, valid
+
+
+def _batch_counter_trigger(event):
+    """Keeps batch_counters ahead of IDs typed in or imported."""
+    prefix, number, period, valid = _batch_id_parts("NEW.batch_id")
+    return f"""CREATE TRIGGER IF NOT EXISTS trg_products_batch_counter_{event.split()[0].lower()}
+        AFTER {event} ON products WHEN {valid} BEGIN
+            INSERT INTO batch_counters (prefix, period, last_number)
+            VALUES ({prefix}, {period}, {number})
+            ON CONFLICT(prefix, period) DO UPDATE SET
+                last_number = MAX(last_number, excluded.last_number);
+        END"""
+
+
+def _backfill_batch_counters():
+    prefix, number, period, valid = _batch_id_parts("batch_id")
+    return f"""INSERT INTO batch_counters (prefix, period, last_number)
+        SELECT {prefix}, {period}, MAX({number}) FROM products
+        WHERE {valid}
+        GROUP BY 1, 2"""
+
+# Product search. An external-content FTS5 index: the text lives only in
+# products and the index is keyed by its rowid. VACUUM may renumber the
+# rowids of a table without an INTEGER PRIMARY KEY, so run
+# `python database.py rebuild-search` after one.
+SEARCH_COLUMNS = ["batch_id", "product_name", "category", "fabric", "color",
+                  "pattern", "source", "remarks"]
+
+REBUILD_SEARCH = ["INSERT INTO products_fts(products_fts) VALUES ('rebuild')"]
+
+
+def _search_row(row):
+    return f"{row}.rowid, " + ", ".join(f"{row}.{c}" for c in SEARCH_COLUMNS)
+
+
+_SEARCH_INSERT = f"""INSERT INTO products_fts (rowid, {", ".join(SEARCH_COLUMNS)})
+               VALUES ({_search_row("NEW")});"""
+_SEARCH_DELETE = f"""INSERT INTO products_fts (products_fts, rowid, {", ".join(SEARCH_COLUMNS)})
+               VALUES ('delete', {_search_row("OLD")});"""
+
+SEARCH_TRIGGERS = [
+    f"""CREATE TRIGGER IF NOT EXISTS trg_products_search_insert
+        AFTER INSERT ON products BEGIN
+            {_SEARCH_INSERT}
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_products_search_delete
+        AFTER DELETE ON products BEGIN
+            {_SEARCH_DELETE}
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_products_search_update
+        AFTER UPDATE OF {", ".join(SEARCH_COLUMNS)} ON products BEGIN
+            {_SEARCH_DELETE}
+            {_SEARCH_INSERT}
+        END""",
+]
+
+
+# Sales per batch, channel and month behind the Reports sales analysis.
+# Margin is worked out at read time from the product's current cost, as
+# the rollups' COGS is, so a cost change needs no trigger here. A date
+# that does not parse files its sale under month ''.
+def _sales_month(date_col):
+    return f"COALESCE(substr(date({date_col}), 1, 7), '')"
+
+
+SALES_SUMMARY_FROM_SALES = f"""
+    SELECT batch_id, sale_type, {_sales_month("date")} as month,
+           SUM(selling_price_retailer * quantity) as revenue,
+           SUM(quantity) as units_sold, COUNT(*) as sale_lines
+    FROM sales GROUP BY 1, 2, 3"""
+
+REBUILD_SALES_SUMMARY = [
+    "DELETE FROM sales_summary",
+    f"""INSERT INTO sales_summary (batch_id, sale_type, month, revenue, units_sold, sale_lines)
+        {SALES_SUMMARY_FROM_SALES}""",
+]
+
+
+def _sales_summary_upsert(row, sign):
+    return f"""
+        INSERT INTO sales_summary (batch_id, sale_type, month, revenue, units_sold, sale_lines)
+        VALUES ({row}.batch_id, {row}.sale_type, {_sales_month(f"{row}.date")},
+                {sign}({row}.selling_price_retailer * {row}.quantity), {sign}{row}.quantity, {sign}1)
+        ON CONFLICT(batch_id, sale_type, month) DO UPDATE SET
+            revenue = revenue + excluded.revenue,
+            units_sold = units_sold + excluded.units_sold,
+            sale_lines = sale_lines + excluded.sale_lines;"""
+
+
+SALES_SUMMARY_TRIGGERS = [
+    f"""CREATE TRIGGER IF NOT EXISTS trg_sales_summary_insert
+        AFTER INSERT ON sales BEGIN{_sales_summary_upsert("NEW", "+")}
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_sales_summary_delete
+        AFTER DELETE ON sales BEGIN{_sales_summary_upsert("OLD", "-")}
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_sales_summary_update
+        AFTER UPDATE OF date, batch_id, sale_type, quantity, selling_price_retailer ON sales BEGIN"""
+    f"""{_sales_summary_upsert("OLD", "-")}{_sales_summary_upsert("NEW", "+")}
+        END""",
+]
+
+
+# Cash flow per status and capital per type, behind the cash summary, the
+# dashboard's cash in hand and the capital balance. Receipts and payments
+# are the positive inflows and outflows, which is what the pending totals
+# count. Per table: the ledger, the key column and its value, and each
+# summed column with its value for one ledger row.
+LEDGER_TOTALS = {
+    "cash_flow_totals": ("cash_flow", "status", "COALESCE({r}.status, '')", {
+        "inflow": "COALESCE({r}.inflow, 0)",
+        "outflow": "COALESCE({r}.outflow, 0)",
+        "receipts": "MAX(COALESCE({r}.inflow, 0), 0)",
+        "payments": "MAX(COALESCE({r}.outflow, 0), 0)",
+        "entries": "1",
+    }),
+    "capital_totals": ("capital", "type", "{r}.type", {
+        "amount": "{r}.amount",
+        "entries": "1",
+    }),
+}
+
+
+def _ledger_totals_table(name):
+    _, key, _, cols = LEDGER_TOTALS[name]
+    columns = ", ".join(
+        f"{c} {'INTEGER' if c == 'entries' else 'REAL'} NOT NULL DEFAULT 0" for c in cols
+    )
+    return f"CREATE TABLE IF NOT EXISTS {name} ({key} TEXT PRIMARY KEY, {columns}) WITHOUT ROWID"
+
+
+def ledger_totals_from_ledger(name):
+    """SELECT giving what `name` should hold, computed from its ledger."""
+    ledger, key, key_expr, cols = LEDGER_TOTALS[name]
+    sums = ", ".join(f"SUM({expr.format(r=ledger)}) as {c}" for c, expr in cols.items())
+    return f"SELECT {key_expr.format(r=ledger)} as {key}, {sums} FROM {ledger} GROUP BY 1"
+
+
+REBUILD_LEDGER_TOTALS = [
+    sql
+    for name, (_, key, _, cols) in LEDGER_TOTALS.items()
+    for sql in (
+        f"DELETE FROM {name}",
+        f"INSERT INTO {name} ({key}, {', '.join(cols)}) {ledger_totals_from_ledger(name)}",
+    )
+]
+
+
+def _ledger_totals_upsert(name, row, sign):
+    _, key, key_expr, cols = LEDGER_TOTALS[name]
+    values = ", ".join(f"{sign}({expr.format(r=row)})" for expr in cols.values())
+    updates = ", ".join(f"{c} = {c} + excluded.{c}" for c in cols)
+    return f"""
+        INSERT INTO {name} ({key}, {", ".join(cols)}) VALUES ({key_expr.format(r=row)}, {values})
+        ON CONFLICT({key}) DO UPDATE SET {updates};"""
+
+
+# Ledger columns that feed the totals; updating any of them re-posts the row.
+_LEDGER_TOTALS_WATCHED = {
+    "cash_flow_totals": ["status", "inflow", "outflow"],
+    "capital_totals": ["type", "amount"],
+}
+
+
+def _ledger_totals_triggers(name):
+    ledger = LEDGER_TOTALS[name][0]
+    watched = _LEDGER_TOTALS_WATCHED[name]
+    return [
+        f"""CREATE TRIGGER IF NOT EXISTS trg_{ledger}_totals_insert
+            AFTER INSERT ON {ledger} BEGIN{_ledger_totals_upsert(name, "NEW", "+")}
+            END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_{ledger}_totals_delete
+            AFTER DELETE ON {ledger} BEGIN{_ledger_totals_upsert(name, "OLD", "-")}
+            END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_{ledger}_totals_update
+            AFTER UPDATE OF {", ".join(watched)} ON {ledger} BEGIN"""
+        f"""{_ledger_totals_upsert(name, "OLD", "-")}{_ledger_totals_upsert(name, "NEW", "+")}
+            END""",
+    ]
+
+
+LEDGER_TOTALS_TRIGGERS = [sql for name in LEDGER_TOTALS for sql in _ledger_totals_triggers(name)]
+
+
+MIGRATIONS = [
+    # 1: stock aggregation. get_stock, get_available_stock,
+    # get_in_stock_products, get_low_stock_alerts, get_top_selling_products
+    # and the monthly sales roll-ups only need these columns, so the
+    # indexes cover them without touching the table.
+    ("covering indexes for per-batch stock and sales totals", [
+        """CREATE INDEX IF NOT EXISTS idx_purchases_batch_qty
+           ON purchases(batch_id, quantity)""",
+        """CREATE INDEX IF NOT EXISTS idx_sales_batch_qty
+           ON sales(batch_id, quantity, selling_price_retailer, date)""",
+    ]),
+
+    # 2: date-range history and summaries. The (date) indexes also serve
+    # ORDER BY date, id because the rowid is the trailing index key; v5
+    # replaces them with covering indexes on the same leading columns.
+    ("indexes for date-range history and cash/capital summaries", [
+        "CREATE INDEX IF NOT EXISTS idx_sales_date ON sales(date)",
+        "CREATE INDEX IF NOT EXISTS idx_sales_type_date ON sales(sale_type, date)",
+        "CREATE INDEX IF NOT EXISTS idx_purchases_date ON purchases(date)",
+        "CREATE INDEX IF NOT EXISTS idx_expenses_date ON expenses(date)",
+        "CREATE INDEX IF NOT EXISTS idx_cash_flow_date ON cash_flow(date)",
+        """CREATE INDEX IF NOT EXISTS idx_cash_flow_status
+           ON cash_flow(status, inflow, outflow)""",
+        "CREATE INDEX IF NOT EXISTS idx_capital_date ON capital(date)",
+        "CREATE INDEX IF NOT EXISTS idx_capital_type ON capital(type, amount)",
+        "CREATE INDEX IF NOT EXISTS idx_products_category ON products(category)",
+    ]),
+
+    # 3: running stock per batch, so stock reads cost O(products) rather
+    # than re-aggregating every purchase and sale.
+    ("trigger-maintained stock_levels table", [
+        """CREATE TABLE IF NOT EXISTS stock_levels (
+               batch_id TEXT PRIMARY KEY,
+               total_purchased INTEGER NOT NULL DEFAULT 0,
+               total_sold INTEGER NOT NULL DEFAULT 0,
+               closing_stock INTEGER NOT NULL DEFAULT 0
+           )""",
+        *REBUILD_STOCK_LEVELS,
+        *STOCK_TRIGGERS,
+        """CREATE TRIGGER IF NOT EXISTS trg_products_stock_delete
+           AFTER DELETE ON products BEGIN
+               DELETE FROM stock_levels WHERE batch_id = OLD.batch_id;
+           END""",
+    ]),
+
+    # 4: daily and monthly totals, so P&L and revenue reports cost the same
+    # for one month or years of history. COGS uses the product's current
+    # cost, as the live queries did, so a cost change re-prices its sales.
+    # Rows whose date does not parse have no day and are left out.
+    ("incremental daily and monthly rollup tables", [
+        _rollup_table("daily_totals", "day"),
+        _rollup_table("monthly_totals", "month"),
+        *REBUILD_ROLLUPS,
+        *ROLLUP_TRIGGERS,
+        """CREATE TRIGGER IF NOT EXISTS trg_products_cost_rollup
+           AFTER UPDATE OF cost_per_unit ON products
+           WHEN NEW.cost_per_unit IS NOT OLD.cost_per_unit BEGIN
+               UPDATE daily_totals SET cogs = cogs + (NEW.cost_per_unit - OLD.cost_per_unit) * (
+                   SELECT SUM(quantity) FROM sales
+                   WHERE batch_id = NEW.batch_id AND date(sales.date) = daily_totals.day)
+               WHERE day IN (SELECT date(date) FROM sales WHERE batch_id = NEW.batch_id);
+               UPDATE monthly_totals SET cogs = cogs + (NEW.cost_per_unit - OLD.cost_per_unit) * (
+                   SELECT SUM(quantity) FROM sales
+                   WHERE batch_id = NEW.batch_id AND substr(date(sales.date), 1, 7) = monthly_totals.month)
+               WHERE month IN (SELECT substr(date(date), 1, 7) FROM sales WHERE batch_id = NEW.batch_id);
+           END""",
+    ]),
+
+    # 5: paged history. These lead with the same columns as the v2 date
+    # indexes, which they replace: id right after the date serves the
+    # pages' seek and ORDER BY on (date, id), and the columns after it
+    # cover the per-range totals shown beside them, the running balance
+    # brought forward into a cash flow or capital page and the page of
+    # pending cash flow entries.
+    ("covering indexes for history totals and running balances", [
+        "DROP INDEX IF EXISTS idx_sales_date",
+        "DROP INDEX IF EXISTS idx_sales_type_date",
+        "DROP INDEX IF EXISTS idx_purchases_date",
+        "DROP INDEX IF EXISTS idx_expenses_date",
+        "DROP INDEX IF EXISTS idx_cash_flow_date",
+        "DROP INDEX IF EXISTS idx_capital_date",
+        """CREATE INDEX IF NOT EXISTS idx_sales_date_totals
+           ON sales(date, id, sale_type, batch_id, quantity, selling_price_retailer)""",
+        """CREATE INDEX IF NOT EXISTS idx_sales_type_date_totals
+           ON sales(sale_type, date, id, batch_id, quantity, selling_price_retailer)""",
+        """CREATE INDEX IF NOT EXISTS idx_purchases_date_totals
+           ON purchases(date, id, quantity, cost_per_unit)""",
+        """CREATE INDEX IF NOT EXISTS idx_expenses_date_totals
+           ON expenses(date, id, expense_type, amount)""",
+        """CREATE INDEX IF NOT EXISTS idx_cash_flow_date_balance
+           ON cash_flow(date, id, inflow, outflow)""",
+        """CREATE INDEX IF NOT EXISTS idx_cash_flow_status_date
+           ON cash_flow(status, date)""",
+        """CREATE INDEX IF NOT EXISTS idx_capital_date_balance
+           ON capital(date, id, type, amount)""",
+    ]),
+
+    # 6: Excel re-sync. One fingerprint per imported sheet row: the row it
+    # became (batch_id for products, id for the ledgers), a hash of its
+    # cleaned values and its position in the sheet when last synced.
+    ("fingerprints for incremental Excel re-sync", [
+        """CREATE TABLE IF NOT EXISTS sync_rows (
+               sheet TEXT NOT NULL,
+               target TEXT NOT NULL,
+               row_hash TEXT NOT NULL,
+               source_row INTEGER NOT NULL,
+               PRIMARY KEY (sheet, target)
+           ) WITHOUT ROWID""",
+    ]),
+
+    # 7: batch ID allocation. The last number handed out per prefix and
+    # month, so the next ID is a primary-key lookup instead of a LIKE scan
+    # over products, and allocating one is a single atomic upsert.
+    ("batch ID counters", [
+        """CREATE TABLE IF NOT EXISTS batch_counters (
+               prefix TEXT NOT NULL,
+               period TEXT NOT NULL,
+               last_number INTEGER NOT NULL,
+               PRIMARY KEY (prefix, period)
+           ) WITHOUT ROWID""",
+        _backfill_batch_counters(),
+        _batch_counter_trigger("INSERT"),
+        _batch_counter_trigger("UPDATE OF batch_id"),
+    ]),
+
+    # 8: product search. Ranked prefix search over every descriptive
+    # product column instead of a LIKE scan of name and batch ID; the
+    # prefix indexes answer two- and three-letter prefixes directly.
+    ("product full-text search index", [
+        f"""CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+               {", ".join(SEARCH_COLUMNS)},
+               content='products', content_rowid='rowid',
+               tokenize='unicode61 remove_diacritics 2', prefix='2 3')""",
+        *REBUILD_SEARCH,
+        *SEARCH_TRIGGERS,
+    ]),
+
+    # 9: sales analysis. Channel, product and month-by-channel totals read
+    # O(batches x months) summary rows instead of every sale. Per-batch
+    # totals stream off the primary key; the month index covers the
+    # month-by-channel totals and month ranges.
+    ("sales summary by batch, channel and month", [
+        """CREATE TABLE IF NOT EXISTS sales_summary (
+               batch_id TEXT NOT NULL,
+               sale_type TEXT NOT NULL,
+               month TEXT NOT NULL,
+               revenue REAL NOT NULL DEFAULT 0,
+               units_sold INTEGER NOT NULL DEFAULT 0,
+               sale_lines INTEGER NOT NULL DEFAULT 0,
+               PRIMARY KEY (batch_id, sale_type, month)
+           ) WITHOUT ROWID""",
+        """CREATE INDEX IF NOT EXISTS idx_sales_summary_month
+           ON sales_summary(month, sale_type, revenue, units_sold, sale_lines)""",
+        *REBUILD_SALES_SUMMARY,
+        *SALES_SUMMARY_TRIGGERS,
+    ]),
+
+    # 10: cash and capital balances. The cash summary and capital balance
+    # read a row per status or type instead of the whole ledger, so the v2
+    # indexes that covered those sums are dropped.
+    ("cash flow and capital totals", [
+        *(_ledger_totals_table(name) for name in LEDGER_TOTALS),
+        *REBUILD_LEDGER_TOTALS,
+        *LEDGER_TOTALS_TRIGGERS,
+        "DROP INDEX IF EXISTS idx_cash_flow_status",
+        "DROP INDEX IF EXISTS idx_capital_type",
+    ]),
+]
+
+
+def current_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    """Apply every pending migration in order.
+
+    Returns [(version, description)] for the migrations this call applied.
+    """
+    version = current_version(conn)
+    applied = []
+    for target, (description, steps) in enumerate(MIGRATIONS[version:], start=version + 1):
+        if conn.in_transaction:
+            conn.commit()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Another process may have migrated while we waited for the lock.
+            if current_version(conn) >= target:
+                conn.rollback()
+                continue
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute(f"PRAGMA user_version = {target}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append((target, description))
+    return applied
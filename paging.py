@@ -0,0 +1,66 @@
+"""
+Keyset pager for the history tables.
+
+Pairs with the database.get_*_page() readers: the view fetches a page with
+load_page(), renders its rows, then draws the navigation with page_nav().
+The position is kept in session state under `key` and resets to the
+starting page whenever the view's filters change.
+"""
+
+import math
+import streamlit as st
+
+
+def _reset(key, filters, start):
+    st.session_state[key] = {
+        "filters": filters,
+        "cursor": None,
+        "direction": "next" if start == "first" else "prev",
+        "number": 1 if start == "first" else None,
+    }
+
+
+def load_page(key, fetch, filters=(), start="first"):
+    """Fetch the current page for `key`.
+
+    `fetch(cursor=..., direction=...)` returns one page; `start` is the page
+    shown first, "first" or "last" in the list's display order.
+    """
+    state = st.session_state.get(key)
+    if state is None or state["filters"] != filters:
+        _reset(key, filters, start)
+        state = st.session_state[key]
+    page = fetch(cursor=state["cursor"], direction=state["direction"])
+    if not page["rows"] and state["cursor"] is not None:
+        # The rows either side of the cursor were deleted; start over.
+        _reset(key, filters, start)
+        state = st.session_state[key]
+        page = fetch(cursor=None, direction=state["direction"])
+    return page
+
+
+def _go(key, cursor, direction, number):
+    state = st.session_state[key]
+    state.update(cursor=cursor, direction=direction, number=number)
+
+
+def page_nav(key, page, total, page_size):
+    """Draw First / Previous / Next / Last buttons and the page position."""
+    state = st.session_state[key]
+    pages = max(1, math.ceil(total / page_size))
+    number = state["number"] if state["number"] is not None else pages
+    if not page["has_prev"]:
+        number = 1
+    elif not page["has_next"]:
+        number = pages
+
+    c1, c2, c3, c4, c5 = st.columns([1, 1, 2, 1, 1])
+    c1.button("⏮ First", key=f"{key}_first", disabled=not page["has_prev"],
+              on_click=_go, args=(key, None, "next", 1), width="stretch")
+    c2.button("◀ Previous", key=f"{key}_prev", disabled=not page["has_prev"],
+              on_click=_go, args=(key, page["first"], "prev", number - 1), width="stretch")
+    c3.caption(f"Page {number} of {pages} · {total:,} rows")
+    c4.button("Next ▶", key=f"{key}_next", disabled=not page["has_next"],
+              on_click=_go, args=(key, page["last"], "next", number + 1), width="stretch")
+    c5.button("Last ⏭", key=f"{key}_last", disabled=not page["has_next"],
+              on_click=_go, args=(key, None, "prev", pages), width="stretch")
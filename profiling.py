@@ -0,0 +1,159 @@
+"""
+Per-section render timings for the views.
+
+Off unless LOOKIVA_PROFILE=1 is set or the page is opened with ?profile=1.
+While it is off, page() hands back a null context and section() returns
+after one attribute check, so the views can stay instrumented.
+
+A view marks where each logical step of its render() starts:
+
+    profiling.section("fetch")     # database reads
+    profiling.section("transform") # pandas shaping
+    profiling.section("chart")     # building Plotly figures
+    profiling.section("widgets")   # st.* calls that emit elements
+
+Each mark ends the previous section, so the time of a rerun is split
+between the sections without indenting the view's code; anything before
+the first mark counts as "widgets". Timings are added up per page across
+the session's reruns and shown in a collapsible table under the page,
+with optional cProfile and tracemalloc captures of the current rerun.
+
+Only full reruns go through app.py, so fragment-only reruns (history
+tables, sale form) are not timed.
+"""
+
+import io
+import os
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+import pandas as pd
+import streamlit as st
+import tables
+
+PROFILE_ENABLED = os.environ.get("LOOKIVA_PROFILE", "0") == "1"
+
+SECTIONS = ("fetch", "transform", "chart", "widgets")
+PROFILE_TOP = 30  # cProfile functions and tracemalloc lines listed
+
+TIMING_COLUMNS = {
+    "page": tables.text("Page"),
+    "section": tables.text("Section"),
+    "last_ms": st.column_config.NumberColumn("Last ms", format="%.1f"),
+    "mean_ms": st.column_config.NumberColumn("Mean ms", format="%.1f"),
+    "max_ms": st.column_config.NumberColumn("Max ms", format="%.1f"),
+    "share": st.column_config.ProgressColumn("Share of last", format="%.0f%%", min_value=0, max_value=100),
+    "reruns": tables.integer("Reruns"),
+}
+
+class _Local(threading.local):
+    run = None  # the rerun being timed on this script thread
+
+
+_local = _Local()
+
+
+class _Run:
+    def __init__(self):
+        self.times = dict.fromkeys(SECTIONS, 0.0)
+        self.current = "widgets"
+        self.started = self.mark = time.perf_counter()
+
+    def switch(self, name):
+        now = time.perf_counter()
+        self.times[self.current] += now - self.mark
+        self.current, self.mark = name, now
+
+    def finish(self):
+        self.switch(self.current)
+        return {name: secs * 1000 for name, secs in self.times.items()}, \
+            (self.mark - self.started) * 1000
+
+
+def enabled():
+    """Whether this session's reruns are being timed."""
+    return PROFILE_ENABLED or st.query_params.get("profile") == "1"
+
+
+def section(name):
+    """Attribute the render time from here to the next mark to `name`."""
+    run = _local.run
+    if run is not None:
+        run.switch(name)
+
+
+def page(title):
+    """Context for running one page: times it and draws the timing table."""
+    return _profiled(title) if enabled() else nullcontext()
+
+
+@contextmanager
+def _profiled(title):
+    profiler = cProfile.Profile() if st.session_state.get("profile_cprofile") else None
+    trace = bool(st.session_state.get("profile_tracemalloc")) and not tracemalloc.is_tracing()
+    if trace:
+        tracemalloc.start()
+    if profiler:
+        profiler.enable()
+    _local.run = _Run()
+    try:
+        yield
+        timings, total = _local.run.finish()
+    finally:
+        # st.rerun() and st.stop() leave through here too; nothing is recorded.
+        _local.run = None
+        if profiler:
+            profiler.disable()
+        if trace:
+            snapshot, peak = tracemalloc.take_snapshot(), tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    _record(title, timings, total)
+    with st.expander(f"⏱️ Render timings: {total:.0f} ms"):
+        _timing_table()
+        c1, c2, c3 = st.columns([1, 1, 2])
+        c1.checkbox("cProfile", key="profile_cprofile", help="Profile each rerun while ticked")
+        c2.checkbox("tracemalloc", key="profile_tracemalloc",
+                    help="Trace allocations during each rerun while ticked; slows the rerun down")
+        c3.button("Reset timings", on_click=st.session_state.pop, args=("profile_totals", None))
+        if profiler:
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(PROFILE_TOP)
+            st.code(out.getvalue(), language=None)
+        if trace:
+            st.caption(f"Peak traced memory: {peak / 1e6:.1f} MB")
+            st.dataframe(pd.DataFrame(
+                [{"line": str(stat.traceback), "size_kb": stat.size / 1024, "blocks": stat.count}
+                 for stat in snapshot.statistics("lineno")[:PROFILE_TOP]]
+            ), hide_index=True, width="stretch")
+
+
+def _record(title, timings, total):
+    pages = st.session_state.setdefault("profile_totals", {})
+    totals = pages.setdefault(title, {})
+    for name, ms in {**timings, "total": total}.items():
+        entry = totals.setdefault(name, {"reruns": 0, "total_ms": 0.0, "max_ms": 0.0})
+        entry["reruns"] += 1
+        entry["total_ms"] += ms
+        entry["max_ms"] = max(entry["max_ms"], ms)
+        entry["last_ms"] = ms
+
+
+def _timing_table():
+    rows = []
+    for title, totals in st.session_state.get("profile_totals", {}).items():
+        last_total = totals["total"]["last_ms"] or 1.0
+        for name, entry in totals.items():
+            rows.append({
+                "page": title,
+                "section": name,
+                "last_ms": entry["last_ms"],
+                "mean_ms": entry["total_ms"] / entry["reruns"],
+                "max_ms": entry["max_ms"],
+                "share": entry["last_ms"] / last_total * 100,
+                "reruns": entry["reruns"],
+            })
+    tables.show(pd.DataFrame(rows, columns=list(TIMING_COLUMNS)), TIMING_COLUMNS)
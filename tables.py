@@ -0,0 +1,108 @@
+"""
+Table building for the views.
+
+Query results load straight into typed DataFrames, derived columns are
+computed on whole columns, and numbers stay numeric: display formats come
+from st.column_config, so tables sort by value and CSV exports carry the
+raw figures.
+
+A view describes a table as {source column: column config}; the config's
+label is the header shown in the table and written to the export.
+"""
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+MONEY_FORMAT = "Rs. %,.0f"
+LOW_STOCK_LEVEL = 2
+
+
+def frame(rows, columns=None, dates=("date",)):
+    """DataFrame from sqlite3.Row results, with `dates` parsed to datetime64.
+
+    `columns` is only needed to name the columns of an empty result.
+    """
+    if columns is None:
+        columns = rows[0].keys() if rows else []
+    df = pd.DataFrame.from_records(rows, columns=list(columns))
+    for col in dates:
+        if col in df:
+            df[col] = pd.to_datetime(df[col], format="ISO8601")
+    return df
+
+
+# --------------- Column configs ---------------
+
+def text(label, **kwargs):
+    return st.column_config.TextColumn(label, **kwargs)
+
+
+def money(label, **kwargs):
+    return st.column_config.NumberColumn(label, format=MONEY_FORMAT, **kwargs)
+
+
+def integer(label, **kwargs):
+    return st.column_config.NumberColumn(label, format="%d", **kwargs)
+
+
+def day(label="Date", **kwargs):
+    return st.column_config.DateColumn(label, format="YYYY-MM-DD", **kwargs)
+
+
+def month(label="Month", **kwargs):
+    return st.column_config.DateColumn(label, format="YYYY-MM", **kwargs)
+
+
+# --------------- Derived columns ---------------
+
+def running_total(values, opening=0):
+    """Running balance of `values`, starting from `opening`."""
+    return values.cumsum() + opening
+
+
+def positive_or_blank(values):
+    """`values` with zero and negative entries blanked (shown empty)."""
+    return values.where(values > 0)
+
+
+def stock_status(closing_stock, low=LOW_STOCK_LEVEL):
+    return pd.Categorical(
+        np.select(
+            [closing_stock <= 0, closing_stock <= low],
+            ["🔴 Out of Stock", "🟡 Low Stock"],
+            default="🟢 Available",
+        ),
+        categories=["🟢 Available", "🟡 Low Stock", "🔴 Out of Stock"],
+    )
+
+
+# --------------- Output ---------------
+
+def _label(name, config):
+    if isinstance(config, str):
+        return config
+    return config.get("label") or name
+
+
+def show(df, columns, **kwargs):
+    """st.dataframe of `columns` in order, headed and formatted by their configs."""
+    st.dataframe(
+        df,
+        column_order=list(columns),
+        column_config=columns,
+        width="stretch",
+        hide_index=True,
+        **kwargs,
+    )
+
+
+def to_csv(df, columns):
+    """CSV of `columns` under their display labels, numbers unformatted."""
+    out = df[list(columns)].copy()
+    for col, config in columns.items():
+        if pd.api.types.is_datetime64_any_dtype(out[col]):
+            monthly = not isinstance(config, str) and config["type_config"].get("format") == "YYYY-MM"
+            out[col] = out[col].dt.strftime("%Y-%m" if monthly else "%Y-%m-%d")
+    out.columns = [_label(col, config) for col, config in columns.items()]
+    return out.to_csv(index=False)
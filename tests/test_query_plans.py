@@ -0,0 +1,49 @@
+"""
+Query plans of the database.py readers on a small seeded database.
+
+Every statement a reader sends must search an index on the ledger tables
+rather than walk them; benchmark.full_scans() has the rule.
+"""
+import pytest
+
+import benchmark
+import database as db
+
+
+@pytest.fixture(scope="module")
+def seeded(tmp_path_factory):
+    """A seeded, ANALYZEd database; yields a batch ID that has rows."""
+    saved_path = db.DB_PATH
+    path = str(tmp_path_factory.mktemp("plans") / "plans.db")
+    batch_ids = benchmark.seed(path, products=200, rows=5000)
+    with db.connection() as conn:
+        conn.execute("ANALYZE")
+    yield batch_ids[0]
+    db.close_connections()
+    db.clear_cache()
+    db.DB_PATH = saved_path
+
+
+@pytest.mark.parametrize("name", [
+    name for name in benchmark.plan_cases(None) if name not in benchmark.FULL_HISTORY_READS
+])
+def test_reader_searches_ledgers(seeded, name):
+    db.clear_cache()
+    statements = benchmark.capture_statements(benchmark.plan_cases(seeded)[name])
+    assert statements, f"{name} sent no SELECT"
+    with db.connection() as conn:
+        scans = {" ".join(sql.split()): benchmark.full_scans(conn, sql) for sql in statements}
+    assert not {sql: bad for sql, bad in scans.items() if bad}
+
+
+@pytest.mark.parametrize("sql, flagged", [
+    ("SELECT SUM(quantity) FROM sales", True),
+    ("SELECT s.batch_id, SUM(s.quantity) FROM sales s GROUP BY s.batch_id", True),
+    ("SELECT * FROM capital", True),
+    ("SELECT * FROM sales s WHERE s.date BETWEEN '2024-01-01' AND '2024-01-31'", False),
+    ("SELECT * FROM sales s ORDER BY s.date DESC, s.id DESC LIMIT 5", False),
+    ("SELECT batch_id, SUM(quantity) as q FROM sales GROUP BY batch_id ORDER BY q DESC LIMIT 5", True),
+])
+def test_full_scans_rule(seeded, sql, flagged):
+    with db.connection() as conn:
+        assert bool(benchmark.full_scans(conn, sql)) == flagged
@@ -0,0 +1,74 @@
+# Operator page for the query instrumentation in database.py. It is only
+# served when LOOKIVA_ADMIN=1 is set, and is not in the navigation menu;
+# open /admin directly.
+import json
+import pandas as pd
+import streamlit as st
+import database as db
+import tables
+import theme
+
+STATS_COLUMNS = {
+    "name": tables.text("Function"),
+    "calls": tables.integer("Calls"),
+    "total_ms": st.column_config.NumberColumn("Total ms", format="%.1f"),
+    "mean_ms": st.column_config.NumberColumn("Mean ms", format="%.2f"),
+    "max_ms": st.column_config.NumberColumn("Max ms", format="%.1f"),
+    "rows": tables.integer("Rows"),
+    "histogram": st.column_config.BarChartColumn("Latency histogram", help="Calls per latency bucket, fastest first"),
+}
+
+SLOW_COLUMNS = {
+    "at": tables.text("At"),
+    "function": tables.text("Function"),
+    "ms": st.column_config.NumberColumn("ms", format="%.1f"),
+    "rows": tables.integer("Rows"),
+    "sql": tables.text("Statement"),
+    "plan": st.column_config.ListColumn("Query plan"),
+}
+
+
+def _stats_frame(entries):
+    return pd.DataFrame([{"name": name, **entry} for name, entry in entries.items()],
+                        columns=list(STATS_COLUMNS))
+
+
+def _set_slow_query_ms():
+    db.SLOW_QUERY_MS = st.session_state["admin_slow_query_ms"]
+
+
+def render():
+    theme.page_header("Admin", "Query instrumentation")
+
+    # Both settings are process-wide, so they change only when the operator
+    # edits them, never as a side effect of a rerun.
+    col1, col2, col3 = st.columns([1, 1, 2])
+    enabled = col1.toggle("Record query stats", value=db.QUERY_STATS_ENABLED, key="admin_query_stats",
+                          on_change=lambda: db.enable_query_stats(st.session_state["admin_query_stats"]),
+                          help="Applies to the whole server process until it restarts.")
+    col2.number_input("Slow query ms", min_value=0.0, value=float(db.SLOW_QUERY_MS), step=10.0,
+                      key="admin_slow_query_ms", on_change=_set_slow_query_ms)
+    if col3.button("Reset stats"):
+        db.reset_query_stats()
+
+    stats = db.query_stats()
+    buckets = ", ".join(f"≤{b:g}" for b in stats["buckets_ms"])
+    st.caption(f"Since {stats['since']}. Histogram buckets (ms): {buckets}, slower.")
+    st.download_button("📥 Download JSON", json.dumps(stats, indent=2),
+                       "lookiva_query_stats.json", "application/json")
+
+    theme.section_header("Functions")
+    if stats["functions"]:
+        tables.show(_stats_frame(stats["functions"]), STATS_COLUMNS)
+    else:
+        st.info("No calls recorded yet." if enabled else "Recording is off.")
+
+    theme.section_header("Statements")
+    if stats["statements"]:
+        tables.show(_stats_frame(stats["statements"]), {**STATS_COLUMNS, "name": tables.text("Statement")})
+
+    theme.section_header(f"Slow queries (≥ {stats['slow_query_ms']:g} ms)")
+    if stats["slow"]:
+        tables.show(pd.DataFrame(stats["slow"][::-1]), SLOW_COLUMNS)
+    else:
+        st.info("No slow queries logged.")
@@ -1,22 +1,33 @@
 import streamlit as st
-import pandas as pd
 from datetime import date
 import database as db
+import export
+import paging
+import profiling
+import tables
 import theme
 
+PENDING_PAGE_SIZE = 10
+
+LEDGER_COLUMNS = {
+    "date": tables.day(),
+    "description": tables.text("Description"),
+    "inflow": tables.money("Inflow"),
+    "outflow": tables.money("Outflow"),
+    "net": tables.money("Net"),
+    "balance": tables.money("Balance"),
+    "status": tables.text("Status"),
+}
+
 
 def render():
     theme.page_header("Cash Flow", "Track money in and out")
+    _entry_form()
+    _ledger()
 
-    # --- Summary Cards ---
-    summary = db.get_cash_summary()
-    c1, c2, c3 = st.columns(3)
-    c1.metric("Cash in Hand", f"Rs. {summary['cash_in_hand']:,.0f}")
-    c2.metric("Pending Receipts", f"Rs. {summary['pending_receipts']:,.0f}")
-    c3.metric("Pending Payments", f"Rs. {summary['pending_payments']:,.0f}")
-
-    st.markdown("---")
 
+@st.fragment
+def _entry_form():
     # --- Add New Entry ---
     with st.expander("➕ Add Cash Flow Entry", expanded=False):
         with st.form("cashflow_form", clear_on_submit=True):
@@ -52,48 +63,78 @@ def render():
                             status=status,
                         )
                         st.success(f"Cash flow entry added: {description}")
-                        st.rerun()
+                        # Every entry moves the summary and the records below.
+                        st.rerun(scope="app")
                     except Exception as e:
                         st.error(f"Error: {e}")
 
+
+def _mark_completed(cf_id):
+    db.update_cash_flow_status(cf_id, "Completed")
+    st.session_state["cash_flow_updated"] = True
+
+
+@st.fragment
+def _ledger():
+    # Summary and records share a fragment, so marking an entry completed
+    # refreshes both without rerunning the entry form.
+
+    # --- Summary Cards ---
+    profiling.section("fetch")
+    summary = db.get_cash_summary()
+    profiling.section("widgets")
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Cash in Hand", f"Rs. {summary['cash_in_hand']:,.0f}")
+    c2.metric("Pending Receipts", f"Rs. {summary['pending_receipts']:,.0f}")
+    c3.metric("Pending Payments", f"Rs. {summary['pending_payments']:,.0f}")
+
+    st.markdown("---")
+
     # --- Cash Flow Table ---
     st.markdown("### Cash Flow Records")
-    entries = db.get_all_cash_flow()
-
-    if entries:
-        data = []
-        running_balance = 0
-        for e in entries:
-            inflow = e["inflow"] or 0
-            outflow = e["outflow"] or 0
-            net = inflow - outflow
-            running_balance += net
-            data.append({
-                "Date": e["date"],
-                "Description": e["description"],
-                "Inflow": f"Rs. {inflow:,.0f}" if inflow > 0 else "-",
-                "Outflow": f"Rs. {outflow:,.0f}" if outflow > 0 else "-",
-                "Net": f"Rs. {net:,.0f}",
-                "Balance": f"Rs. {running_balance:,.0f}",
-                "Status": e["status"] or "Completed",
-                "ID": e["id"],
-            })
-
-        df = pd.DataFrame(data)
-        st.dataframe(df.drop(columns=["ID"]), width="stretch", hide_index=True)
+    profiling.section("fetch")
+    page = paging.load_page(
+        "cash_flow_page", lambda **kw: db.get_cash_flow_page(with_total=True, **kw),
+        start="last",
+    )
+
+    if page["rows"]:
+        profiling.section("transform")
+        df = tables.frame(page["rows"])
+        inflow = df["inflow"].fillna(0)
+        outflow = df["outflow"].fillna(0)
+        df["net"] = inflow - outflow
+        df["balance"] = tables.running_total(df["net"], page["opening_balance"])
+        df["inflow"] = tables.positive_or_blank(inflow)
+        df["outflow"] = tables.positive_or_blank(outflow)
+        df["status"] = df["status"].fillna("Completed")
+        profiling.section("widgets")
+        tables.show(df, LEDGER_COLUMNS)
+        paging.page_nav("cash_flow_page", page, page["total"], db.HISTORY_PAGE_SIZE)
+        export.download_buttons("cash_flow")
 
         # --- Mark Pending as Completed ---
-        pending = [d for d in data if d["Status"] == "Pending"]
-        if pending:
+        if st.session_state.pop("cash_flow_updated", False):
+            st.success("Updated!")
+        profiling.section("fetch")
+        pending = paging.load_page(
+            "pending_page",
+            lambda **kw: db.get_pending_cash_flow_page(page_size=PENDING_PAGE_SIZE, with_total=True, **kw),
+        )
+        profiling.section("widgets")
+        if pending["rows"]:
             st.markdown("#### Update Pending Entries")
-            for p in pending:
+            for p in pending["rows"]:
+                amount = p["inflow"] if (p["inflow"] or 0) > 0 else p["outflow"] or 0
                 col_a, col_b = st.columns([3, 1])
                 with col_a:
-                    st.text(f"{p['Date']} | {p['Description']} | {p['Inflow'] if p['Inflow'] != '-' else p['Outflow']}")
+                    st.text(f"{p['date']} | {p['description']} | Rs. {amount:,.0f}")
                 with col_b:
-                    if st.button("Mark Completed", key=f"complete_{p['ID']}"):
-                        db.update_cash_flow_status(p["ID"], "Completed")
-                        st.success("Updated!")
-                        st.rerun()
+                    # The callback writes before the fragment reruns, so the
+                    # summary and table above already show the new status.
+                    st.button("Mark Completed", key=f"complete_{p['id']}",
+                              on_click=_mark_completed, args=(p["id"],))
+            paging.page_nav("pending_page", pending, pending["total"], PENDING_PAGE_SIZE)
     else:
+        profiling.section("widgets")
         st.info("No cash flow entries found.")
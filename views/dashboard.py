@@ -1,18 +1,40 @@
 import streamlit as st
-import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 import database as db
+import profiling
+import tables
 import theme
 
+RECENT_SALES_COLUMNS = {
+    "date": tables.day(),
+    "batch_id": tables.text("Batch ID"),
+    "product_name": tables.text("Product"),
+    "quantity": tables.integer("Qty"),
+    "selling_price_customer": tables.money("Price"),
+    "sale_type": tables.text("Type"),
+}
+
+RECENT_PURCHASES_COLUMNS = {
+    "date": tables.day(),
+    "batch_id": tables.text("Batch ID"),
+    "product_name": tables.text("Product"),
+    "quantity": tables.integer("Qty"),
+    "cost_per_unit": tables.money("Cost/Unit"),
+}
+
 
 def render():
     theme.page_header("Dashboard", "Business overview at a glance")
 
     st.markdown("")
 
+    profiling.section("fetch")
+    data = db.load_dashboard()
+    profiling.section("widgets")
+
     # --- KPI Cards ---
-    kpis = db.get_dashboard_kpis()
+    kpis = data.kpis
 
     c1, c2, c3, c4, c5 = st.columns(5)
     c1.metric("Total Products", kpis["total_products"])
@@ -29,11 +51,11 @@ def render():
 
     with col_left:
         theme.section_header("Monthly Sales Trend")
-        monthly = db.get_monthly_revenue()
-        if monthly:
-            df_monthly = pd.DataFrame([dict(r) for r in monthly])
+        monthly = data.monthly_revenue
+        if not monthly.empty:
+            profiling.section("chart")
             fig = px.bar(
-                df_monthly, x="month", y="revenue",
+                monthly, x="month", y="revenue",
                 labels={"month": "Month", "revenue": "Revenue (Rs.)"},
                 color_discrete_sequence=[theme.COLORS["accent"]],
             )
@@ -45,17 +67,18 @@ def render():
             )
             fig.update_xaxes(gridcolor=theme.COLORS["border_light"])
             fig.update_yaxes(gridcolor=theme.COLORS["border_light"])
+            profiling.section("widgets")
             st.plotly_chart(fig, width="stretch")
         else:
             st.info("No sales data yet.")
 
     with col_right:
         theme.section_header("Top Selling Products")
-        top = db.get_top_selling_products(5)
-        if top:
-            df_top = pd.DataFrame([dict(r) for r in top])
+        top = data.top_products
+        if not top.empty:
+            profiling.section("chart")
             fig = px.bar(
-                df_top, x="total_qty", y="product_name", orientation="h",
+                top, x="total_qty", y="product_name", orientation="h",
                 labels={"total_qty": "Units Sold", "product_name": "Product"},
                 color_discrete_sequence=[theme.COLORS["primary_light"]],
             )
@@ -68,6 +91,7 @@ def render():
             )
             fig.update_xaxes(gridcolor=theme.COLORS["border_light"])
             fig.update_yaxes(gridcolor=theme.COLORS["border_light"])
+            profiling.section("widgets")
             st.plotly_chart(fig, width="stretch")
         else:
             st.info("No sales data yet.")
@@ -76,10 +100,12 @@ def render():
 
     # --- Stock Status ---
     theme.section_header("Stock Status")
-    stock_data = db.get_stock()
+    stock_data = data.stock
     if stock_data:
+        profiling.section("transform")
         in_stock = sum(1 for s in stock_data if s["closing_stock"] > 0)
         out_stock = sum(1 for s in stock_data if s["closing_stock"] <= 0)
+        profiling.section("chart")
         fig = go.Figure(data=[go.Pie(
             labels=["In Stock", "Out of Stock"],
             values=[in_stock, out_stock],
@@ -92,6 +118,7 @@ def render():
             paper_bgcolor="rgba(0,0,0,0)",
             font=dict(family="Inter"),
         )
+        profiling.section("widgets")
         st.plotly_chart(fig, width="stretch")
     else:
         st.info("No stock data yet.")
@@ -103,20 +130,25 @@ def render():
 
     with col_x:
         theme.section_header("Recent Sales")
-        recent_sales = db.get_recent_sales(5)
-        if recent_sales:
-            df_rs = pd.DataFrame([dict(r) for r in recent_sales])
-            df_rs.columns = ["Date", "Batch ID", "Product", "Qty", "Price", "Type"]
-            st.dataframe(df_rs, width="stretch", hide_index=True)
+        recent_sales = data.recent_sales
+        if not recent_sales.empty:
+            tables.show(recent_sales, RECENT_SALES_COLUMNS)
         else:
             st.info("No sales recorded yet.")
 
     with col_y:
         theme.section_header("Recent Purchases")
-        recent_purch = db.get_recent_purchases(5)
-        if recent_purch:
-            df_rp = pd.DataFrame([dict(r) for r in recent_purch])
-            df_rp.columns = ["Date", "Batch ID", "Product", "Qty", "Cost/Unit"]
-            st.dataframe(df_rp, width="stretch", hide_index=True)
+        recent_purch = data.recent_purchases
+        if not recent_purch.empty:
+            tables.show(recent_purch, RECENT_PURCHASES_COLUMNS)
         else:
             st.info("No purchases recorded yet.")
+
+    # --- Load Times ---
+    slowest = max(db.DASHBOARD_WIDGETS, key=data.timings.get)
+    st.caption(
+        f"Loaded in {data.timings['total']:.0f} ms "
+        f"(slowest: {slowest.replace('_', ' ')}, {data.timings[slowest]:.0f} ms)",
+        help=" · ".join(f"{name.replace('_', ' ')}: {data.timings[name]:.1f} ms"
+                        for name in db.DASHBOARD_WIDGETS),
+    )
@@ -1,14 +1,36 @@
 import streamlit as st
-import pandas as pd
 import plotly.express as px
 from datetime import date, timedelta
 import database as db
+import export
+import paging
+import profiling
+import tables
 import theme
 
+HISTORY_COLUMNS = {
+    "date": tables.day(),
+    "expense_type": tables.text("Type"),
+    "description": tables.text("Description"),
+    "amount": tables.money("Amount"),
+}
+
 
 def render():
     theme.page_header("Expenses", "Track business expenses")
+    _expense_form()
+    _expense_history()
+
+
+def _shown_in_history(expense_date):
+    """Whether the history table's current date range includes this date."""
+    start = st.session_state.get("exp_start")
+    end = st.session_state.get("exp_end")
+    return not (start and end) or start <= expense_date <= end
 
+
+@st.fragment
+def _expense_form():
     # --- Add New Expense ---
     with st.expander("➕ Add New Expense", expanded=True):
         with st.form("expense_form", clear_on_submit=True):
@@ -36,10 +58,14 @@ def render():
                             amount=amount,
                         )
                         st.success(f"Expense recorded: {expense_type} — Rs. {amount:,.0f}")
-                        st.rerun()
+                        if _shown_in_history(expense_date):
+                            st.rerun(scope="app")
                     except Exception as e:
                         st.error(f"Error: {e}")
 
+
+@st.fragment
+def _expense_history():
     # --- Expense History ---
     st.markdown("### Expense History")
 
@@ -49,43 +75,42 @@ def render():
     with col_d2:
         end = st.date_input("To", value=date.today(), key="exp_end")
 
-    expenses = db.get_all_expenses(str(start), str(end))
-
-    if expenses:
-        data = []
-        total = 0
-        for e in expenses:
-            total += e["amount"]
-            data.append({
-                "Date": e["date"],
-                "Type": e["expense_type"],
-                "Description": e["description"],
-                "Amount": f"Rs. {e['amount']:,.0f}",
-            })
+    filters = (str(start), str(end))
+    profiling.section("fetch")
+    by_type = db.get_expense_totals_by_type(*filters)
 
-        df = pd.DataFrame(data)
-        st.dataframe(df, width="stretch", hide_index=True)
-        st.metric("Total Expenses", f"Rs. {total:,.0f}")
+    if not by_type.empty:
+        page = paging.load_page(
+            "expenses_page", lambda **kw: db.get_expenses_page(*filters, **kw), filters)
+        profiling.section("transform")
+        df = tables.frame(page["rows"])
+        profiling.section("widgets")
+        tables.show(df, HISTORY_COLUMNS)
+        paging.page_nav("expenses_page", page, int(by_type["count"].sum()), db.HISTORY_PAGE_SIZE)
+        st.metric("Total Expenses", f"Rs. {by_type['amount'].sum():,.0f}")
+        export.download_buttons("expenses", start, end)
 
         # --- By Type Chart ---
         st.markdown("#### Expenses by Type")
-        df_chart = pd.DataFrame([dict(e) for e in expenses])
-        by_type = df_chart.groupby("expense_type")["amount"].sum().reset_index()
-        by_type.columns = ["Type", "Amount"]
-        fig = px.pie(by_type, values="Amount", names="Type",
+        profiling.section("chart")
+        fig = px.pie(by_type, values="amount", names="expense_type",
+                     labels={"amount": "Amount", "expense_type": "Type"},
                      color_discrete_sequence=[theme.COLORS["accent"], theme.COLORS["primary_light"], theme.COLORS["info"], theme.COLORS["success"], theme.COLORS["warning"], theme.COLORS["danger"]])
         fig.update_layout(margin=dict(l=0, r=0, t=10, b=0), height=300)
+        profiling.section("widgets")
         st.plotly_chart(fig, width="stretch")
 
         # --- Monthly Trend ---
         st.markdown("#### Monthly Expense Trend")
-        df_chart["date"] = pd.to_datetime(df_chart["date"])
-        monthly = df_chart.groupby(df_chart["date"].dt.to_period("M"))["amount"].sum().reset_index()
-        monthly["date"] = monthly["date"].astype(str)
-        monthly.columns = ["Month", "Amount"]
-        fig2 = px.bar(monthly, x="Month", y="Amount",
+        profiling.section("fetch")
+        monthly = db.get_monthly_expense_totals(*filters)
+        profiling.section("chart")
+        fig2 = px.bar(monthly, x="month", y="amount",
+                      labels={"month": "Month", "amount": "Amount"},
                       color_discrete_sequence=[theme.COLORS["danger"]])
         fig2.update_layout(margin=dict(l=0, r=0, t=10, b=0), height=300)
+        profiling.section("widgets")
         st.plotly_chart(fig2, width="stretch")
     else:
+        profiling.section("widgets")
         st.info("No expenses found for the selected date range.")
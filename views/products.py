@@ -1,12 +1,39 @@
 import streamlit as st
-import pandas as pd
 import os
+import math
 from datetime import date
 import database as db
+import profiling
+import tables
 import theme
 
 IMAGES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "assets", "products")
 
+PAGE_SIZE = 100
+
+SORT_OPTIONS = {
+    "Newest first": ("first_purchase_date", True),
+    "Batch ID": ("batch_id", False),
+    "Product name": ("product_name", False),
+    "Stock (high to low)": ("stock", True),
+    "Stock (low to high)": ("stock", False),
+    "Cost (high to low)": ("cost_per_unit", True),
+}
+
+PRODUCT_COLUMNS = ["batch_id", "category", "product_name", "fabric", "color", "pattern",
+                   "source", "cost_per_unit", "first_purchase_date", "stock", "status"]
+
+TABLE_COLUMNS = {
+    "batch_id": tables.text("Batch ID"),
+    "category": tables.text("Category"),
+    "product_name": tables.text("Product Name"),
+    "fabric": tables.text("Fabric"),
+    "color": tables.text("Color"),
+    "source": tables.text("Source"),
+    "cost_per_unit": tables.money("Cost"),
+    "stock": tables.integer("Stock"),
+    "status": tables.text("Status", help="Active = in stock, Out of Stock = 0 remaining"),
+}
 
 def _save_image(uploaded_file, batch_id):
     """Save uploaded image and return the relative path."""
@@ -21,7 +48,13 @@ def _save_image(uploaded_file, batch_id):
 
 def render():
     theme.page_header("Product Master", "Manage your product catalog")
+    _add_product()
+    _product_list()
+    _edit_product()
+
 
+@st.fragment
+def _add_product():
     # --- Add New Product ---
     with st.expander("➕ Add New Product", expanded=False):
         # Image uploader outside form (st.file_uploader doesn't reset well inside forms)
@@ -33,14 +66,17 @@ def render():
         if uploaded_image:
             st.image(uploaded_image, width=150, caption="Preview")
 
+        # Outside the form so the suggested batch ID follows the category.
+        category = st.selectbox("Category", list(db.BATCH_PREFIXES), key="add_product_category")
+        suggested_id = db.next_batch_id(category)
+
         with st.form("add_product_form", clear_on_submit=True):
             col1, col2, col3 = st.columns(3)
 
             with col1:
-                batch_id = st.text_input("Batch ID", value=db.generate_batch_id(),
-                                         help="Auto-generated. You can modify if needed.")
+                batch_id = st.text_input("Batch ID", value=suggested_id,
+                                         help="Auto-generated from the category. You can modify if needed.")
                 base_product_id = st.text_input("Base Product ID", placeholder="e.g., SR0050")
-                category = st.selectbox("Category", ["Saree", "USkirt", "Blouse", "Other"])
 
             with col2:
                 product_name = st.text_input("Product Name *", placeholder="e.g., Indian Bathik Saree")
@@ -59,21 +95,18 @@ def render():
             submitted = st.form_submit_button("Add Product", type="primary")
 
             if submitted:
+                batch_id = batch_id.strip()
                 if not product_name:
                     st.error("Product Name is required!")
                 elif not batch_id:
                     st.error("Batch ID is required!")
                 else:
                     try:
-                        image_path = None
-                        if uploaded_image:
-                            image_path = _save_image(uploaded_image, batch_id)
-
-                        if not base_product_id:
-                            base_product_id = batch_id[:6]
-                        db.add_product(
-                            batch_id=batch_id,
-                            base_product_id=base_product_id,
+                        # An untouched suggestion is allocated on insert, so
+                        # two sessions adding at once get consecutive IDs.
+                        batch_id = db.add_product(
+                            batch_id=None if batch_id == suggested_id else batch_id,
+                            base_product_id=base_product_id or None,
                             category=category,
                             product_name=product_name,
                             fabric=fabric or None,
@@ -83,78 +116,76 @@ def render():
                             source=source or None,
                             cost_per_unit=cost_per_unit,
                             first_purchase_date=str(first_purchase_date),
-                            image_path=image_path,
                             remarks=remarks or None,
                         )
-                        st.success(f"Product '{product_name}' added successfully!")
-                        st.rerun()
+                        if uploaded_image:
+                            db.update_product(batch_id, image_path=_save_image(uploaded_image, batch_id))
+                        st.success(f"Product '{product_name}' added as {batch_id}!")
+                        # The list and the edit picker both show the new product.
+                        st.rerun(scope="app")
                     except Exception as e:
                         if "UNIQUE constraint" in str(e):
                             st.error(f"Batch ID '{batch_id}' already exists! Change it.")
                         else:
                             st.error(f"Error: {e}")
 
+
+@st.fragment
+def _product_list():
     # --- Filters ---
     st.markdown("### Product List")
-    col_f1, col_f2 = st.columns([1, 3])
+    col_f1, col_f2, col_f3 = st.columns([1, 2, 1])
     with col_f1:
         categories = ["All"] + db.get_product_categories()
         filter_cat = st.selectbox("Filter by Category", categories)
     with col_f2:
-        search = st.text_input("Search products", placeholder="Type product name or batch ID...")
+        search = st.text_input(
+            "Search products", placeholder="Name, batch ID, fabric, color...",
+            help="Every word must match the start of a word in some field. "
+                 "Limit a word to one field with e.g. color:red or fabric:silk.")
+    with col_f3:
+        sort_label = st.selectbox("Sort by", list(SORT_OPTIONS), disabled=bool(search),
+                                  help="Search results are ranked best match first." if search else None)
 
-    # --- Product Table ---
-    products = db.get_all_products()
-    if products:
-        data = []
-        for p in products:
-            stock_qty = db.get_available_stock(p["batch_id"])
-            status = "Active" if stock_qty > 0 else "Out of Stock"
-            data.append({
-                "Batch ID": p["batch_id"],
-                "Category": p["category"],
-                "Product Name": p["product_name"],
-                "Fabric": p["fabric"] or "-",
-                "Color": p["color"] or "-",
-                "Source": p["source"] or "-",
-                "Cost (Rs.)": f"{p['cost_per_unit']:,.0f}",
-                "Stock": stock_qty,
-                "Status": status,
-            })
-
-        df = pd.DataFrame(data)
-
-        if filter_cat != "All":
-            df = df[df["Category"] == filter_cat]
+    category = None if filter_cat == "All" else filter_cat
+    profiling.section("fetch")
+    total = db.count_products()
+    matching = db.count_products(category, search or None)
 
+    # --- Product Table ---
+    if total:
         if search:
-            mask = (
-                df["Product Name"].str.contains(search, case=False, na=False) |
-                df["Batch ID"].str.contains(search, case=False, na=False)
-            )
-            df = df[mask]
-
-        st.dataframe(
-            df,
-            width="stretch",
-            hide_index=True,
-            column_config={
-                "Status": st.column_config.TextColumn(
-                    "Status",
-                    help="Active = in stock, Out of Stock = 0 remaining"
-                ),
-                "Stock": st.column_config.NumberColumn("Stock", format="%d"),
-            },
-        )
-        st.caption(f"Showing {len(df)} of {len(data)} products")
+            # Ranked, so only the best matches are worth a page.
+            products = db.search_products(search, category, limit=PAGE_SIZE)
+            first = 0
+        else:
+            profiling.section("widgets")
+            pages = max(1, math.ceil(matching / PAGE_SIZE))
+            if st.session_state.get("product_page", 1) > pages:
+                st.session_state["product_page"] = pages
+            page = st.number_input("Page", min_value=1, max_value=pages, step=1,
+                                   key="product_page") if pages > 1 else 1
+
+            sort_by, descending = SORT_OPTIONS[sort_label]
+            profiling.section("fetch")
+            products = db.list_products(category, None, sort_by, descending,
+                                        limit=PAGE_SIZE, offset=(page - 1) * PAGE_SIZE)
+            first = (page - 1) * PAGE_SIZE
+
+        profiling.section("transform")
+        df = tables.frame(products, PRODUCT_COLUMNS, dates=())
+        df[["fabric", "color", "source"]] = df[["fabric", "color", "source"]].fillna("-")
+        profiling.section("widgets")
+        tables.show(df, TABLE_COLUMNS)
+        st.caption(f"Showing {first + 1 if len(df) else 0}–{first + len(df)} of {matching} "
+                   f"matching products ({total} total)")
 
         # --- View Product with Image ---
         st.markdown("---")
         with st.expander("🖼️ View Product Details"):
             product_options = {f"{p['batch_id']} - {p['product_name']}": p["batch_id"] for p in products}
             selected_view = st.selectbox("Select product", list(product_options.keys()), key="view_product")
-            selected_view_id = product_options[selected_view]
-            prod_view = db.get_product(selected_view_id)
+            prod_view = db.get_product(product_options[selected_view]) if selected_view else None
 
             if prod_view:
                 vc1, vc2 = st.columns([1, 2])
@@ -175,11 +206,22 @@ def render():
                     if prod_view['remarks']:
                         st.markdown(f"Remarks: {prod_view['remarks']}")
     else:
+        profiling.section("widgets")
         st.info("No products found. Add your first product above!")
 
+
+@st.fragment
+def _edit_product():
     # --- Edit Product ---
     st.markdown("---")
     with st.expander("✏️ Edit Product"):
+        find = st.text_input("Find product", placeholder="Name, batch ID, fabric, color...",
+                             key="edit_product_search",
+                             help=f"Lists the {db.SEARCH_LIMIT} best matches, or the newest products "
+                                  "while this is empty.")
+        profiling.section("fetch")
+        products = db.search_products(find)
+        profiling.section("widgets")
         if products:
             product_options_edit = {f"{p['batch_id']} - {p['product_name']}": p["batch_id"] for p in products}
             selected = st.selectbox("Select product to edit", list(product_options_edit.keys()), key="edit_product")
@@ -230,6 +272,6 @@ def render():
 
                         db.update_product(selected_id, **update_fields)
                         st.success("Product updated!")
-                        st.rerun()
+                        st.rerun(scope="app")
         else:
-            st.info("No products to edit.")
+            st.info("No matching products." if find else "No products to edit.")
@@ -1,16 +1,46 @@
 import streamlit as st
-import pandas as pd
 from datetime import date, timedelta
 import database as db
+import export
+import import_csv
+import paging
+import profiling
+import tables
 import theme
 
+HISTORY_COLUMNS = {
+    "date": tables.day(),
+    "batch_id": tables.text("Batch ID"),
+    "product_name": tables.text("Product"),
+    "supplier_name": tables.text("Supplier"),
+    "quantity": tables.integer("Qty", help="Negative quantities are returns"),
+    "cost_per_unit": tables.money("Cost/Unit"),
+    "total": tables.money("Total"),
+    "payment_method": tables.text("Payment"),
+}
+
 
 def render():
     theme.page_header("Purchases", "Record and track stock purchases")
+    _purchase_form()
+    _csv_import()
+    _purchase_history()
+
+
+def _shown_in_history(purchase_date):
+    """Whether the history table's current date range includes this date."""
+    start = st.session_state.get("purch_start")
+    end = st.session_state.get("purch_end")
+    return not (start and end) or start <= purchase_date <= end
 
+
+@st.fragment
+def _purchase_form():
     # --- Record New Purchase ---
     with st.expander("➕ Record New Purchase", expanded=True):
+        profiling.section("fetch")
         products = db.get_all_products()
+        profiling.section("widgets")
 
         if not products:
             st.warning("No products found. Please add products first in the Products page.")
@@ -63,10 +93,21 @@ def render():
                             st.success(f"⏎ Return recorded: {abs(quantity)}x {product['product_name']} returned for Rs. {abs(total):,.0f}")
                         else:
                             st.success(f"Purchase recorded: {quantity}x {product['product_name']} for Rs. {total:,.0f}")
-                        st.rerun()
+                        # Nothing else in this form depends on purchases.
+                        if _shown_in_history(purchase_date):
+                            st.rerun(scope="app")
                     except Exception as e:
                         st.error(f"Error: {e}")
 
+
+@st.fragment
+def _csv_import():
+    with st.expander("📤 Import Purchases from CSV"):
+        import_csv.upload_widget("purchases")
+
+
+@st.fragment
+def _purchase_history():
     # --- Purchase History ---
     st.markdown("### Purchase History")
 
@@ -76,39 +117,30 @@ def render():
     with col_d2:
         end = st.date_input("To", value=date.today(), key="purch_end")
 
-    purchases = db.get_all_purchases(str(start), str(end))
-
-    if purchases:
-        data = []
-        total_cost = 0
-        for p in purchases:
-            cost = p["quantity"] * p["cost_per_unit"]
-            total_cost += cost
-            qty_display = f"⏎ {p['quantity']}" if p["quantity"] < 0 else p["quantity"]
-            data.append({
-                "Date": p["date"],
-                "Batch ID": p["batch_id"],
-                "Product": p["product_name"] or p["batch_id"],
-                "Supplier": p["supplier_name"],
-                "Qty": qty_display,
-                "Cost/Unit": f"Rs. {p['cost_per_unit']:,.0f}",
-                "Total": f"Rs. {cost:,.0f}",
-                "Payment": p["payment_method"],
-            })
-
-        df = pd.DataFrame(data)
-        st.dataframe(df, width="stretch", hide_index=True)
-
-        st.metric("Net Purchase Cost (incl. returns)", f"Rs. {total_cost:,.0f}")
+    filters = (str(start), str(end))
+    profiling.section("fetch")
+    totals = db.get_purchase_totals(*filters)
+
+    if totals["count"]:
+        page = paging.load_page(
+            "purchases_page", lambda **kw: db.get_purchases_page(*filters, **kw), filters)
+        profiling.section("transform")
+        df = tables.frame(page["rows"])
+        df["product_name"] = df["product_name"].fillna(df["batch_id"])
+        df["total"] = df["quantity"] * df["cost_per_unit"]
+        profiling.section("widgets")
+        tables.show(df, HISTORY_COLUMNS)
+        paging.page_nav("purchases_page", page, totals["count"], db.HISTORY_PAGE_SIZE)
+
+        st.metric("Net Purchase Cost (incl. returns)", f"Rs. {totals['total_cost']:,.0f}")
+        export.download_buttons("purchases", start, end)
 
         # Monthly Summary
         st.markdown("#### Monthly Purchase Summary")
-        df_summary = pd.DataFrame([dict(r) for r in purchases])
-        df_summary["date"] = pd.to_datetime(df_summary["date"])
-        df_summary["total"] = df_summary["quantity"] * df_summary["cost_per_unit"]
-        monthly = df_summary.groupby(df_summary["date"].dt.to_period("M"))["total"].sum().reset_index()
-        monthly["date"] = monthly["date"].astype(str)
-        monthly.columns = ["Month", "Total (Rs.)"]
-        st.dataframe(monthly, width="stretch", hide_index=True)
+        profiling.section("fetch")
+        monthly = db.get_monthly_purchase_totals(*filters)
+        profiling.section("widgets")
+        tables.show(monthly, {"month": tables.month(), "total": tables.money("Total (Rs.)")})
     else:
+        profiling.section("widgets")
         st.info("No purchases found for the selected date range.")
@@ -1,10 +1,38 @@
 import streamlit as st
-import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 import database as db
+import export
+import paging
+import profiling
+import tables
 import theme
 
+PNL_COLUMNS = {
+    "month": tables.month(),
+    "gross_profit": tables.money("Gross Profit"),
+    "expenses": tables.money("Expenses"),
+    "net_profit": tables.money("Net Profit"),
+    "cumulative": tables.money("Cumulative"),
+}
+
+CAPITAL_COLUMNS = {
+    "date": tables.day(),
+    "description": tables.text("Description"),
+    "type": tables.text("Type"),
+    "amount": tables.money("Amount"),
+    "balance": tables.money("Balance"),
+}
+
+
+def _analysis_columns(key, label):
+    return {
+        key: tables.text(label),
+        "revenue": tables.money("Revenue (Rs.)"),
+        "units_sold": tables.integer("Units Sold"),
+        "margin": tables.money("Margin (Rs.)"),
+    }
+
 
 def render():
     theme.page_header("Reports", "Profit & Loss, Capital, and Sales Analysis")
@@ -15,51 +43,32 @@ def render():
     with tab1:
         st.markdown("### Monthly Profit & Loss")
 
-        pnl = db.get_monthly_pnl()
-        if pnl:
-            data = []
-            cumulative_profit = 0
-            for row in pnl:
-                cumulative_profit += row["net_profit"]
-                data.append({
-                    "Month": row["month"],
-                    "Gross Profit": f"Rs. {row['gross_profit']:,.0f}",
-                    "Expenses": f"Rs. {row['expenses']:,.0f}",
-                    "Net Profit": f"Rs. {row['net_profit']:,.0f}",
-                    "Cumulative": f"Rs. {cumulative_profit:,.0f}",
-                    "_gross": row["gross_profit"],
-                    "_net": row["net_profit"],
-                    "_expenses": row["expenses"],
-                })
-
-            df = pd.DataFrame(data)
-            st.dataframe(
-                df[["Month", "Gross Profit", "Expenses", "Net Profit", "Cumulative"]],
-                width="stretch", hide_index=True,
-            )
-
-            total_gross = sum(r["gross_profit"] for r in pnl)
-            total_exp = sum(r["expenses"] for r in pnl)
-            total_net = sum(r["net_profit"] for r in pnl)
+        profiling.section("fetch")
+        df = db.get_monthly_pnl()
+        if not df.empty:
+            profiling.section("transform")
+            df["cumulative"] = tables.running_total(df["net_profit"])
+            profiling.section("widgets")
+            tables.show(df, PNL_COLUMNS)
 
             mc1, mc2, mc3 = st.columns(3)
-            mc1.metric("Total Gross Profit", f"Rs. {total_gross:,.0f}")
-            mc2.metric("Total Expenses", f"Rs. {total_exp:,.0f}")
-            mc3.metric("Total Net Profit", f"Rs. {total_net:,.0f}")
+            mc1.metric("Total Gross Profit", f"Rs. {df['gross_profit'].sum():,.0f}")
+            mc2.metric("Total Expenses", f"Rs. {df['expenses'].sum():,.0f}")
+            mc3.metric("Total Net Profit", f"Rs. {df['net_profit'].sum():,.0f}")
 
             # P&L Chart
+            profiling.section("chart")
             fig = go.Figure()
-            months = [d["Month"] for d in data]
             fig.add_trace(go.Bar(
-                x=months, y=[d["_gross"] for d in data],
+                x=df["month"], y=df["gross_profit"],
                 name="Gross Profit", marker_color=theme.COLORS["success"]
             ))
             fig.add_trace(go.Bar(
-                x=months, y=[d["_expenses"] for d in data],
+                x=df["month"], y=df["expenses"],
                 name="Expenses", marker_color=theme.COLORS["danger"]
             ))
             fig.add_trace(go.Scatter(
-                x=months, y=[d["_net"] for d in data],
+                x=df["month"], y=df["net_profit"],
                 name="Net Profit", mode="lines+markers",
                 line=dict(color=theme.COLORS["accent"], width=3),
             ))
@@ -68,11 +77,10 @@ def render():
                 margin=dict(l=0, r=0, t=30, b=0),
                 legend=dict(orientation="h", yanchor="bottom", y=1.02),
             )
+            profiling.section("widgets")
             st.plotly_chart(fig, width="stretch")
 
-            # Export
-            csv = df[["Month", "Gross Profit", "Expenses", "Net Profit", "Cumulative"]].to_csv(index=False)
-            st.download_button("📥 Export P&L to CSV", csv, "lookiva_pnl.csv", "text/csv")
+            export.download_buttons("pnl")
         else:
             st.info("No sales data yet to generate P&L report.")
 
@@ -80,29 +88,27 @@ def render():
     with tab2:
         st.markdown("### Capital Tracking")
 
+        profiling.section("fetch")
         balance = db.get_capital_balance()
+        profiling.section("widgets")
         st.metric("Current Capital Balance", f"Rs. {balance:,.0f}")
 
-        capital = db.get_all_capital()
-        if capital:
-            data = []
-            running = 0
-            for c in capital:
-                if c["type"] == "Capital In":
-                    running += c["amount"]
-                else:
-                    running -= c["amount"]
-                data.append({
-                    "Date": c["date"],
-                    "Description": c["description"],
-                    "Type": c["type"],
-                    "Amount": f"Rs. {c['amount']:,.0f}",
-                    "Balance": f"Rs. {running:,.0f}",
-                })
-
-            df = pd.DataFrame(data)
-            st.dataframe(df, width="stretch", hide_index=True)
+        profiling.section("fetch")
+        page = paging.load_page(
+            "capital_page", lambda **kw: db.get_capital_page(with_total=True, **kw),
+            start="last",
+        )
+        if page["rows"]:
+            profiling.section("transform")
+            df = tables.frame(page["rows"])
+            signed = df["amount"].where(df["type"] == "Capital In", -df["amount"])
+            df["balance"] = tables.running_total(signed, page["opening_balance"])
+            profiling.section("widgets")
+            tables.show(df, CAPITAL_COLUMNS)
+            paging.page_nav("capital_page", page, page["total"], db.HISTORY_PAGE_SIZE)
+            export.download_buttons("capital")
         else:
+            profiling.section("widgets")
             st.info("No capital entries found.")
 
         # Add capital entry
@@ -130,60 +136,70 @@ def render():
     with tab3:
         st.markdown("### Sales Analysis")
 
-        all_sales = db.get_all_sales()
-        if not all_sales:
+        col_f1, col_f2, col_f3, col_f4 = st.columns(4)
+        with col_f1:
+            start = st.date_input("From", value=None, key="analysis_start",
+                                  help="Set both dates to limit the analysis; otherwise all sales count.")
+        with col_f2:
+            end = st.date_input("To", value=None, key="analysis_end")
+        with col_f3:
+            category = st.selectbox("Category", ["All"] + db.get_product_categories(), key="analysis_category")
+        with col_f4:
+            top = st.selectbox("Products", [None, 10, 50, 100], key="analysis_top",
+                               format_func=lambda n: "All" if n is None else f"Top {n}")
+        filters = (start and str(start), end and str(end), None if category == "All" else category)
+
+        profiling.section("fetch")
+        by_channel = db.get_sales_by_channel(*filters)
+        profiling.section("widgets")
+        if by_channel.empty:
             st.info("No sales data to analyze.")
             return
 
-        df_sales = pd.DataFrame([dict(s) for s in all_sales])
-        df_sales["date"] = pd.to_datetime(df_sales["date"])
-        df_sales["revenue"] = df_sales["selling_price_retailer"] * df_sales["quantity"]
-        df_sales["margin"] = (df_sales["selling_price_retailer"] - df_sales["product_cost"].fillna(0)) * df_sales["quantity"]
-
         # By Channel
         st.markdown("#### Revenue by Channel")
-        by_channel = df_sales.groupby("sale_type").agg(
-            Revenue=("revenue", "sum"),
-            Units=("quantity", "sum"),
-            Margin=("margin", "sum"),
-        ).reset_index()
-        by_channel.columns = ["Channel", "Revenue (Rs.)", "Units Sold", "Margin (Rs.)"]
-
         col1, col2 = st.columns(2)
         with col1:
-            st.dataframe(by_channel, width="stretch", hide_index=True)
+            tables.show(by_channel, _analysis_columns("sale_type", "Channel"))
         with col2:
-            fig = px.pie(by_channel, values="Revenue (Rs.)", names="Channel",
+            profiling.section("chart")
+            fig = px.pie(by_channel, values="revenue", names="sale_type",
+                         labels={"revenue": "Revenue (Rs.)", "sale_type": "Channel"},
                          color_discrete_sequence=[theme.COLORS["accent"], theme.COLORS["primary_light"]])
             fig.update_layout(margin=dict(l=0, r=0, t=10, b=0), height=250)
+            profiling.section("widgets")
             st.plotly_chart(fig, width="stretch")
 
         # By Product
+        profiling.section("fetch")
+        by_product = db.get_sales_by_product(*filters, limit=top)
+        profiling.section("widgets")
         st.markdown("#### Revenue by Product")
-        by_product = df_sales.groupby("product_name").agg(
-            Revenue=("revenue", "sum"),
-            Units=("quantity", "sum"),
-            Margin=("margin", "sum"),
-        ).sort_values("Revenue", ascending=False).reset_index()
-        by_product.columns = ["Product", "Revenue (Rs.)", "Units Sold", "Margin (Rs.)"]
-        st.dataframe(by_product, width="stretch", hide_index=True)
-
-        fig2 = px.bar(by_product.head(10), x="Product", y="Revenue (Rs.)",
+        tables.show(by_product, _analysis_columns("product_name", "Product"))
+
+        profiling.section("chart")
+        fig2 = px.bar(by_product.head(10), x="product_name", y="revenue",
+                      labels={"product_name": "Product", "revenue": "Revenue (Rs.)"},
                       color_discrete_sequence=[theme.COLORS["accent"]])
         fig2.update_layout(margin=dict(l=0, r=0, t=10, b=0), height=300)
+        profiling.section("widgets")
         st.plotly_chart(fig2, width="stretch")
 
         # Monthly Trend
         st.markdown("#### Monthly Revenue Trend")
-        df_sales["month"] = df_sales["date"].dt.to_period("M").astype(str)
-        by_month = df_sales.groupby(["month", "sale_type"])["revenue"].sum().reset_index()
+        profiling.section("fetch")
+        by_month = db.get_monthly_sales_by_channel(*filters)
+        profiling.section("chart")
         fig3 = px.bar(by_month, x="month", y="revenue", color="sale_type",
                       labels={"month": "Month", "revenue": "Revenue (Rs.)", "sale_type": "Channel"},
                       barmode="group",
                       color_discrete_sequence=[theme.COLORS["accent"], theme.COLORS["primary_light"]])
         fig3.update_layout(margin=dict(l=0, r=0, t=10, b=0), height=300)
+        profiling.section("widgets")
         st.plotly_chart(fig3, width="stretch")
 
         # Export
-        csv = by_product.to_csv(index=False)
+        profiling.section("transform")
+        csv = tables.to_csv(by_product, _analysis_columns("product_name", "Product"))
+        profiling.section("widgets")
         st.download_button("📥 Export Sales Analysis", csv, "lookiva_sales_analysis.csv", "text/csv")
@@ -1,16 +1,59 @@
 import streamlit as st
-import pandas as pd
+from streamlit.errors import StreamlitAPIException
 from datetime import date, timedelta
 import database as db
+import export
+import import_csv
+import paging
+import profiling
+import tables
 import theme
 
+HISTORY_COLUMNS = {
+    "date": tables.day(),
+    "batch_id": tables.text("Batch ID"),
+    "product_name": tables.text("Product"),
+    "quantity": tables.integer("Qty", help="Negative quantities are returns"),
+    "selling_price_customer": tables.money("Customer Price"),
+    "selling_price_retailer": tables.money("Your Price"),
+    "margin": tables.money("Margin"),
+    "sale_type": tables.text("Type"),
+}
+
 
 def render():
     theme.page_header("Sales", "Record direct and indirect sales")
+    _sale_form()
+    _csv_import()
+    _sales_history()
+
+
+def _shown_in_history(sale_date, sale_type):
+    """Whether the history table's current filters include this sale."""
+    start = st.session_state.get("sale_start")
+    end = st.session_state.get("sale_end")
+    type_filter = st.session_state.get("sale_type_filter", "All")
+    if start and end and not (start <= sale_date <= end):
+        return False
+    return type_filter in ("All", sale_type)
+
+
+def _rerun_fragment():
+    # Fragment-scoped reruns are only allowed while the fragment itself is
+    # rerunning; when it ran as part of a full run, rerun the page instead.
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
 
+
+@st.fragment
+def _sale_form():
     # --- Record New Sale ---
     with st.expander("➕ Record New Sale", expanded=True):
+        profiling.section("fetch")
         in_stock = db.get_in_stock_products()
+        profiling.section("widgets")
 
         if not in_stock:
             st.warning("No products in stock! Record a purchase first.")
@@ -92,10 +135,23 @@ def render():
                                 st.success(f"⏎ Return processed: {abs(quantity)}x {product['product_name']} returned — Margin impact: Rs. {margin:,.0f}")
                             else:
                                 st.success(f"Sale recorded: {quantity}x {product['product_name']} — Margin: Rs. {margin:,.0f}")
-                            st.rerun()
+                            # Stock counts in this form always change; the
+                            # history only if the sale falls inside its filters.
+                            if _shown_in_history(sale_date, sale_type):
+                                st.rerun(scope="app")
+                            _rerun_fragment()
                         except Exception as e:
                             st.error(f"Error: {e}")
 
+
+@st.fragment
+def _csv_import():
+    with st.expander("📤 Import Sales from CSV"):
+        import_csv.upload_widget("sales")
+
+
+@st.fragment
+def _sales_history():
     # --- Sales History ---
     st.markdown("### Sales History")
 
@@ -105,39 +161,32 @@ def render():
     with col_f2:
         end = st.date_input("To", value=date.today(), key="sale_end")
     with col_f3:
-        type_filter = st.selectbox("Sale Type", ["All", "Direct", "Indirect"])
+        type_filter = st.selectbox("Sale Type", ["All", "Direct", "Indirect"], key="sale_type_filter")
 
     sale_type_filter = None if type_filter == "All" else type_filter
-    sales = db.get_all_sales(str(start), str(end), sale_type_filter)
-
-    if sales:
-        data = []
-        total_revenue = 0
-        total_margin = 0
-        for s in sales:
-            cost = s["product_cost"] or 0
-            margin = (s["selling_price_retailer"] - cost) * s["quantity"]
-            revenue = s["selling_price_retailer"] * s["quantity"]
-            total_revenue += revenue
-            total_margin += margin
-            qty_display = f"⏎ {s['quantity']}" if s["quantity"] < 0 else s["quantity"]
-            data.append({
-                "Date": s["date"],
-                "Batch ID": s["batch_id"],
-                "Product": s["product_name"] or s["batch_id"],
-                "Qty": qty_display,
-                "Customer Price": f"Rs. {s['selling_price_customer']:,.0f}",
-                "Your Price": f"Rs. {s['selling_price_retailer']:,.0f}",
-                "Margin": f"Rs. {margin:,.0f}",
-                "Type": s["sale_type"],
-            })
-
-        df = pd.DataFrame(data)
-        st.dataframe(df, width="stretch", hide_index=True)
+    filters = (str(start), str(end), sale_type_filter)
+    profiling.section("fetch")
+    totals = db.get_sales_totals(*filters)
+
+    if totals["count"]:
+        page = paging.load_page(
+            "sales_page",
+            lambda **kw: db.get_sales_page(*filters, **kw),
+            filters,
+        )
+        profiling.section("transform")
+        df = tables.frame(page["rows"])
+        df["product_name"] = df["product_name"].fillna(df["batch_id"])
+        df["margin"] = (df["selling_price_retailer"] - df["product_cost"].fillna(0)) * df["quantity"]
+        profiling.section("widgets")
+        tables.show(df, HISTORY_COLUMNS)
+        paging.page_nav("sales_page", page, totals["count"], db.HISTORY_PAGE_SIZE)
 
         mc1, mc2, mc3 = st.columns(3)
-        mc1.metric("Total Transactions", len(data))
-        mc2.metric("Net Revenue (incl. returns)", f"Rs. {total_revenue:,.0f}")
-        mc3.metric("Net Margin (incl. returns)", f"Rs. {total_margin:,.0f}")
+        mc1.metric("Total Transactions", totals["count"])
+        mc2.metric("Net Revenue (incl. returns)", f"Rs. {totals['revenue']:,.0f}")
+        mc3.metric("Net Margin (incl. returns)", f"Rs. {totals['margin']:,.0f}")
+        export.download_buttons("sales", start, end)
     else:
+        profiling.section("widgets")
         st.info("No sales found for the selected filters.")
@@ -1,24 +1,45 @@
 import streamlit as st
-import pandas as pd
 import database as db
+import export
+import profiling
+import tables
 import theme
 
+STOCK_COLUMNS = {
+    "batch_id": tables.text("Batch ID"),
+    "product_name": tables.text("Product"),
+    "category": tables.text("Category"),
+    "total_purchased": tables.integer("Purchased"),
+    "total_sold": tables.integer("Sold"),
+    "closing_stock": tables.integer("Closing Stock"),
+    "cost_per_unit": tables.money("Cost/Unit"),
+    "stock_value": tables.money("Stock Value"),
+    "status": tables.text("Status"),
+}
+
 
 def render():
     theme.page_header("Stock / Inventory", "Real-time inventory overview")
 
+    profiling.section("fetch")
     stock = db.get_stock()
+    profiling.section("widgets")
 
     if not stock:
         st.info("No stock data. Add products and record purchases to see inventory.")
         return
 
+    profiling.section("transform")
+    df = tables.frame(stock)
+    in_stock = df["closing_stock"] > 0
+
     # --- Summary Metrics ---
-    total_items = sum(s["closing_stock"] for s in stock if s["closing_stock"] > 0)
-    total_value = sum(s["stock_value"] for s in stock if s["closing_stock"] > 0)
-    in_stock_count = sum(1 for s in stock if s["closing_stock"] > 0)
-    out_stock_count = sum(1 for s in stock if s["closing_stock"] <= 0)
+    total_items = int(df.loc[in_stock, "closing_stock"].sum())
+    total_value = df.loc[in_stock, "stock_value"].sum()
+    in_stock_count = int(in_stock.sum())
+    out_stock_count = len(df) - in_stock_count
 
+    profiling.section("widgets")
     c1, c2, c3, c4 = st.columns(4)
     c1.metric("Total Units in Stock", f"{total_items}")
     c2.metric("Total Stock Value", f"Rs. {total_value:,.0f}")
@@ -31,47 +52,20 @@ def render():
     show = st.radio("Show", ["All", "In Stock Only", "Out of Stock Only"], horizontal=True)
 
     # --- Stock Table ---
-    data = []
-    for s in stock:
-        closing = s["closing_stock"]
-
-        if show == "In Stock Only" and closing <= 0:
-            continue
-        if show == "Out of Stock Only" and closing > 0:
-            continue
-
-        if closing <= 0:
-            status = "🔴 Out of Stock"
-        elif closing <= 2:
-            status = "🟡 Low Stock"
-        else:
-            status = "🟢 Available"
-
-        data.append({
-            "Batch ID": s["batch_id"],
-            "Product": s["product_name"],
-            "Category": s["category"],
-            "Purchased": s["total_purchased"],
-            "Sold": s["total_sold"],
-            "Closing Stock": closing,
-            "Cost/Unit": f"Rs. {s['cost_per_unit']:,.0f}",
-            "Stock Value": f"Rs. {s['stock_value']:,.0f}" if closing > 0 else "-",
-            "Status": status,
-        })
+    profiling.section("transform")
+    df["stock_value"] = df["stock_value"].where(in_stock)
+    df["status"] = tables.stock_status(df["closing_stock"])
+    if show == "In Stock Only":
+        df = df[in_stock]
+    elif show == "Out of Stock Only":
+        df = df[~in_stock]
 
-    if data:
-        df = pd.DataFrame(data)
-        st.dataframe(df, width="stretch", hide_index=True)
+    profiling.section("widgets")
+    if not df.empty:
+        tables.show(df, STOCK_COLUMNS)
 
-        st.caption(f"Showing {len(data)} products")
+        st.caption(f"Showing {len(df)} products")
 
-        # --- Export ---
-        csv = df.to_csv(index=False)
-        st.download_button(
-            "📥 Export to CSV",
-            csv,
-            "lookiva_stock.csv",
-            "text/csv",
-        )
+        export.download_buttons("stock")
     else:
         st.info("No products match the selected filter.")